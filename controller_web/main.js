@@ -2,6 +2,7 @@
   const els = {};
   let ws = null;
   let connected = false;
+  let videoWs = null;
 
   function $(id) { return document.getElementById(id); }
   function log(msg, type = 'info') {
@@ -82,6 +83,67 @@
     ws.send(msg);
   }
 
+  // Binary video channel: each message is a 12 byte header (uint32 sequence,
+  // float64 capture time in seconds, little endian) followed by a JPEG frame.
+  // Only the newest frame is decoded; frames arriving meanwhile replace it.
+  // The age shown is capture to display, exact when both clocks are in sync.
+  function startVideo() {
+    const host = els.host.value.trim() || location.hostname;
+    const port = parseInt(els.videoPort.value.trim(), 10) || 8890;
+    const url = `ws://${host}:${port}`;
+    let pending = null;
+    let decoding = false;
+    let shown = 0;
+    let skipped = 0;
+    let started = performance.now();
+    log(`Starting video from ${url} ...`);
+    videoWs = new WebSocket(url);
+    videoWs.binaryType = 'arraybuffer';
+    videoWs.onopen = () => {
+      videoWs.send(`${els.username.value || 'admin'}:${els.password.value || '123456'}`);
+      els.btnVideo.textContent = 'Stop Video';
+    };
+    function showNext() {
+      if (decoding || !pending) return;
+      const frame = pending;
+      pending = null;
+      decoding = true;
+      const view = new DataView(frame);
+      const sequence = view.getUint32(0, true);
+      const captured = view.getFloat64(4, true);
+      const src = URL.createObjectURL(new Blob([frame.slice(12)], { type: 'image/jpeg' }));
+      els.video.onload = els.video.onerror = () => {
+        URL.revokeObjectURL(src);
+        decoding = false;
+        shown += 1;
+        const fps = shown / ((performance.now() - started) / 1000);
+        const age = Date.now() / 1000 - captured;
+        els.videoStatus.textContent = `#${sequence} · ${fps.toFixed(1)} fps · ${(age * 1000).toFixed(0)} ms old · ${skipped} skipped here`;
+        if (shown >= 30) { shown = 0; started = performance.now(); }
+        showNext();
+      };
+      els.video.src = src;
+    }
+    videoWs.onmessage = (ev) => {
+      if (typeof ev.data === 'string') {
+        log(`video ← ${ev.data}`);
+        return;
+      }
+      if (pending) skipped += 1;
+      pending = ev.data;
+      showNext();
+    };
+    videoWs.onerror = () => log('Video WebSocket error', 'error');
+    videoWs.onclose = () => {
+      videoWs = null;
+      els.btnVideo.textContent = 'Start Video';
+      els.videoStatus.textContent = 'Stopped';
+    };
+  }
+  function stopVideo() {
+    if (videoWs) videoWs.close();
+  }
+
   document.addEventListener('DOMContentLoaded', () => {
     // Cache elements
     els.host = $('host');
@@ -96,6 +158,10 @@
     els.btnGetInfo = $('btnGetInfo');
     els.log = $('log');
     els.info = $('info');
+    els.videoPort = $('videoPort');
+    els.btnVideo = $('btnVideo');
+    els.videoStatus = $('videoStatus');
+    els.video = $('video');
 
     // Defaults
     if (!els.host.value) els.host.value = location.hostname || 'raspberrypi.local';
@@ -105,6 +171,10 @@
       if (!connected) connect(); else disconnect();
     });
 
+    els.btnVideo.addEventListener('click', () => {
+      if (!videoWs) startVideo(); else stopVideo();
+    });
+
     document.querySelectorAll('[data-cmd]').forEach(btn => {
       btn.addEventListener('click', () => {
         const cmd = btn.getAttribute('data-cmd');
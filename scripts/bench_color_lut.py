@@ -0,0 +1,91 @@
+"""
+Colour mask lookup table benchmark.
+
+Compares the findColor mask built by an HSV conversion plus cv2.inRange with
+the quantised BGR lookup table of web/vision.py. For each table size it
+reports the rebuild time, the per-frame time of both paths and how closely
+the masks agree, and fails when the agreement is below --min-agreement.
+
+Usage:
+  python -m scripts.bench_color_lut
+  python -m scripts.bench_color_lut --bits 4 5 6 --scale 0.5 --frames 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+
+import numpy as np  # pylint: disable=wrong-import-position
+import vision  # pylint: disable=wrong-import-position,import-error
+
+# Default findColor bounds of camera_opencv.py (yellow)
+LOWER = np.array([24, 100, 100])
+UPPER = np.array([44, 255, 255])
+
+
+def test_frames(scale: float) -> list:
+    """Return a scene with a target, one with a target of a close colour and uniform colour noise."""
+    rng = np.random.default_rng(1)
+    frames = [
+        vision.synthetic_target_frame(320, 240),
+        vision.synthetic_target_frame(200, 300, color=(30, 160, 200)),
+        rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8),
+    ]
+    return [vision.downscale(frame, scale) for frame in frames]
+
+
+def time_per_frame(function, frames: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            function(frame)
+    return (time.perf_counter() - start) / (repeat * len(frames))
+
+
+def bench(bits: int, frames: list, repeat: int) -> dict:
+    lut = vision.ColorLookupTable(bits)
+    start = time.perf_counter()
+    lut.update(LOWER, UPPER)
+    rebuild = time.perf_counter() - start
+    agreement = []
+    for frame in frames:
+        reference = vision.color_mask(frame, LOWER, UPPER)
+        agreement.append(float(np.mean(reference == lut.mask(frame, LOWER, UPPER))))
+    return {
+        "bits": bits,
+        "entries": lut.table.size,
+        "rebuild": rebuild,
+        "hsv": time_per_frame(lambda frame: vision.color_mask(frame, LOWER, UPPER), frames, repeat),
+        "lut": time_per_frame(lambda frame: lut.mask(frame, LOWER, UPPER), frames, repeat),
+        "agreement": min(agreement),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Compare HSV inRange masking with the quantised BGR lookup table")
+    parser.add_argument("--bits", type=int, nargs="+", default=[5, 6, 7], help="bits per channel of the table")
+    parser.add_argument("--scale", type=float, default=1.0, help="downscale test frames like ColorTracker does")
+    parser.add_argument("--frames", type=int, default=100, help="timing repetitions per test frame")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="lowest accepted fraction of equal mask pixels")
+    args = parser.parse_args(argv)
+
+    frames = test_frames(args.scale)
+    failed = False
+    print(f"{'bits':>4} {'entries':>8} {'rebuild ms':>10} {'hsv ms':>8} {'lut ms':>8} {'speedup':>8} {'agreement':>10}")
+    for bits in args.bits:
+        result = bench(bits, frames, args.frames)
+        failed |= result["agreement"] < args.min_agreement
+        print(
+            f"{bits:>4} {result['entries']:>8} {result['rebuild'] * 1000:>10.1f} {result['hsv'] * 1000:>8.3f} "
+            f"{result['lut'] * 1000:>8.3f} {result['hsv'] / result['lut']:>7.2f}x {result['agreement']:>10.4f}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+"""
+Frame buffer pool benchmark.
+
+Runs the line following and colour tracking stages of web/vision.py on a
+stream of frames, once letting OpenCV allocate every output and once writing
+into a FramePool, and reports the frame-sized arrays allocated per frame and
+the time per frame of each.
+
+Usage:
+  python -m scripts.bench_frame_pool
+  python -m scripts.bench_frame_pool --frames 500 --size 1280 720
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+
+import cv2  # pylint: disable=wrong-import-position
+import numpy as np  # pylint: disable=wrong-import-position
+import vision  # pylint: disable=wrong-import-position,import-error
+from frame_pool import FramePool  # pylint: disable=wrong-import-position,import-error
+
+# OpenCV functions used by the processing stages, counted when they allocate their output
+STAGES = ("cvtColor", "threshold", "erode", "dilate", "resize", "inRange", "GaussianBlur", "absdiff", "convertScaleAbs")
+LOWER = np.array([24, 100, 100])
+UPPER = np.array([44, 255, 255])
+
+
+class AllocationCounter:
+    """Wraps OpenCV stage functions and counts outputs that were not written into the given `dst`."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes = 0
+        self._originals = {}
+
+    def __enter__(self):
+        for name in STAGES:
+            self._originals[name] = getattr(cv2, name)
+            setattr(cv2, name, self._wrap(self._originals[name]))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, function in self._originals.items():
+            setattr(cv2, name, function)
+
+    def _wrap(self, function):
+        def counted(*args, **kwargs):
+            result = function(*args, **kwargs)
+            dst = kwargs.get("dst")
+            for array in result if isinstance(result, tuple) else (result,):
+                if isinstance(array, np.ndarray) and (dst is None or not np.shares_memory(array, dst)):
+                    self.count += 1
+                    self.bytes += array.nbytes
+            return result
+
+        return counted
+
+
+def line_following(frame, roi, pool):
+    vision.scan_lines(frame, 80, roi, pool)
+    # the overlay shows the binarized frame
+    vision.binarize(frame, 80, pool)
+
+
+def color_tracking(frame, tracker, _pool):
+    tracker.find(frame, LOWER, UPPER)
+
+
+def bench(stage, frames: list, pool: FramePool | None, state) -> dict:
+    stage(frames[0], state, pool)  # warm up: the pool allocates its buffers here
+    with AllocationCounter() as counter:
+        start = time.perf_counter()
+        for frame in frames:
+            stage(frame, state, pool)
+        elapsed = time.perf_counter() - start
+    return {
+        "allocations": counter.count / len(frames),
+        "bytes": counter.bytes / len(frames),
+        "seconds": elapsed / len(frames),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Compare per-frame allocations with and without a FramePool")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args(argv)
+    width, height = args.size
+
+    line_frames = [vision.synthetic_line_frame(width, height, seed=seed) for seed in range(4)] * (args.frames // 4)
+    target_frames = [
+        vision.synthetic_target_frame(width // 4 + index, height // 2, width=width, height=height, seed=index % 4)
+        for index in range(args.frames)
+    ]
+    print(f"{'stage':<16} {'pool':<5} {'allocs/frame':>12} {'kB/frame':>9} {'ms/frame':>9}")
+    for name, stage, frames, make_state in (
+        ("line following", line_following, line_frames, lambda pool: vision.LineScanROI((height - 40, height - 100))),
+        ("colour tracking", color_tracking, target_frames, lambda pool: vision.ColorTracker(pool=pool)),
+    ):
+        for pool in (None, FramePool()):
+            result = bench(stage, frames, pool, make_state(pool))
+            print(
+                f"{name:<16} {'yes' if pool else 'no':<5} {result['allocations']:>12.1f} "
+                f"{result['bytes'] / 1024:>9.1f} {result['seconds'] * 1000:>9.3f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
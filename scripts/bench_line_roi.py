@@ -0,0 +1,63 @@
+"""
+Line following region-of-interest benchmark.
+
+Times the line following preprocessing (grayscale, threshold, erode, dilate)
+on the full frame against the scanline bands of web/vision.py, and checks
+that both give identical scanlines.
+
+Usage:
+  python -m scripts.bench_line_roi
+  python -m scripts.bench_line_roi --frames 500 --rows 440 380 --size 1280 720
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+
+import numpy as np  # pylint: disable=wrong-import-position
+import vision  # pylint: disable=wrong-import-position,import-error
+
+
+def time_per_frame(function, frames: int) -> float:
+    """Return the average seconds per call of `function` over `frames` calls."""
+    start = time.perf_counter()
+    for _ in range(frames):
+        function()
+    return (time.perf_counter() - start) / frames
+
+
+def bench(width: int, height: int, rows: list[int], frames: int, threshold: int = 80) -> dict:
+    frame = vision.synthetic_line_frame(width, height)
+    roi = vision.LineScanROI(rows)
+    full = vision.scan_lines_full(frame, threshold, rows)
+    banded = vision.scan_lines(frame, threshold, roi)
+    return {
+        "equal": all(np.array_equal(full[row], banded[row]) for row in rows),
+        "full": time_per_frame(lambda: vision.scan_lines_full(frame, threshold, rows), frames),
+        "roi": time_per_frame(lambda: vision.scan_lines(frame, threshold, roi), frames),
+        "roi_rows": sum(bottom - top for top, bottom, _ in roi.get_bands(height)),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Compare full-frame and ROI line following preprocessing")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--rows", type=int, nargs="+", default=[440, 380], help="scanlines (linePos_1, linePos_2)")
+    args = parser.parse_args(argv)
+
+    result = bench(args.size[0], args.size[1], args.rows, args.frames)
+    print(f"rows processed: {result['roi_rows']} of {args.size[1]}")
+    print(f"full frame: {result['full'] * 1000:.3f} ms/frame")
+    print(f"ROI bands:  {result['roi'] * 1000:.3f} ms/frame ({result['full'] / result['roi']:.1f}x faster)")
+    print(f"scanlines identical: {result['equal']}")
+    return 0 if result["equal"] else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
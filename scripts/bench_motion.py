@@ -0,0 +1,75 @@
+"""
+Motion detection benchmark.
+
+Runs the watchDog MotionDetector of web/vision.py over a synthetic scene that
+stays still and then contains a moving block, and reports the CPU time per
+frame of both phases, how many frames went through contour analysis and
+whether the block was found.
+
+Usage:
+  python -m scripts.bench_motion
+  python -m scripts.bench_motion --frames 200 --size 1280 720 --threshold 8 --min-changed 0.005
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+
+import vision  # pylint: disable=wrong-import-position,import-error
+from frame_pool import FramePool  # pylint: disable=wrong-import-position,import-error
+
+
+def run_phase(detector, frames) -> dict:
+    """Feed `frames` to `detector` and return its CPU time per frame and detections."""
+    cpu_time = detector.cpu_time
+    analysed = detector.analysed
+    detected = 0
+    for frame in frames:
+        if detector.detect(frame):
+            detected += 1
+    return {
+        "cpu": (detector.cpu_time - cpu_time) / len(frames),
+        "analysed": detector.analysed - analysed,
+        "detected": detected,
+    }
+
+
+def bench(width: int, height: int, frames: int, threshold: int, min_changed: float) -> dict:
+    still = frames // 2
+    sequence = vision.synthetic_motion_frames(frames, width, height, start=still)
+    detector = vision.MotionDetector(pixel_threshold=threshold, min_changed=min_changed, pool=FramePool())
+    # the first frame only initialises the background
+    return {
+        "still": run_phase(detector, sequence[:still]),
+        "moving": run_phase(detector, sequence[still:]),
+        "still_frames": still - 1,
+        "moving_frames": frames - still,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Measure the CPU time per frame of the watchDog motion detector")
+    parser.add_argument("--frames", type=int, default=100, help="half still, half with a moving block")
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--threshold", type=int, default=vision.MOTION_PIXEL_THRESHOLD, help="grey level change")
+    parser.add_argument("--min-changed", type=float, default=vision.MOTION_MIN_CHANGED, help="changed pixel fraction")
+    args = parser.parse_args(argv)
+
+    result = bench(args.size[0], args.size[1], args.frames, args.threshold, args.min_changed)
+    for phase in ("still", "moving"):
+        stats = result[phase]
+        print(
+            f"{phase:>6}: {stats['cpu'] * 1000:.3f} ms CPU/frame, "
+            f"contours on {stats['analysed']} of {result[phase + '_frames']} frames, motion in {stats['detected']}"
+        )
+    ok = result["still"]["detected"] == 0 and result["moving"]["detected"] == result["moving_frames"]
+    print(f"still scene ignored and moving block found: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+"""
+SPI LED strip throughput benchmark.
+
+Encodes and sends a full strip repeatedly for several transfer chunk sizes and
+reports the measured throughput of each, so the chunk size used for long LED
+strips can be chosen on the target Raspberry Pi.
+
+Usage:
+  python -m scripts.bench_spi                      # 300 LEDs, default chunk sizes
+  python -m scripts.bench_spi --count 600 --chunks 512 1024 4096 --streaming
+  python -m scripts.bench_spi --simulate           # timing-modelled bus, no hardware
+
+Without --simulate this requires spidev and an enabled SPI bus (see
+SpiController for setup hints).
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from src.controllers.leds import PREDEFINED_COLORS
+from src.hardware.backends import REAL, SIMULATED, create_spi_controller
+
+DEFAULT_CHUNK_SIZES = [256, 512, 1024, 2048, 4096]
+
+
+def bench_chunk_size(spi, count: int, frames: int) -> dict:
+    """Write `frames` full strips of `count` LEDs and return the transfer statistics."""
+    led_color = list(PREDEFINED_COLORS["white"]) * count
+    spi.reset_stats()
+    for _ in range(frames):
+        spi.write(led_color)
+    return {
+        "chunk_size": spi.chunk_size,
+        "bytes": spi.bytes_sent,
+        "transfers": spi.transfer_count,
+        "seconds": spi.transfer_time,
+        "throughput": spi.throughput(),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Measure SPI LED throughput per transfer chunk size")
+    parser.add_argument("--bus", type=int, default=0)
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--count", type=int, default=300, help="number of LEDs on the strip")
+    parser.add_argument("--frames", type=int, default=50, help="strip updates per chunk size")
+    parser.add_argument("--chunks", type=int, nargs="+", default=DEFAULT_CHUNK_SIZES)
+    parser.add_argument("--streaming", action="store_true", help="send numpy buffers with writebytes2")
+    parser.add_argument("--simulate", action="store_true", help="use the simulated SPI backend")
+    args = parser.parse_args(argv)
+
+    print(f"{'chunk':>6} {'transfers':>10} {'bytes':>10} {'seconds':>9} {'kB/s':>9}")
+    for chunk_size in args.chunks:
+        spi = create_spi_controller(
+            SIMULATED if args.simulate else REAL,
+            bus=args.bus,
+            device=args.device,
+            chunk_size=chunk_size,
+            streaming=args.streaming,
+        )
+        try:
+            result = bench_chunk_size(spi, args.count, args.frames)
+        finally:
+            spi.close()
+        print(
+            f"{result['chunk_size']:>6} {result['transfers']:>10} {result['bytes']:>10} "
+            f"{result['seconds']:>9.3f} {result['throughput'] / 1000:>9.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,260 @@
+"""
+End-to-end video streaming benchmark.
+
+Runs the streaming pipeline of web/app.py on any Linux machine: Camera reads
+from a frame source (web/frame_source.py, a synthetic scene by default), runs
+the vision mode and draws its overlays, and N simulated MJPEG clients pull
+frames through app.gen() in their own threads, as Flask serves them. For each
+vision mode and client count it reports the capture, vision and per-client
+frame rates, the per-stage times of web/latency.py and the CPU time of the
+capture thread, the vision worker and each client. With --processes the
+image work of the vision modes runs in that many worker processes
+(web/vision_process.py) and their CPU time is reported separately.
+
+The servo, motor and switch modules driven by the vision modes are replaced
+by inert ones, so the robot never moves during a benchmark.
+
+Usage:
+  python -m scripts.bench_stream
+  python -m scripts.bench_stream --modes none findColor --clients 1 4 8 --seconds 10
+  python -m scripts.bench_stream --source video:run.mp4 --profile low --fps 60 --json results.json
+  python -m scripts.bench_stream --modes findColor findlineCV --processes 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+
+from base_camera import BaseCamera  # pylint: disable=wrong-import-position,import-error
+from frame_cache import parse_stream_profile  # pylint: disable=wrong-import-position,import-error
+from stream_governor import StreamGovernor  # pylint: disable=wrong-import-position,import-error
+
+HARDWARE_MODULES = ("RPIservo", "move", "switch")
+MODES = ("none", "findColor", "findlineCV", "watchDog")
+
+
+class Inert:
+    """Accepts any attribute access and any call, and does nothing."""
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+def load_app(source: str, fps: int, quality: int, processes: int = 0):
+    """Import web/app.py with inert hardware, reading frames from `source` at a fixed fps and JPEG quality,
+    with `processes` vision worker processes."""
+    for name in HARDWARE_MODULES:
+        sys.modules[name] = Inert()
+    import camera_opencv  # pylint: disable=import-outside-toplevel,import-error
+
+    camera_opencv.Camera.set_video_source(source)
+    camera_opencv.Camera.vision_processes = processes
+    # fixed settings: the governor would otherwise adapt them to the load being measured
+    BaseCamera.governor = StreamGovernor(levels=((fps, quality, 1.0),))
+    import app  # pylint: disable=import-outside-toplevel,import-error
+
+    return app
+
+
+def thread_cpu(thread) -> float:
+    """Return the CPU seconds used so far by a running threading.Thread, 0 if it is gone."""
+    native_id = getattr(thread, "native_id", None)
+    for info in psutil.Process().threads():
+        if info.id == native_id:
+            return info.user_time + info.system_time
+    return 0.0
+
+
+class Client(threading.Thread):
+    """One MJPEG viewer: pulls frames from app.gen() until stopped."""
+
+    def __init__(self, app, profile, number: int):
+        super().__init__(name=f"bench-client-{number}", daemon=True)
+        self.app = app
+        self.profile = profile
+        self.address = f"bench-{number}"
+        self.frames = 0
+        self.bytes = 0
+        self.cpu = 0.0
+        self.stop = threading.Event()
+
+    def run(self):
+        stream = self.app.gen(self.app.camera, self.profile, self.address)
+        try:
+            for chunk in stream:
+                self.frames += 1
+                self.bytes += len(chunk)
+                self.cpu = time.thread_time()
+                if self.stop.is_set():
+                    break
+        finally:
+            stream.close()
+
+    def counters(self) -> tuple:
+        return self.frames, self.bytes, self.cpu
+
+
+def worker_cpu(cvt) -> tuple:
+    """Return the frames analysed and CPU seconds used so far by the vision worker processes of `cvt`."""
+    processes = cvt.processes
+    if processes is None:
+        return 0, 0.0
+    return processes.done, processes.cpu_time
+
+
+def stage(stats: dict, name: str, key: str = "p50_ms"):
+    return stats["stages"].get(name, {}).get(key)
+
+
+def run(app, mode: str, clients: int, profile, *, seconds: float, warmup: float) -> dict:
+    """Stream to `clients` viewers in vision `mode` and return the measurements of the last `seconds`."""
+    camera = app.camera
+    app.Camera.modeSelect = mode
+    camera.start()
+    viewers = [Client(app, profile, number) for number in range(clients)]
+    for viewer in viewers:
+        viewer.start()
+    time.sleep(warmup)
+
+    cvt = app.Camera.cvt
+    capture_thread = BaseCamera.thread
+    before = {
+        "generation": camera.event.generation,
+        "vision": cvt.rate.count,
+        "capture_cpu": thread_cpu(capture_thread),
+        "vision_cpu": thread_cpu(cvt),
+        "worker_cpu": worker_cpu(cvt),
+        "process_cpu": time.process_time(),
+        "clients": [viewer.counters() for viewer in viewers],
+        "time": time.monotonic(),
+    }
+    camera.latency.reset()
+    time.sleep(seconds)
+    latency = camera.latency.stats()
+    elapsed = time.monotonic() - before["time"]
+    captured = camera.event.generation - before["generation"]
+    processed = cvt.rate.count - before["vision"]
+    client_counts = [
+        tuple(now - then for now, then in zip(viewer.counters(), start)) for viewer, start in zip(viewers, before["clients"])
+    ]
+    process_cpu = time.process_time() - before["process_cpu"]
+    capture_cpu = thread_cpu(capture_thread) - before["capture_cpu"]
+    vision_cpu = thread_cpu(cvt) - before["vision_cpu"]
+    analysed, worker_seconds = (now - then for now, then in zip(worker_cpu(cvt), before["worker_cpu"]))
+
+    for viewer in viewers:
+        viewer.stop.set()
+    for viewer in viewers:
+        viewer.join(timeout=5)
+    app.Camera.modeSelect = "none"
+
+    client_fps = [frames / elapsed for frames, _, _ in client_counts]
+    client_cpu = [cpu / elapsed * 100 for _, _, cpu in client_counts]
+    return {
+        "mode": mode,
+        "clients": clients,
+        "capture_fps": captured / elapsed,
+        "vision_fps": processed / elapsed,
+        "client_fps": sum(client_fps) / clients,
+        "client_kbps": sum(size for _, size, _ in client_counts) / clients / elapsed * 8 / 1000,
+        "dropped": sum(client["dropped"] for client in latency["clients"]),
+        "publish_ms": stage(latency, "publish"),
+        "encode_ms": stage(latency, "encode"),
+        "send_ms": stage(latency, "send"),
+        "send_p95_ms": stage(latency, "send", "p95_ms"),
+        "vision_ms": stage(latency, "vision"),
+        "process_cpu": process_cpu / elapsed * 100,
+        "capture_cpu_ms": capture_cpu / captured * 1000 if captured else None,
+        "vision_cpu_ms": vision_cpu / processed * 1000 if processed else None,
+        "worker_cpu_ms": worker_seconds / analysed * 1000 if analysed else None,
+        "client_cpu": sum(client_cpu) / clients,
+    }
+
+
+def fmt(value, spec: str = ".1f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_results(results: list) -> None:
+    columns = (
+        ("mode", "mode", "s"),
+        ("clients", "clients", "d"),
+        ("cap fps", "capture_fps", ".1f"),
+        ("cv fps", "vision_fps", ".1f"),
+        ("client fps", "client_fps", ".1f"),
+        ("kbit/s", "client_kbps", ".0f"),
+        ("publish ms", "publish_ms", ".1f"),
+        ("encode ms", "encode_ms", ".1f"),
+        ("send ms", "send_ms", ".1f"),
+        ("send p95", "send_p95_ms", ".1f"),
+        ("vision ms", "vision_ms", ".1f"),
+        ("cap cpu ms/f", "capture_cpu_ms", ".2f"),
+        ("cv cpu ms/f", "vision_cpu_ms", ".2f"),
+        ("worker cpu ms/f", "worker_cpu_ms", ".2f"),
+        ("cpu/client %", "client_cpu", ".1f"),
+        ("process cpu %", "process_cpu", ".0f"),
+    )
+    rows = [[fmt(result[key], spec) for _, key, spec in columns] for result in results]
+    widths = [max([len(title)] + [len(row[index]) for row in rows]) for index, (title, _, _) in enumerate(columns)]
+    print("  ".join(title.rjust(width) for (title, _, _), width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Measure the streaming pipeline end to end without camera or robot")
+    parser.add_argument("--source", default="synthetic", help="frame_source.open_source() name, e.g. images:<dir>")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4], help="numbers of MJPEG clients to try")
+    parser.add_argument("--profile", default="auto", help="stream profile of the clients, e.g. low")
+    parser.add_argument("--fps", type=int, default=30, help="capture frame rate cap")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of the auto profile")
+    parser.add_argument("--seconds", type=float, default=5.0, help="measured time per run")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured time before each run")
+    parser.add_argument("--processes", type=int, default=0, help="vision worker processes, 0: the vision thread")
+    parser.add_argument("--overlay", action="store_true", help="draw the latency overlay on every frame")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    profile = parse_stream_profile({"profile": args.profile})
+    app = load_app(args.source, args.fps, args.quality, args.processes)
+    app.camera.latency.overlay = args.overlay
+    print(
+        f"source {args.source}, cap {args.fps} fps, profile {args.profile}, {args.processes} vision processes, "
+        f"{psutil.cpu_count()} CPUs"
+    )
+    results = []
+    try:
+        for mode in args.modes:
+            for clients in args.clients:
+                results.append(run(app, mode, clients, profile, seconds=args.seconds, warmup=args.warmup))
+    finally:
+        # let the capture thread stop so the program can exit
+        app.Camera.modeSelect = "none"
+        BaseCamera.idle_timeout = 0
+        thread = BaseCamera.thread
+        if thread is not None:
+            thread.join(timeout=5)
+        if app.Camera.cvt is not None:
+            app.Camera.cvt.useProcesses(0)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
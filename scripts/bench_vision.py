@@ -0,0 +1,386 @@
+"""
+Vision algorithm benchmark on a recorded frame corpus.
+
+Times the findlineCV, findColor, watchDog and watchDogFull methods of the
+CVThread in web/camera_opencv.py on the frames of scripts/vision_corpus/, and
+checks what they find against the corpus ground truth: line centre, colour
+target position and motion boxes. Every frame is processed --rounds times;
+the time of a frame is its median over the rounds, and a frame whose result
+changes between rounds is reported as unstable.
+
+The results are compared with scripts/vision_corpus/baseline.json: an
+algorithm slower than the baseline by more than --tolerance, or a result that
+moved, fails the run. Timings are only compared when the baseline was
+recorded on the same kind of machine. Save a new baseline with
+--save-baseline after an intended change.
+
+The corpus is generated by --make-corpus: a textured floor under uneven
+light with sensor noise, JPEG compressed like camera frames, with tape lines,
+yellow targets and distractors, and a sequence where someone walks past.
+Real camera frames can be added to corpus.json with their expected values.
+
+Servo and motor commands of the algorithms go to inert modules.
+
+Usage:
+  python -m scripts.bench_vision
+  python -m scripts.bench_vision --rounds 50 --algorithms findColor watchDog
+  python -m scripts.bench_vision --save-baseline
+"""
+
+from __future__ import annotations
+
+# pylint cannot see the members of the cv2 extension module
+# pylint: disable=no-member
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+import psutil
+
+from scripts.bench_stream import HARDWARE_MODULES, Inert  # pylint: disable=import-error
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vision_corpus")
+MANIFEST = "corpus.json"
+BASELINE = "baseline.json"
+SIZE = (640, 480)
+JPEG_QUALITY = 80
+POSITION_TOLERANCE = 12  # pixels between a result and the ground truth or the baseline
+LINE_ROWS = (440, 380)  # scanlines of findlineCV, camera_opencv.linePos_1 and linePos_2
+TAPE = (225, 225, 220)
+YELLOW = (20, 220, 220)
+ORANGE = (20, 110, 240)
+
+
+def load_camera_module():
+    """Import web/camera_opencv.py with inert servo, motor and switch modules."""
+    for name in HARDWARE_MODULES:
+        sys.modules[name] = Inert()
+    import camera_opencv  # pylint: disable=import-outside-toplevel,import-error
+
+    return camera_opencv
+
+
+# Corpus generation
+
+
+def floor(rng, shadow: float = 1.0):
+    """A dark textured floor lit from one side, as a BGR float image; `shadow` darkens its left half."""
+    width, height = SIZE
+    blotches = cv2.resize(rng.normal(0, 6, (height // 20, width // 20)), SIZE, interpolation=cv2.INTER_CUBIC)
+    light = np.linspace(0.8, 1.2, width)[np.newaxis, :] * np.linspace(1.05, 0.9, height)[:, np.newaxis]
+    light[:, : width // 2] *= shadow
+    image = (np.array([40.0, 45.0, 50.0]) + blotches[..., np.newaxis]) * light[..., np.newaxis]
+    return image, light
+
+
+def paint(image, mask, color, light) -> None:
+    """Paint `color` where `mask` is set, under the same light as the floor."""
+    painted = np.array(color, dtype=np.float64) * light[..., np.newaxis]
+    image[mask > 0] = painted[mask > 0]
+
+
+def camera_finish(image, rng):
+    """Lens softness, sensor noise and 8 bit output."""
+    image = cv2.GaussianBlur(image, (3, 3), 0) + rng.normal(0, 3, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def line_centre(mask):
+    """Centre of the line at the findlineCV scanlines, averaged as findlineCV does, or None."""
+    centres = []
+    for row in LINE_ROWS:
+        columns = np.flatnonzero(mask[row])
+        if columns.size == 0:
+            return None
+        centres.append((columns[0] + columns[-1]) / 2)
+    return int(sum(centres) / len(centres))
+
+
+def target_position(mask):
+    """Centre of the enclosing circle of the largest blob of `mask`, as findColor reports it, or None."""
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    if not contours:
+        return None
+    (x, y), _ = cv2.minEnclosingCircle(max(contours, key=cv2.contourArea))
+    return [round(x, 1), round(y, 1)]
+
+
+def ball(image, light, centre, radius, color):
+    """Draw a shaded ball and return its mask."""
+    mask = np.zeros(SIZE[::-1], np.uint8)
+    cv2.circle(mask, centre, radius, 255, -1)
+    yy, xx = np.mgrid[0 : SIZE[1], 0 : SIZE[0]]
+    shading = 1.0 - 0.25 * np.clip(np.hypot(xx - centre[0], yy - centre[1]) / max(radius, 1), 0, 1)
+    paint(image, mask, color, light * shading)
+    return mask
+
+
+def line_frames(rng):
+    """(name, image, expected centre) of tape lines on the floor."""
+    width, height = SIZE
+    curve = [(int(320 + 110 * math.sin(y / 90)), y) for y in range(height, height // 3, -20)]
+    cases = (
+        ("center", [(320, height), (320, height // 3)], 1.0),
+        ("left", [(170, height), (170, height // 3)], 1.0),
+        ("right", [(470, height), (470, height // 3)], 1.0),
+        ("diagonal", [(250, height), (430, height // 3)], 1.0),
+        ("curve", curve, 1.0),
+        ("shadow", [(360, height), (300, height // 3)], 0.55),
+        ("none", None, 1.0),
+    )
+    for name, points, shadow in cases:
+        image, light = floor(rng, shadow)
+        mask = np.zeros((height, width), np.uint8)
+        if points:
+            cv2.polylines(mask, [np.array(points, np.int32)], False, 255, 36)
+            paint(image, mask, TAPE, light)
+        yield name, camera_finish(image, rng), line_centre(mask) if points else None
+
+
+def color_frames(rng):
+    """(name, image, expected target position) of yellow targets, other balls and none."""
+    cases = (
+        ("center", [((320, 240), 55, YELLOW)]),
+        ("left_up", [((140, 110), 40, YELLOW)]),
+        ("far", [((520, 330), 14, YELLOW)]),
+        ("edge", [((625, 260), 45, YELLOW)]),
+        ("two", [((230, 300), 50, YELLOW), ((480, 150), 20, YELLOW)]),
+        ("distractor", [((200, 200), 45, ORANGE), ((450, 300), 35, YELLOW)]),
+        ("none", [((320, 240), 50, ORANGE)]),
+    )
+    for name, balls in cases:
+        image, light = floor(rng)
+        target = np.zeros(SIZE[::-1], np.uint8)
+        for centre, radius, color in balls:
+            mask = ball(image, light, centre, radius, color)
+            if color == YELLOW:
+                target |= mask
+        yield name, camera_finish(image, rng), target_position(target)
+
+
+def motion_frames(rng, count: int = 10, start: int = 4):
+    """(name, image, expected box) of a still room that someone walks into at frame `start`."""
+    image, light = floor(rng)
+    furniture = np.zeros(SIZE[::-1], np.uint8)
+    cv2.rectangle(furniture, (30, 40), (190, 150), 255, -1)
+    cv2.rectangle(furniture, (420, 60), (600, 130), 255, -1)
+    paint(image, furniture, (90, 80, 70), light)
+    for index in range(count):
+        frame = image.copy()
+        box = None
+        if index >= start:
+            x = 80 + 70 * (index - start)
+            box = [x, 150, 100, 220]
+            walker = np.zeros(SIZE[::-1], np.uint8)
+            cv2.rectangle(walker, (x, 150), (x + 100, 370), 255, -1)
+            paint(frame, walker, (150, 120, 110), light)
+        yield f"walk_{index:02d}", camera_finish(frame, rng), box
+
+
+def make_corpus(directory: str) -> dict:
+    """Write the generated frames and their manifest to `directory`."""
+    rng = np.random.default_rng(2024)
+    manifest = {"line": [], "color": [], "motion": []}
+    for kind, frames in (("line", line_frames(rng)), ("color", color_frames(rng)), ("motion", motion_frames(rng))):
+        os.makedirs(os.path.join(directory, kind), exist_ok=True)
+        for name, image, expected in frames:
+            path = f"{kind}/{name}.jpg"
+            cv2.imwrite(os.path.join(directory, path), image, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+            manifest[kind].append({"file": path, "expected": expected})
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+# Benchmark
+
+
+def load_corpus(directory: str) -> dict:
+    """Return the manifest with each entry's frame decoded under "image", read-only as the vision worker gets it."""
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    for entries in manifest.values():
+        for entry in entries:
+            image = cv2.imread(os.path.join(directory, entry["file"]))
+            if image is None:
+                raise ValueError(f"cannot read {entry['file']}")
+            image.flags.writeable = False
+            entry["image"] = image
+    return manifest
+
+
+def algorithms(camera_opencv) -> dict:
+    """name -> (corpus kind, reset before a round, reset before a frame, run returning a JSON-able result)."""
+    cvt = camera_opencv.CVThread()
+
+    def find_color(image):
+        # the corpus stills are unrelated: every frame is a search of the whole frame
+        camera_opencv.color_tracker.last = None
+        values = cvt.findColor(image)
+        return [round(values["x"], 1), round(values["y"], 1)] if values["detected"] else None
+
+    def watch_dog(method):
+        def run(image):
+            counter = cvt.motionCounter
+            values = method(image)
+            return list(values["box"]) if cvt.motionCounter > counter else None
+
+        return run
+
+    def reset_motion():
+        cvt.full_motion.reset()
+        if camera_opencv.motion_detector is not None:
+            camera_opencv.motion_detector.reset()
+
+    return {
+        "findlineCV": ("line", lambda: None, lambda image: cvt.findlineCV(image)["center"]),
+        "findColor": ("color", lambda: None, find_color),
+        "watchDog": ("motion", reset_motion, watch_dog(cvt.watchDog)),
+        "watchDogFull": ("motion", reset_motion, watch_dog(cvt.watchDogFull)),
+    }
+
+
+def matches(kind: str, result, expected) -> bool:
+    """Whether `result` agrees with `expected` (ground truth or a baseline result)."""
+    if result is None or expected is None:
+        return result is None and expected is None
+    if kind == "line":
+        return abs(result - expected) <= POSITION_TOLERANCE
+    if kind == "color":
+        return math.dist(result, expected) <= POSITION_TOLERANCE
+    # motion boxes only need to overlap: the detector also marks where the walker was
+    x, y, w, h = result
+    ex, ey, ew, eh = expected
+    return x < ex + ew and ex < x + w and y < ey + eh and ey < y + h
+
+
+def bench(camera_opencv, corpus: dict, names: list, rounds: int) -> dict:
+    results = {}
+    for name, (kind, reset, run) in algorithms(camera_opencv).items():
+        if name not in names:
+            continue
+        entries = corpus[kind]
+        times = [[] for _ in entries]
+        outputs = [[] for _ in entries]
+        for _ in range(rounds):
+            reset()
+            for index, entry in enumerate(entries):
+                started = time.perf_counter()
+                output = run(entry["image"])
+                times[index].append(time.perf_counter() - started)
+                outputs[index].append(output)
+        frames = {}
+        for entry, frame_times, frame_outputs in zip(entries, times, outputs):
+            frames[entry["file"]] = {
+                "ms": round(statistics.median(frame_times) * 1000, 3),
+                "result": frame_outputs[0],
+                "stable": all(output == frame_outputs[0] for output in frame_outputs),
+                "correct": matches(kind, frame_outputs[0], entry["expected"]),
+            }
+        per_frame = [frame["ms"] for frame in frames.values()]
+        results[name] = {
+            "kind": kind,
+            "mean_ms": round(sum(per_frame) / len(per_frame), 3),
+            "max_ms": max(per_frame),
+            "frames": frames,
+        }
+    return results
+
+
+def machine() -> dict:
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": psutil.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(results: dict, baseline: dict | None, tolerance: float) -> list:
+    """Return the problems found: wrong or unstable results, moved results and, on the same machine, slowdowns."""
+    problems = []
+    same_machine = baseline is not None and baseline["machine"]["machine"] == machine()["machine"]
+    same_machine = same_machine and baseline["machine"]["cpus"] == machine()["cpus"]
+    for name, result in results.items():
+        for path, frame in result["frames"].items():
+            if not frame["correct"]:
+                problems.append(f"{name} {path}: result {frame['result']} differs from the corpus")
+            if not frame["stable"]:
+                problems.append(f"{name} {path}: result changes between rounds")
+        previous = baseline["algorithms"].get(name) if baseline else None
+        if previous is None:
+            continue
+        for path, frame in result["frames"].items():
+            before = previous["frames"].get(path)
+            if before is not None and not matches(result["kind"], frame["result"], before["result"]):
+                problems.append(f"{name} {path}: result {frame['result']} moved from baseline {before['result']}")
+        if same_machine and result["mean_ms"] > previous["mean_ms"] * (1 + tolerance):
+            problems.append(f"{name}: {result['mean_ms']:.3f} ms/frame, baseline {previous['mean_ms']:.3f} ms/frame")
+    return problems
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    print(f"{'algorithm':>13}  {'frames':>6}  {'ms/frame':>8}  {'max ms':>7}  {'baseline':>8}  {'change':>7}  correct")
+    for name, result in results.items():
+        previous = baseline["algorithms"].get(name) if baseline else None
+        frames = result["frames"].values()
+        correct = sum(frame["correct"] and frame["stable"] for frame in frames)
+        before = f"{previous['mean_ms']:.3f}" if previous else "-"
+        change = f"{(result['mean_ms'] / previous['mean_ms'] - 1) * 100:+.0f}%" if previous else "-"
+        print(
+            f"{name:>13}  {len(frames):>6}  {result['mean_ms']:>8.3f}  {result['max_ms']:>7.3f}  {before:>8}  {change:>7}  "
+            f"{correct}/{len(frames)}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    parser = argparse.ArgumentParser(description="Time the vision algorithms on the frame corpus and check their results")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="directory holding corpus.json and the frames")
+    parser.add_argument("--algorithms", nargs="+", default=["findlineCV", "findColor", "watchDog", "watchDogFull"])
+    parser.add_argument("--rounds", type=int, default=20, help="times each frame is processed")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--make-corpus", action="store_true", help="generate the corpus frames and exit")
+    args = parser.parse_args(argv)
+
+    if args.make_corpus:
+        manifest = make_corpus(args.corpus)
+        print(f"wrote {sum(len(entries) for entries in manifest.values())} frames to {args.corpus}")
+        return 0
+    camera_opencv = load_camera_module()
+    corpus = load_corpus(args.corpus)
+    # the algorithms print their state changes
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = bench(camera_opencv, corpus, args.algorithms, args.rounds)
+    baseline_path = os.path.join(args.corpus, BASELINE)
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine(), "rounds": args.rounds, "algorithms": results}, f, indent=1)
+        print(f"baseline saved to {baseline_path}")
+        return 0
+    if baseline is not None and baseline["machine"] != machine():
+        print(f"baseline recorded on {baseline['machine']}: timings compared only on the same machine and CPU count")
+    problems = compare(results, baseline, args.tolerance)
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+"""
+Precompress the web UI files.
+
+Compresses web/dist/ and controller_web/ into the on-disk cache of
+web/static_assets.py (web/.asset_cache/ unless ASSET_CACHE_DIR is set), so the
+first start of the web server on the robot does not spend its time in gzip
+and brotli. Files already in the cache are not compressed again. Prints the
+size of each directory as stored and as sent.
+
+Usage:
+  python -m scripts.build_assets
+  ASSET_CACHE_DIR=/var/cache/rasptank python -m scripts.build_assets
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+
+import static_assets  # pylint: disable=wrong-import-position,import-error
+
+
+def report(name: str, assets) -> str:
+    stats = assets.stats()
+    plain = sum(os.path.getsize(asset.path) for asset in assets.assets.values())
+    # what a client accepting gzip downloads
+    sent = sum(
+        len(asset.bodies["gzip"]) if "gzip" in asset.bodies else os.path.getsize(asset.path)
+        for asset in assets.assets.values()
+    )
+    return (
+        f"{name}: {stats['files']} files, {stats['compressed_files']} compressed "
+        f"({stats['compressed_at_load']} new), {plain / 1024:.0f} KiB -> {sent / 1024:.0f} KiB with gzip"
+        + (f", br {stats['br_bytes'] / 1024:.0f} KiB" if static_assets.brotli else ", brotli not installed")
+    )
+
+
+def main(argv: list[str] | None = None) -> int:  # pragma: no cover - command line entry point
+    if argv:
+        print(__doc__)
+        return 2
+    for name, root in (("dist", static_assets.DIST_DIR), ("controller_web", static_assets.CONTROLLER_DIR)):
+        print(report(name, static_assets.StaticAssets(root)))
+    print(f"cache: {static_assets.ASSET_CACHE_DIR}")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main(sys.argv[1:]))
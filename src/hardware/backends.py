@@ -0,0 +1,52 @@
+"""
+Hardware backend selection.
+
+The backend is chosen by the RASPTANK_HARDWARE environment variable:
+  real       (default) PCA9685 over busio I2C and WS2812 LEDs over spidev
+  simulated  timing-modelled devices from src.hardware.simulator
+
+The simulated I2C clock can be set with RASPTANK_SIM_I2C_HZ (100000 or 400000).
+Hardware modules are imported lazily so the simulated backend runs on machines
+without the Raspberry Pi libraries.
+"""
+
+from __future__ import annotations
+
+import os
+
+HARDWARE_BACKEND_ENV = "RASPTANK_HARDWARE"
+SIM_I2C_HZ_ENV = "RASPTANK_SIM_I2C_HZ"
+REAL = "real"
+SIMULATED = "simulated"
+BACKENDS = (REAL, SIMULATED)
+
+
+def backend_name(backend: str | None = None) -> str:
+    """Return the requested backend, falling back to the environment configuration."""
+    name = (backend or os.environ.get(HARDWARE_BACKEND_ENV) or REAL).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown hardware backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return name
+
+
+def create_pca9685_controller(backend: str | None = None, **kwargs):
+    if backend_name(backend) == SIMULATED:
+        from src.hardware.simulator import SimulatedPCA9685Controller  # pylint: disable=import-outside-toplevel
+
+        if SIM_I2C_HZ_ENV in os.environ:
+            kwargs.setdefault("i2c_hz", int(os.environ[SIM_I2C_HZ_ENV]))
+        return SimulatedPCA9685Controller(**kwargs)
+
+    from src.hardware.pca9685_controller import PCA9685Controller  # pylint: disable=import-outside-toplevel
+
+    return PCA9685Controller(**kwargs)
+
+
+def create_spi_controller(backend: str | None = None, *, realtime: bool = True, **kwargs):
+    from src.hardware.spi_controller import SpiController  # pylint: disable=import-outside-toplevel
+
+    if backend_name(backend) == SIMULATED:
+        from src.hardware.simulator import SimulatedSpiDev  # pylint: disable=import-outside-toplevel
+
+        kwargs.setdefault("spi_dev", SimulatedSpiDev(realtime=realtime))
+    return SpiController(**kwargs)
@@ -0,0 +1,204 @@
+"""
+Single owner thread for the PCA9685 I2C bus.
+
+Servo threads and the motor controller all update PCA9685 channels. Instead of
+letting each thread drive the bus directly, channel writes are queued to one
+I2CBusOwner thread which performs them one at a time. Pending updates of the
+same channel are merged so only the newest value is written, and the owner
+keeps bus utilisation, queue depth and per-write latency figures.
+
+The owner thread starts with the first queued write, so creating a bus owner
+at import time starts nothing.
+
+Usage:
+  bus = I2CBusOwner()
+  controller = bus.wrap(PCA9685Controller())  # motors and servos now write through the queue
+  bus.stats()
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_UTILISATION_WINDOW = 1.0
+DEFAULT_LATENCY_SAMPLES = 256
+
+
+class QueuedPWMChannel:
+    """PWM channel proxy whose duty cycle updates go through the bus owner queue."""
+
+    def __init__(self, owner: "I2CBusOwner", channel) -> None:
+        self._owner = owner
+        self._channel = channel
+        # Reading back from the device would cost a bus transaction; remember the last requested value instead
+        self._duty_cycle = 0
+
+    @property
+    def frequency(self):
+        return self._channel.frequency
+
+    @property
+    def duty_cycle(self) -> int:
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value: int) -> None:
+        self._duty_cycle = value
+        self._owner.submit(self._channel, value)
+
+
+class QueuedChannels:
+    """Indexable view over a controller's channels returning queued proxies, created on first use."""
+
+    def __init__(self, owner: "I2CBusOwner", channels) -> None:
+        self._owner = owner
+        self._channels = channels
+        self._proxies = {}
+
+    def __getitem__(self, index):
+        if index not in self._proxies:
+            self._proxies[index] = QueuedPWMChannel(self._owner, self._channels[index])
+        return self._proxies[index]
+
+
+class I2CBusOwner(threading.Thread):  # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        *,
+        blocking: bool = True,
+        min_interval: float = 0.0,
+        window: float = DEFAULT_UTILISATION_WINDOW,
+        latency_samples: int = DEFAULT_LATENCY_SAMPLES,
+        clock=time.monotonic,
+    ) -> None:
+        # Blocking submitters wait until their value (or a newer merged one) is on the bus,
+        # which keeps the pacing of servo loops that rely on the write duration
+        self.blocking = blocking
+        # Minimum time between two bus writes, caps the bus load when it saturates
+        self.min_interval = min_interval
+        self.window = window
+        self._clock = clock
+        self._condition = threading.Condition()
+        # channel -> [value, first submit time, ticket]; insertion order is the write order
+        self._pending = OrderedDict()
+        self._tickets = {}
+        self._completed = {}
+        self._failures = {}
+        self._recent_writes = deque()
+        self._latencies = deque(maxlen=latency_samples)
+
+        self.write_count = 0
+        self.merged_count = 0
+        self.error_count = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+
+        self._running = True
+        self._start_lock = threading.Lock()
+        super().__init__(name="i2c-bus-owner")
+        # Make the worker a daemon so it never blocks process exit in tests/CI
+        self.daemon = True
+
+    def wrap(self, controller):
+        """Route all channel writes of a PCA9685 controller through this bus owner."""
+        controller.channels = QueuedChannels(self, controller.channels)
+        return controller
+
+    def submit(self, channel, value, *, blocking: bool | None = None) -> None:
+        """Queue a duty cycle write, merging it with a pending write of the same channel."""
+        blocking = self.blocking if blocking is None else blocking
+        self._ensure_started()
+        with self._condition:
+            ticket = self._tickets.get(channel, 0) + 1
+            self._tickets[channel] = ticket
+            entry = self._pending.get(channel)
+            if entry is None:
+                self._pending[channel] = [value, self._clock(), ticket]
+                self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+            else:
+                entry[0] = value
+                entry[2] = ticket
+                self.merged_count += 1
+            self._condition.notify_all()
+            if not blocking:
+                return
+            self._condition.wait_for(lambda: self._completed.get(channel, 0) >= ticket or not self._running)
+            failure = self._failures.get(channel)
+            if failure is not None and failure[0] >= ticket:
+                raise failure[1]
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self.ident is None and self._running:
+                self.start()
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or not self._running)
+                if not self._pending:
+                    # Stopped and drained: pending motor stops are still written before exiting
+                    break
+                channel, (value, submitted, ticket) = self._pending.popitem(last=False)
+            self.__write(channel, value, submitted, ticket)
+
+    def __write(self, channel, value, submitted, ticket):
+        start = self._clock()
+        error = None
+        try:
+            channel.duty_cycle = value
+        except (OSError, ValueError) as exc:
+            error = exc
+        end = self._clock()
+        with self._condition:
+            if error is None:
+                self.write_count += 1
+                self.busy_time += end - start
+                self._recent_writes.append((end, end - start))
+                self._latencies.append(end - submitted)
+            else:
+                self.error_count += 1
+                self._failures[channel] = (ticket, error)
+            self._completed[channel] = ticket
+            self._condition.notify_all()
+        if self.min_interval > end - start:
+            time.sleep(self.min_interval - (end - start))
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def utilisation(self) -> float:
+        """Return the fraction of the last `window` seconds the bus spent writing."""
+        with self._condition:
+            horizon = self._clock() - self.window
+            while self._recent_writes and self._recent_writes[0][0] < horizon:
+                self._recent_writes.popleft()
+            return min(1.0, sum(duration for _, duration in self._recent_writes) / self.window)
+
+    def stats(self) -> dict:
+        utilisation = self.utilisation()
+        with self._condition:
+            latencies = list(self._latencies)
+            return {
+                "writes": self.write_count,
+                "merged": self.merged_count,
+                "errors": self.error_count,
+                "queue_depth": len(self._pending),
+                "max_queue_depth": self.max_queue_depth,
+                "busy_time": self.busy_time,
+                "utilisation": utilisation,
+                "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "latency_max": max(latencies, default=0.0),
+            }
+
+    def stop_thread(self, timeout: float = 1.0):
+        """Signal the worker to stop once the queue is drained and wait for it to terminate."""
+        with self._start_lock:
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+            if self.ident is not None:
+                self.join(timeout)
@@ -0,0 +1,261 @@
+"""
+Simulated PCA9685 and SPI backends with a bus timing model.
+
+The simulated devices expose the same interface as PCA9685Controller and the
+spidev device used by SpiController, but instead of talking to hardware they
+model the duration of each bus transaction from its size and clock rate and
+record every write with a timestamp. This lets servo, motor and LED code be
+exercised and benchmarked on a normal Linux box.
+
+This module is intentionally dependency-free so it can be imported without
+the Raspberry Pi hardware libraries.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque, namedtuple
+
+from src.hardware.pca9685_controller import (
+    MOTOR_1_NEGATIVE_POLE,
+    MOTOR_1_POSITIVE_POLE,
+    MOTOR_2_NEGATIVE_POLE,
+    MOTOR_2_POSITIVE_POLE,
+    FREQ,
+)
+
+I2C_STANDARD_MODE_HZ = 100_000
+I2C_FAST_MODE_HZ = 400_000
+WS2812_SPI_HZ = 6_400_000
+
+# One PCA9685 channel update: device address, register, LEDn_ON_L/H and LEDn_OFF_L/H
+PCA9685_CHANNEL_WRITE_BYTES = 6
+PCA9685_CHANNEL_COUNT = 16
+DEFAULT_RECORD_LIMIT = 100_000
+
+BusWrite = namedtuple("BusWrite", ["timestamp", "target", "value", "nbytes", "duration"])
+
+
+class BusTimingModel:
+    """Duration of a bus transaction: serialized bits at the bus clock plus a fixed per-transaction latency."""
+
+    def __init__(self, clock_hz: int, *, bits_per_byte: int = 8, overhead_bits: int = 0, latency: float = 0.0) -> None:
+        if clock_hz <= 0:
+            raise ValueError(f"Invalid bus clock {clock_hz}")
+        self.clock_hz = clock_hz
+        self.bits_per_byte = bits_per_byte
+        self.overhead_bits = overhead_bits
+        self.latency = latency
+
+    def duration(self, nbytes: int) -> float:
+        return (nbytes * self.bits_per_byte + self.overhead_bits) / self.clock_hz + self.latency
+
+    def bandwidth(self) -> float:
+        """Return the payload bandwidth in bytes per second, ignoring per-transaction costs."""
+        return self.clock_hz / self.bits_per_byte
+
+
+def i2c_timing(clock_hz: int = I2C_FAST_MODE_HZ, latency: float = 50e-6) -> BusTimingModel:
+    """I2C: every byte is followed by an ACK bit, each transaction adds START and STOP conditions."""
+    return BusTimingModel(clock_hz, bits_per_byte=9, overhead_bits=2, latency=latency)
+
+
+def spi_timing(clock_hz: int = WS2812_SPI_HZ, latency: float = 10e-6) -> BusTimingModel:
+    return BusTimingModel(clock_hz, bits_per_byte=8, latency=latency)
+
+
+class SimulatedBus:
+    """A bus carrying one transaction at a time, recording each write with its start time and duration.
+
+    With realtime=True writers are blocked for the modelled duration, like on real hardware.
+    Otherwise only the bus clock advances, which keeps tests and batch benchmarks fast.
+    Written values are kept in the records only with capture_payloads=True; otherwise a record holds
+    None as value, so long runs with large SPI frames keep only their sizes.
+    """
+
+    def __init__(
+        self,
+        timing: BusTimingModel,
+        *,
+        realtime: bool = True,
+        record_limit: int = DEFAULT_RECORD_LIMIT,
+        capture_payloads: bool = False,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ) -> None:
+        self.timing = timing
+        self.realtime = realtime
+        self.records = deque(maxlen=record_limit)
+        self.capture_payloads = capture_payloads
+        self.write_count = 0
+        self.bytes_written = 0
+        self.busy_time = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._busy_until = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, target, value, nbytes: int) -> float:
+        """Perform one transaction and return its modelled duration in seconds."""
+        duration = self.timing.duration(nbytes)
+        with self._lock:
+            # A transaction starts once the previous one has left the bus
+            start = max(self._clock(), self._busy_until)
+            self._busy_until = start + duration
+            if self.realtime:
+                self._sleep(duration)
+            self.records.append(BusWrite(start, target, value if self.capture_payloads else None, nbytes, duration))
+            self.write_count += 1
+            self.bytes_written += nbytes
+            self.busy_time += duration
+        return duration
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.write_count,
+            "bytes": self.bytes_written,
+            "busy_time": self.busy_time,
+        }
+
+
+class SimulatedPWMChannel:
+    def __init__(self, bus: SimulatedBus, index: int) -> None:
+        self.bus = bus
+        self.index = index
+        self.frequency = FREQ
+        self._duty_cycle = 0
+
+    @property
+    def duty_cycle(self) -> int:
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value: int) -> None:
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError(f"Out of range duty cycle {value}")
+        self.bus.write(self.index, value, PCA9685_CHANNEL_WRITE_BYTES)
+        self._duty_cycle = value
+
+
+class SimulatedServo:
+    """Angle to pulse conversion of adafruit_motor.servo.Servo on a simulated channel."""
+
+    def __init__(self, channel, *, min_pulse=750, max_pulse=2250, actuation_range=180, frequency=FREQ) -> None:
+        self.channel = channel
+        self.actuation_range = actuation_range
+        self._min_duty = int((min_pulse * frequency) / 1_000_000 * 0xFFFF)
+        self._duty_range = int((max_pulse * frequency) / 1_000_000 * 0xFFFF) - self._min_duty
+        self._angle = None
+
+    @property
+    def angle(self):
+        return self._angle
+
+    @angle.setter
+    def angle(self, new_angle) -> None:
+        if new_angle is None:
+            self.channel.duty_cycle = 0
+        else:
+            if not 0 <= new_angle <= self.actuation_range:
+                raise ValueError("Angle out of range")
+            self.channel.duty_cycle = self._min_duty + int(new_angle / self.actuation_range * self._duty_range)
+        self._angle = new_angle
+
+
+class SimulatedDCMotor:
+    """Slow decay throttle handling of adafruit_motor.motor.DCMotor on two simulated channels."""
+
+    def __init__(self, positive_pwm, negative_pwm) -> None:
+        self._positive = positive_pwm
+        self._negative = negative_pwm
+        self._throttle = None
+        self.decay_mode = None
+
+    @property
+    def throttle(self):
+        return self._throttle
+
+    @throttle.setter
+    def throttle(self, value) -> None:
+        if value is not None and not -1.0 <= value <= 1.0:
+            raise ValueError("Throttle must be None or between -1.0 and +1.0")
+        self._throttle = value
+        if value is None:
+            self._positive.duty_cycle = 0
+            self._negative.duty_cycle = 0
+        elif value == 0:
+            self._positive.duty_cycle = 0xFFFF
+            self._negative.duty_cycle = 0xFFFF
+        else:
+            duty_cycle = int(0xFFFF * abs(value))
+            if value < 0:
+                self._positive.duty_cycle = 0xFFFF - duty_cycle
+                self._negative.duty_cycle = 0xFFFF
+            else:
+                self._positive.duty_cycle = 0xFFFF
+                self._negative.duty_cycle = 0xFFFF - duty_cycle
+
+
+class SimulatedPCA9685Controller:
+    """Drop-in replacement for PCA9685Controller backed by a simulated I2C bus."""
+
+    def __init__(self, *, i2c_hz: int = I2C_FAST_MODE_HZ, realtime: bool = True, bus: SimulatedBus | None = None) -> None:
+        # A channel write carries one 16-bit duty cycle: cheap enough to always keep
+        self.bus = bus or SimulatedBus(i2c_timing(i2c_hz), realtime=realtime, capture_payloads=True)
+        self.channels = [SimulatedPWMChannel(self.bus, index) for index in range(PCA9685_CHANNEL_COUNT)]
+
+    def motor(self, motor_index):
+        match motor_index:
+            case 1:
+                return SimulatedDCMotor(self.channels[MOTOR_1_POSITIVE_POLE], self.channels[MOTOR_1_NEGATIVE_POLE])
+            case 2:
+                return SimulatedDCMotor(self.channels[MOTOR_2_POSITIVE_POLE], self.channels[MOTOR_2_NEGATIVE_POLE])
+            case _:
+                raise ValueError(f"Invalid motor index {motor_index}")
+
+    def servo(self, servo_index):
+        if not 0 <= servo_index <= 7:
+            raise ValueError(f"Invalid servos index {servo_index}")
+        return SimulatedServo(self.channels[servo_index], min_pulse=500, max_pulse=2400, actuation_range=180)
+
+
+class SimulatedSpiDev:
+    """Stand-in for spidev.SpiDev that models transfer time on a simulated SPI bus.
+
+    The bytes sent are only recorded with capture_payloads=True: a WS2812 frame is several KB.
+    """
+
+    def __init__(self, *, realtime: bool = True, bus: SimulatedBus | None = None, capture_payloads: bool = False) -> None:
+        self.bus = bus
+        self.realtime = realtime
+        self.capture_payloads = capture_payloads
+        self.mode = 0
+        self.max_speed_hz = WS2812_SPI_HZ
+        self.is_open = False
+
+    def open(self, bus, device) -> None:
+        if self.bus is None:
+            self.bus = SimulatedBus(
+                spi_timing(self.max_speed_hz), realtime=self.realtime, capture_payloads=self.capture_payloads
+            )
+        self.is_open = True
+        self.target = (bus, device)  # pylint: disable=attribute-defined-outside-init
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def xfer(self, data, speed_hz=0):
+        if speed_hz:
+            self.bus.timing.clock_hz = speed_hz
+        self._write(data)
+        # MOSI only: the WS2812 strip never answers, so MISO reads back zeros
+        return [0] * len(data)
+
+    def writebytes2(self, data) -> None:
+        self.bus.timing.clock_hz = self.max_speed_hz
+        self._write(data)
+
+    def _write(self, data) -> None:
+        # Copying the frame is only worth it when the bus keeps it
+        self.bus.write(self.target, bytes(data) if self.bus.capture_payloads else None, len(data))
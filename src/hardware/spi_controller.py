@@ -1,16 +1,54 @@
-import spidev  # pylint: disable=import-error
+import time
+
 import numpy
 
+try:  # spidev only exists on the Raspberry Pi; a simulated device can be injected elsewhere
+    import spidev
+except ImportError:  # pragma: no cover - hardware dependency not installed in CI/tests
+    spidev = None
+
+# spidev refuses transfers larger than its kernel buffer, exposed as a module parameter
+SPIDEV_BUFSIZ_PATH = "/sys/module/spidev/parameters/bufsiz"
+SPIDEV_DEFAULT_BUFSIZ = 4096
+
+
+def read_spidev_bufsiz(path=SPIDEV_BUFSIZ_PATH):
+    """Return the spidev transfer buffer size in bytes, or the kernel default if it cannot be read."""
+    try:
+        with open(path, "r", encoding="utf-8") as bufsiz_file:
+            return int(bufsiz_file.read().strip())
+    except (OSError, ValueError):
+        return SPIDEV_DEFAULT_BUFSIZ
+
 
 class SpiController:
-    def __init__(self, bus=0, device=0, mode=1):
+    def __init__(self, bus=0, device=0, mode=1, *, chunk_size=None, streaming=False, spi_dev=None):
         self.bus = bus
         self.device = device
+        # Largest number of bytes sent in one transfer; long LED strips are split into several transfers
+        self.chunk_size = chunk_size or read_spidev_bufsiz()
+        if self.chunk_size <= 0:
+            raise ValueError(f"Invalid chunk size {self.chunk_size}")
+        # Streaming sends numpy buffers directly (writebytes2) instead of converting each chunk to a list
+        self.streaming = streaming
+        bits_per_led_bit = 8 if mode == 1 else 4
+        # 6.4Mhz on spi0, 8Mhz on the auxiliary buses
+        self.speed_hz = int(bits_per_led_bit / 1.25e-6) if bus == 0 else int(bits_per_led_bit / 1.0e-6)
+
+        # Transfer statistics, used to measure throughput per chunk size
+        self.bytes_sent = 0
+        self.transfer_count = 0
+        self.transfer_time = 0.0
+        self.is_open = False
+        if spi_dev is None and spidev is None:
+            raise RuntimeError("Hardware SPI support not available in this environment")
         try:
-            self.spi = spidev.SpiDev()
+            self.spi = spi_dev if spi_dev is not None else spidev.SpiDev()
             self.spi.open(self.bus, self.device)
             self.spi.mode = 0
+            self.spi.max_speed_hz = self.speed_hz
             self.write = self.write_ws2812_numpy8 if mode == 1 else self.write_ws2812_numpy4
+            self.is_open = True
         except OSError:
             print("Please check the configuration in /boot/firmware/config.txt.")
             if self.bus == 0:
@@ -29,9 +67,20 @@ class SpiController:
 
     def close(self):
         self.spi.close()
+        self.is_open = False
 
-    def write_ws2812_numpy8(self, led_color):
-        data = numpy.array(led_color).ravel()  # Converts data into a one-dimensional array
+    @staticmethod
+    def color_bytes(led_color):
+        """Return the colour values as a flat uint8 array, keeping the low 8 bits of larger values."""
+        data = numpy.asarray(led_color).ravel()
+        if data.dtype == numpy.uint8:
+            return data
+        # numpy 2 refuses to convert values above 255 to uint8: mask them as the bit encoding always did
+        return (data & 0xFF).astype(numpy.uint8)
+
+    @staticmethod
+    def encode_ws2812_numpy8(led_color):
+        data = SpiController.color_bytes(led_color)  # Converts data into a one-dimensional array
         tx_bytes = numpy.zeros(
             len(data) * 8, dtype=numpy.uint8
         )  # Each RGB color has 8 bits, each represented by a uint8 type data
@@ -40,17 +89,49 @@ class SpiController:
             # T0H=1,T0L=7 - T1H=5,T1L=3
             # -> #0b11111000 mean T1(0.78125us), 0b10000000 mean T0(0.15625us)
             tx_bytes[7 - ibit :: 8] = ((data >> ibit) & 1) * 0x78 + 0x80
-        if self.bus == 0:
-            self.spi.xfer(tx_bytes.tolist(), int(8 / 1.25e-6))  # Send color data at a frequency of 6.4Mhz
-        else:
-            self.spi.xfer(tx_bytes.tolist(), int(8 / 1.0e-6))  # Send color data at a frequency of 8Mhz
+        return tx_bytes
 
-    def write_ws2812_numpy4(self, led_color):
-        data = numpy.array(led_color).ravel()
+    @staticmethod
+    def encode_ws2812_numpy4(led_color):
+        data = SpiController.color_bytes(led_color)
         tx_bytes = numpy.zeros(len(data) * 4, dtype=numpy.uint8)
         for ibit in range(4):
             tx_bytes[3 - ibit :: 4] = ((data >> (2 * ibit + 1)) & 1) * 0x60 + ((data >> (2 * ibit + 0)) & 1) * 0x06 + 0x88
-        if self.bus == 0:
-            self.spi.xfer(tx_bytes.tolist(), int(4 / 1.25e-6))
-        else:
-            self.spi.xfer(tx_bytes.tolist(), int(4 / 1.0e-6))
+        return tx_bytes
+
+    def write_ws2812_numpy8(self, led_color):
+        self.transfer(self.encode_ws2812_numpy8(led_color))
+
+    def write_ws2812_numpy4(self, led_color):
+        self.transfer(self.encode_ws2812_numpy4(led_color))
+
+    def transfer(self, tx_bytes):
+        """Send encoded bytes in back-to-back transfers of at most chunk_size bytes.
+
+        The whole strip is encoded, and every chunk converted for the transfer call, before the
+        first transfer so the gap between chunks stays as short as possible: a gap longer than
+        the WS2812 reset time latches the strip early.
+        """
+        chunks = [tx_bytes[start : start + self.chunk_size] for start in range(0, len(tx_bytes), self.chunk_size)]
+        if not self.streaming:
+            chunks = [chunk.tolist() for chunk in chunks]
+        start_time = time.perf_counter()
+        for chunk in chunks:
+            if self.streaming:
+                self.spi.writebytes2(chunk)
+            else:
+                self.spi.xfer(chunk, self.speed_hz)
+            self.transfer_count += 1
+        self.transfer_time += time.perf_counter() - start_time
+        self.bytes_sent += len(tx_bytes)
+
+    def throughput(self):
+        """Return the average transfer throughput in bytes per second since the last reset."""
+        if self.transfer_time <= 0:
+            return 0.0
+        return self.bytes_sent / self.transfer_time
+
+    def reset_stats(self):
+        self.bytes_sent = 0
+        self.transfer_count = 0
+        self.transfer_time = 0.0
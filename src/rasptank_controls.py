@@ -25,8 +25,9 @@ from src import system as _system
 from src.controllers.leds import LedCtrl, PREDEFINED_COLORS
 from src.controllers.motors import Movement
 from src.controllers.servo import ServoCtrlThread
-from src.hardware.pca9685_controller import PCA9685Controller
-from src.hardware.spi_controller import SpiController
+from src.hardware.backends import create_pca9685_controller, create_spi_controller
+from src.hardware.i2c_bus import I2CBusOwner
+from src.video_stream import VIDEO_PORT, VideoStreamHandler
 from src.web_server import WebSocketHandler
 
 OLED_connection = 0  # pylint: disable=invalid-name
@@ -38,8 +39,11 @@ turnWiggle = 60  # pylint: disable=invalid-name
 ##################################
 ####### Servo Controlers  ########
 ##################################
-PCA9685_CTRL = PCA9685Controller()
-SPI = SpiController()
+# Real or simulated devices, selected with the RASPTANK_HARDWARE environment variable
+# All servo and motor writes go through a single I2C bus owner thread, started by the first write
+I2C_BUS = I2CBusOwner()
+PCA9685_CTRL = I2C_BUS.wrap(create_pca9685_controller())
+SPI = create_spi_controller()
 ARM = ServoCtrlThread("ARM", PCA9685_CTRL, 0)
 HAND = ServoCtrlThread("HAND", PCA9685_CTRL, 1, direction=-1)
 WRIST = ServoCtrlThread("WRIST", PCA9685_CTRL, 2)
@@ -108,6 +112,29 @@ controls_with_1_args = {
     "wsB": MOVEMENT.set_speed,
 }
 
+# Binary websocket video channel, fed by the camera of the web UI app
+VIDEO = VideoStreamHandler(app.camera) if app is not None else None
+
+# Commands answered with data, e.g. "get_history 600" returns the last 10 minutes of telemetry
+queries = {
+    "get_history": _system.get_history,
+    "video_stats": VIDEO.stats if VIDEO is not None else list,
+    "stream_latency": app.camera.latency.stats if app is not None else dict,
+}
+
+
+def telemetry_sources():
+    """Extra metrics recorded by the system sampler next to CPU temperature, CPU and RAM usage."""
+    return {
+        "loop_lag": lambda: LOOP_LAG.lag,
+        "i2c_utilisation": I2C_BUS.utilisation,
+        "i2c_queue_depth": I2C_BUS.queue_depth,
+        "i2c_latency": lambda: I2C_BUS.stats()["latency_avg"],
+    }
+
+
+LOOP_LAG = _system.LoopLagProbe()
+
 
 def ap_thread():  # pragma: no cover
     os.system("sudo create_ap wlan0 eth0 Adeept_Robot 12345678")
@@ -134,6 +161,8 @@ if __name__ == "__main__":  # pragma: no cover
     BUFSIZ = 1024  # Define buffer size
     ADDR = (HOST, PORT)
 
+    # Sample system metrics in the background so get_info answers from the latest snapshot
+    _system.start_sampler(sources=telemetry_sources())
     flask_app = app.webapp()  # type: ignore[attr-defined]
     flask_app.startthread()
     try:
@@ -141,8 +170,13 @@ if __name__ == "__main__":  # pragma: no cover
         while 1:
             wifi_check()
             try:  # Start server,waiting for client
-                start_server = websockets.serve(WebSocketHandler(controls, controls_with_1_args), "0.0.0.0", 8888)
+                start_server = websockets.serve(
+                    WebSocketHandler(controls, controls_with_1_args, queries=queries), "0.0.0.0", 8888
+                )
                 asyncio.get_event_loop().run_until_complete(start_server)
+                if VIDEO is not None:
+                    asyncio.get_event_loop().run_until_complete(websockets.serve(VIDEO, "0.0.0.0", VIDEO_PORT))
+                asyncio.get_event_loop().create_task(LOOP_LAG.run())
                 print("waiting for connection...")
                 break
             except Exception as e:
@@ -161,5 +195,7 @@ if __name__ == "__main__":  # pragma: no cover
     except KeyboardInterrupt:
         print("program stopped...")
         MOVEMENT.stop()
+        # the motor stop is still written before the bus thread exits
+        I2C_BUS.stop_thread()
         LED_CTRL.stop()
         sys.exit(0)
@@ -4,11 +4,37 @@
 # Website     : www.gewbot.com
 # Author      : Adeept
 # Date        : 2019/08/28
+import asyncio
 import builtins as _builtins  # keep as module to allow tests to patch builtins.open
+import math
 import subprocess
 import shutil
+import threading
+import time
+from array import array
+from collections import deque
+
 import psutil
 
+DEFAULT_SAMPLE_INTERVAL = 1.0
+DEFAULT_SAMPLE_HISTORY = 600
+DEFAULT_GPU_TEMP_TTL = 30.0
+# A snapshot older than this many sampling intervals is not served: get_info reads the metrics directly
+DEFAULT_MAX_AGE_INTERVALS = 3
+
+TELEMETRY_METRICS = (
+    "cpu_temp",
+    "cpu_use",
+    "ram_use",
+    "loop_lag",
+    "i2c_utilisation",
+    "i2c_queue_depth",
+    "i2c_latency",
+)
+# (resolution in seconds, number of points): 10 minutes at 1 s, 1 hour at 10 s, 24 hours at 1 min
+TELEMETRY_TIERS = ((1.0, 600), (10.0, 360), (60.0, 1440))
+DEFAULT_HISTORY_SECONDS = 600
+
 
 def _read_cpu_temp_str(path: str = "/sys/class/thermal/thermal_zone0/temp") -> str:
     """Read CPU temperature from sysfs and return a string rounded to 0.1°C.
@@ -24,9 +50,13 @@ def _read_cpu_temp_str(path: str = "/sys/class/thermal/thermal_zone0/temp") -> s
 
 def get_info():
     """Return system info as a list of strings: [cpu_temp, cpu_use, ram_use].
-    Fail if the CPU temperature path does not exist or cannot be read.
+    When the background sampler has a recent snapshot, it is returned without touching sysfs or psutil.
+    Otherwise (no sampler, failed or stalled samples) the metrics are read directly, failing if the CPU temperature path does not exist or cannot be read.
     Tests can mock builtins.open to avoid filesystem dependencies.
     """
+    snapshot = _SAMPLER.latest() if _SAMPLER is not None else None
+    if snapshot is not None:
+        return list(snapshot["info"])
     return [get_cpu_tempfunc(), get_cpu_use(), get_ram_info()]
 
 
@@ -37,10 +67,10 @@ def get_cpu_tempfunc():  # pragma: no cover
 
 def get_gpu_tempfunc():  # pragma: no cover
     """Return GPU temperature as a character string using vcgencmd.
-    Uses subprocess for robustness; errors propagate if the command is missing/fails.
+    Uses subprocess for robustness; errors propagate if the command is missing, fails or hangs.
     """
     cmd = shutil.which("vcgencmd") or "/opt/vc/bin/vcgencmd"
-    result = subprocess.run([cmd, "measure_temp"], check=True, capture_output=True, text=True)
+    result = subprocess.run([cmd, "measure_temp"], check=True, capture_output=True, text=True, timeout=2)
     res = result.stdout.splitlines()[0] if result.stdout else ""
     return res.replace("temp=", "")
 
@@ -61,3 +91,233 @@ def get_swap_info():  # pragma: no cover
     """Return swap memory  usage using psutil"""
     swap_cent = psutil.swap_memory()[3]
     return str(swap_cent)
+
+
+class SystemSampler(threading.Thread):
+    """Background thread reading system metrics on a fixed interval into a ring buffer.
+
+    Sampling on a fixed interval also gives psutil.cpu_percent() a constant measurement window.
+    The GPU temperature spawns vcgencmd, so it is refreshed only every gpu_ttl seconds.
+    Snapshots older than max_age seconds (by default DEFAULT_MAX_AGE_INTERVALS intervals) are not served.
+    """
+
+    def __init__(
+        self,
+        interval=DEFAULT_SAMPLE_INTERVAL,
+        *,
+        history=DEFAULT_SAMPLE_HISTORY,
+        gpu_ttl=DEFAULT_GPU_TEMP_TTL,
+        max_age=None,
+        store=None,
+        sources=None,
+        clock=time.monotonic,
+    ):
+        super().__init__(name="system-sampler")
+        self.daemon = True
+        self.interval = interval
+        self.gpu_ttl = gpu_ttl
+        self.max_age = interval * DEFAULT_MAX_AGE_INTERVALS if max_age is None else max_age
+        self.samples = deque(maxlen=history)
+        # Optional TelemetryStore receiving every snapshot, and extra numeric metrics by name
+        self.store = store
+        self.sources = dict(sources or {})
+        self.error_count = 0
+        self._clock = clock
+        self._gpu_temp = None
+        self._gpu_read_at = None
+        self._latest = None
+        self._stop_event = threading.Event()
+
+    def latest(self):
+        """Return the most recent snapshot, or None before the first successful sample and once it is
+        older than max_age."""
+        snapshot = self._latest
+        if snapshot is None or self._clock() - snapshot["time"] > self.max_age:
+            return None
+        return snapshot
+
+    def sample(self):
+        """Read all metrics now, store the snapshot and return it."""
+        now = self._clock()
+        try:
+            cpu_temp = _read_cpu_temp_str()
+        except (OSError, ValueError):
+            # Keep the last good snapshot until it is too old; get_info then falls back to a direct read
+            self.error_count += 1
+            return None
+        cpu_use = get_cpu_use()
+        ram_use = get_ram_info()
+        snapshot = {
+            "time": now,
+            "cpu_temp": float(cpu_temp),
+            "cpu_use": float(cpu_use),
+            "ram_use": float(ram_use),
+            "gpu_temp": self.gpu_temp(now),
+            "info": (cpu_temp, cpu_use, ram_use),
+        }
+        for name, source in self.sources.items():
+            try:
+                snapshot[name] = float(source())
+            except Exception:  # pylint: disable=broad-exception-caught
+                snapshot[name] = None
+        self.samples.append(snapshot)
+        self._latest = snapshot
+        if self.store is not None:
+            self.store.record(now, snapshot)
+        return snapshot
+
+    def gpu_temp(self, now=None):
+        """Return the cached GPU temperature string, refreshing it once the TTL has expired."""
+        now = self._clock() if now is None else now
+        if self._gpu_read_at is None or now - self._gpu_read_at >= self.gpu_ttl:
+            self._gpu_read_at = now
+            try:
+                self._gpu_temp = get_gpu_tempfunc()
+            except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                self._gpu_temp = None
+        return self._gpu_temp
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop_thread(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+class _TelemetryTier:
+    """Fixed-capacity ring of points at one resolution, fed by averaging samples per time bucket."""
+
+    def __init__(self, resolution, capacity, metrics):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.values = {name: array("d", [math.nan]) * capacity for name in metrics}
+        self.count = 0
+        self._bucket = None
+        self._sums = dict.fromkeys(metrics, 0.0)
+        self._counts = dict.fromkeys(metrics, 0)
+        self._last_time = 0.0
+
+    def add(self, timestamp, sample):
+        bucket = int(timestamp // self.resolution)
+        if self._bucket is not None and bucket != self._bucket:
+            self._flush()
+        self._bucket = bucket
+        self._last_time = timestamp
+        for name in self._sums:
+            value = sample.get(name)
+            if value is not None and not math.isnan(value):
+                self._sums[name] += value
+                self._counts[name] += 1
+
+    def _pending(self):
+        return {name: self._sums[name] / count if count else math.nan for name, count in self._counts.items()}
+
+    def _flush(self):
+        index = self.count % self.capacity
+        self.times[index] = self._last_time
+        for name, value in self._pending().items():
+            self.values[name][index] = value
+        self.count += 1
+        self._sums = dict.fromkeys(self._sums, 0.0)
+        self._counts = dict.fromkeys(self._counts, 0)
+
+    def span(self):
+        return self.resolution * self.capacity
+
+    def points(self, start):
+        """Yield (time, values) in chronological order after start, ending with the bucket still being filled."""
+        first = max(0, self.count - self.capacity)
+        for position in range(first, self.count):
+            index = position % self.capacity
+            if self.times[index] > start:
+                yield self.times[index], {name: values[index] for name, values in self.values.items()}
+        if self._bucket is not None and self._last_time > start:
+            yield self._last_time, self._pending()
+
+
+class TelemetryStore:
+    """In-memory time series of system metrics, downsampled into coarser retention tiers.
+
+    Every sample is averaged into each tier's current time bucket; a tier stores one point per bucket
+    in preallocated arrays, so memory stays constant however long the robot runs.
+    """
+
+    def __init__(self, metrics=TELEMETRY_METRICS, tiers=TELEMETRY_TIERS, *, clock=time.monotonic):
+        self.metrics = tuple(metrics)
+        self.tiers = [_TelemetryTier(resolution, capacity, self.metrics) for resolution, capacity in tiers]
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def record(self, timestamp, sample):
+        with self._lock:
+            for tier in self.tiers:
+                tier.add(timestamp, sample)
+
+    def query(self, seconds=DEFAULT_HISTORY_SECONDS, metrics=None):
+        """Return the last `seconds` of history from the finest tier covering it, in one JSON-ready dict.
+
+        Times are given as ages in seconds relative to now (negative), so they do not depend on the wall clock.
+        """
+        names = [name for name in (metrics or self.metrics) if name in self.metrics]
+        with self._lock:
+            now = self._clock()
+            tier = next((tier for tier in self.tiers if tier.span() >= seconds), self.tiers[-1])
+            points = list(tier.points(now - seconds))
+        return {
+            "resolution": tier.resolution,
+            "age": [round(timestamp - now, 1) for timestamp, _ in points],
+            "series": {name: [_json_number(values[name]) for _, values in points] for name in names},
+        }
+
+
+def _json_number(value):
+    # JSON has no NaN: gaps are sent as null
+    return None if math.isnan(value) else round(value, 3)
+
+
+class LoopLagProbe:
+    """Measure how late the asyncio event loop wakes up from a timed sleep."""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lag = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+
+
+TELEMETRY = TelemetryStore()
+_SAMPLER = None
+
+
+def get_history(seconds=DEFAULT_HISTORY_SECONDS):
+    """Return the recorded telemetry of the last `seconds` seconds (see TelemetryStore.query)."""
+    return TELEMETRY.query(seconds)
+
+
+def start_sampler(interval=DEFAULT_SAMPLE_INTERVAL, **kwargs):
+    """Start the shared background sampler used by get_info, if it is not already running.
+    Snapshots are recorded into TELEMETRY unless another store is given.
+    """
+    global _SAMPLER  # pylint: disable=global-statement
+    if _SAMPLER is None or not _SAMPLER.is_alive():
+        kwargs.setdefault("store", TELEMETRY)
+        _SAMPLER = SystemSampler(interval, **kwargs)
+        _SAMPLER.sample()
+        _SAMPLER.start()
+    return _SAMPLER
+
+
+def stop_sampler():
+    global _SAMPLER  # pylint: disable=global-statement
+    if _SAMPLER is not None:
+        _SAMPLER.stop_thread()
+        _SAMPLER = None
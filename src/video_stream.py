@@ -0,0 +1,200 @@
+"""
+Binary websocket video channel for the controller UI.
+
+Each camera frame is pushed to the connected clients as one binary websocket
+message: a small header followed by the JPEG bytes the MJPEG stream encodes
+anyway. Frames are read from the camera by a single worker thread whatever
+the number of clients. A client whose connection has not drained the
+previous frame skips frames until it has, so a slow link shows the newest
+frame instead of falling behind on a backlog. The kernel send buffer of video
+connections is kept small for the same reason: left at its default of several
+MB, it would queue seconds of video before the connection ever looks busy.
+
+Protocol:
+  client -> "username:password"    same handshake as the control channel
+  server -> HEADER + JPEG          one binary message per frame
+
+HEADER is little endian: uint32 frame sequence number, float64 capture time
+in Unix seconds. The capture time comes from camera.frame_stamp() when the
+camera has it, otherwise it is the time the frame was read from the camera.
+Each client's lag, capture to end of send, is kept in its stats.
+
+Usage:
+  handler = VideoStreamHandler(camera)  # camera: web/base_camera.BaseCamera
+  websockets.serve(handler, "0.0.0.0", VIDEO_PORT)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+import time
+from collections import deque, namedtuple
+
+from src.web_server import WebSocketHandler
+
+VIDEO_PORT = 8890
+HEADER = struct.Struct("<Id")
+DEFAULT_MAX_BUFFERED = 0  # bytes still waiting in the transport above which a frame is skipped
+DEFAULT_SEND_BUFFER = 32 * 1024  # SO_SNDBUF of video connections, about half a 640x480 frame
+DEFAULT_FRAME_TIMEOUT = 1.0
+LAG_WINDOW = 100  # sends kept per client for its lag statistics
+
+# A frame as sent to the clients: sequence is the camera frame generation
+VideoFrame = namedtuple("VideoFrame", ["sequence", "timestamp", "jpeg"])
+
+
+def pack_frame(frame: VideoFrame) -> bytes:
+    return HEADER.pack(frame.sequence & 0xFFFFFFFF, frame.timestamp) + frame.jpeg
+
+
+def unpack_frame(message: bytes) -> VideoFrame:
+    sequence, timestamp = HEADER.unpack_from(message)
+    return VideoFrame(sequence, timestamp, message[HEADER.size :])
+
+
+def limit_send_buffer(websocket, size: int) -> None:
+    """Shrink the kernel send buffer of the websocket connection to `size` bytes, when it has a socket."""
+    transport = getattr(websocket, "transport", None)
+    sock = transport.get_extra_info("socket") if transport is not None else None
+    if sock is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+
+
+def buffered_bytes(websocket) -> int:
+    """Return the number of bytes queued in the websocket transport and not yet sent."""
+    transport = getattr(websocket, "transport", None)
+    if transport is None:
+        return 0
+    return transport.get_write_buffer_size()
+
+
+class FrameBroadcaster:
+    """Fetch JPEG frames from the camera in one worker thread and hand the newest one to every waiting client.
+
+    The worker runs while at least one client is subscribed.
+    """
+
+    def __init__(self, camera, *, timeout=DEFAULT_FRAME_TIMEOUT, clock=time.time):
+        self.camera = camera
+        self.timeout = timeout
+        self._clock = clock
+        # web/base_camera.BaseCamera.frame_stamp: sequence and time.monotonic() of the capture
+        self._frame_stamp = getattr(camera, "frame_stamp", None)
+        self.frame = None
+        self.subscribers = 0
+        self._condition = asyncio.Condition()
+        self._task = None
+
+    def subscribe(self):
+        self.subscribers += 1
+        self.camera.add_viewer()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._fetch())
+
+    def unsubscribe(self):
+        self.subscribers -= 1
+        self.camera.remove_viewer()
+
+    def age(self, frame: VideoFrame) -> float:
+        """Return the seconds since `frame` was captured."""
+        return self._clock() - frame.timestamp
+
+    def capture_time(self, generation: int) -> float:
+        """Return the capture time of frame `generation` in the clock of the broadcaster."""
+        stamp = self._frame_stamp(generation) if self._frame_stamp is not None else None
+        if stamp is None:
+            return self._clock()
+        return self._clock() - (time.monotonic() - stamp.captured)
+
+    async def next_frame(self, sequence: int) -> VideoFrame:
+        """Wait for a frame newer than `sequence` and return the newest one."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.frame is not None and self.frame.sequence != sequence)
+            return self.frame
+
+    async def _fetch(self):
+        generation = self.frame.sequence if self.frame else 0
+        while self.subscribers > 0:
+            latest, jpeg = await asyncio.to_thread(self.camera.wait_jpeg, generation, None, self.timeout)
+            if latest == generation or jpeg is None:
+                continue
+            generation = latest
+            async with self._condition:
+                self.frame = VideoFrame(generation, self.capture_time(generation), jpeg)
+                self._condition.notify_all()
+
+
+class VideoClient:
+    """Delivery counters of one connected client and the age of its frames when sent."""
+
+    def __init__(self, address=None):
+        self.address = address
+        self.sent = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.lags = deque(maxlen=LAG_WINDOW)
+
+    def stats(self) -> dict:
+        stats = {"address": self.address, "sent": self.sent, "skipped": self.skipped, "bytes": self.bytes}
+        if self.lags:
+            stats["lag_ms"] = {
+                "last": round(1000 * self.lags[-1], 2),
+                "mean": round(1000 * sum(self.lags) / len(self.lags), 2),
+                "max": round(1000 * max(self.lags), 2),
+            }
+        return stats
+
+
+class VideoStreamHandler(WebSocketHandler):
+    """Websocket handler streaming camera frames to authenticated clients (see module docstring)."""
+
+    def __init__(
+        self,
+        camera,
+        expected_user: str = "admin",
+        expected_pass: str = "123456",
+        *,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+        send_buffer: int = DEFAULT_SEND_BUFFER,
+        broadcaster: FrameBroadcaster | None = None,
+    ) -> None:
+        super().__init__(expected_user=expected_user, expected_pass=expected_pass)
+        self.max_buffered = max_buffered
+        self.send_buffer = send_buffer
+        self.broadcaster = broadcaster or FrameBroadcaster(camera)
+        self.clients = []
+
+    async def __call__(self, websocket, _path=None):
+        await self.check_permit(websocket)
+        limit_send_buffer(websocket, self.send_buffer)
+        client = VideoClient(getattr(websocket, "remote_address", None))
+        self.clients.append(client)
+        self.broadcaster.subscribe()
+        try:
+            await self.stream(websocket, client)
+        finally:
+            self.broadcaster.unsubscribe()
+            self.clients.remove(client)
+
+    async def stream(self, websocket, client: VideoClient):
+        sequence = 0
+        while True:
+            frame = await self.broadcaster.next_frame(sequence)
+            if sequence:
+                # frames published while this client was sending are never sent to it
+                client.skipped += max(0, frame.sequence - sequence - 1)
+            sequence = frame.sequence
+            if buffered_bytes(websocket) > self.max_buffered:
+                client.skipped += 1
+                continue
+            message = pack_frame(frame)
+            await websocket.send(message)
+            client.sent += 1
+            client.bytes += len(message)
+            client.lags.append(self.broadcaster.age(frame))
+
+    def stats(self) -> list:
+        """Per-client delivery counters, e.g. for the "video_stats" query."""
+        return [client.stats() for client in self.clients]
@@ -27,6 +27,9 @@ class WebSocketHandler:
     - check_permit: performs the credential handshake.
     - __call__: acts as the coroutine passed to websockets.serve.
     - process: shared generic message processing (list batching, JSON parsing).
+
+    Queries are commands whose return value is sent back as the response data, with an optional
+    integer argument (e.g. "get_history 600").
     """
 
     def __init__(
@@ -35,11 +38,14 @@ class WebSocketHandler:
         controls_with_1_args: Dict[str, Callable[[Any], None]] | None = None,
         expected_user: str = "admin",
         expected_pass: str = "123456",
+        *,
+        queries: Dict[str, Callable[..., Any]] | None = None,
     ) -> None:
         self.expected_user = expected_user
         self.expected_pass = expected_pass
         self.controls = controls or {}
         self.controls_with_1_args = controls_with_1_args or {}
+        self.queries = queries or {}
 
     async def check_permit(self, websocket) -> bool:
         """Simple credential handshake using username:password."""
@@ -61,6 +67,7 @@ class WebSocketHandler:
         data: Any,
         controls_or_dispatch,
         controls_with_1_args: Dict[str, Callable[[Any], None]] | None = None,
+        queries: Dict[str, Callable[..., Any]] | None = None,
     ):
         """Generic processing for a single received payload and send response(s).
 
@@ -73,6 +80,7 @@ class WebSocketHandler:
         try:
             controls = controls_or_dispatch or {}
             arg_controls = controls_with_1_args or {}
+            query_controls = queries or {}
             if isinstance(data, str):
                 parts = data.split()
                 cmd = parts[0]
@@ -89,6 +97,9 @@ class WebSocketHandler:
                         resp = success(cmd, f"Command {cmd} Executed")
                     else:
                         resp = failed(cmd, f"Command {cmd} Need 1 argument")
+                elif cmd in query_controls:
+                    result = query_controls[cmd]() if value is None else query_controls[cmd](value)
+                    resp = success(cmd, result)
                 else:
                     resp = failed(cmd, f"Command {cmd} Not Supported")
             else:
@@ -107,4 +118,4 @@ class WebSocketHandler:
                 payload = raw
             if payload is None or (isinstance(payload, str) and not payload.strip()):
                 continue
-            await self.process(websocket, payload, self.controls, self.controls_with_1_args)
+            await self.process(websocket, payload, self.controls, self.controls_with_1_args, self.queries)
@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+
+from tests import async_helper
+from src.controllers.servo import ServoCtrlThread
+from src.hardware.i2c_bus import I2CBusOwner
+from src.hardware.simulator import SimulatedPCA9685Controller
+
+
+class GatedChannel:
+    """Channel whose writes wait until the test opens the gate."""
+
+    frequency = 50
+
+    def __init__(self, gate=None, error=None):
+        self.gate = gate
+        self.error = error
+        self.values = []
+
+    @property
+    def duty_cycle(self):
+        return self.values[-1] if self.values else 0
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        self.values.append(value)
+
+
+class TestI2CBusOwner(unittest.TestCase):
+    def setUp(self):
+        self.bus = I2CBusOwner()
+
+    def tearDown(self):
+        self.bus.stop_thread()
+
+    def test_blocking_submit_writes_before_returning(self):
+        channel = GatedChannel()
+        self.bus.submit(channel, 1000)
+        self.assertEqual([1000], channel.values)
+        stats = self.bus.stats()
+        self.assertEqual(1, stats["writes"])
+        self.assertEqual(0, stats["queue_depth"])
+        self.assertGreaterEqual(stats["latency_max"], stats["latency_avg"])
+
+    def test_pending_writes_of_same_channel_are_merged(self):
+        gate = threading.Event()
+        busy = GatedChannel(gate)
+        servo = GatedChannel()
+        self.bus.submit(busy, 1, blocking=False)
+        async_helper.wait_for(lambda: self.bus.queue_depth() == 0)
+        # The bus is busy: these updates wait in the queue and collapse into one write
+        for value in (10, 20, 30):
+            self.bus.submit(servo, value, blocking=False)
+        self.assertEqual(1, self.bus.queue_depth())
+        gate.set()
+        async_helper.wait_for(lambda: servo.values == [30])
+        stats = self.bus.stats()
+        self.assertEqual(2, stats["merged"])
+        self.assertEqual(1, stats["max_queue_depth"])
+
+    def test_write_errors_are_raised_to_the_submitter(self):
+        with self.assertRaises(OSError):
+            self.bus.submit(GatedChannel(error=OSError("remote I/O error")), 5)
+        self.assertEqual(1, self.bus.stats()["errors"])
+
+    def test_thread_starts_with_the_first_write(self):
+        self.assertFalse(self.bus.is_alive())
+        channel = GatedChannel()
+        self.bus.submit(channel, 7)
+        self.assertTrue(self.bus.is_alive())
+        self.assertEqual([7], channel.values)
+
+    def test_stop_drains_pending_writes(self):
+        gate = threading.Event()
+        channel = GatedChannel(gate)
+        motor_pole = GatedChannel()
+        self.bus.submit(channel, 1, blocking=False)
+        self.bus.submit(motor_pole, 0, blocking=False)
+        gate.set()
+        self.bus.stop_thread()
+        self.assertEqual([0], motor_pole.values)
+        self.assertFalse(self.bus.is_alive())
+
+    def test_utilisation_of_simulated_bus(self):
+        controller = self.bus.wrap(SimulatedPCA9685Controller(realtime=True))
+        servo = controller.servo(0)
+        for angle in range(0, 180, 10):
+            servo.angle = angle
+        self.assertEqual(18, controller.bus.write_count)
+        self.assertGreater(self.bus.utilisation(), 0.0)
+        self.assertLessEqual(self.bus.utilisation(), 1.0)
+        self.assertEqual(170, servo.angle)
+
+    def test_servo_thread_through_bus_owner(self):
+        controller = self.bus.wrap(SimulatedPCA9685Controller(realtime=False))
+        servo_thread = ServoCtrlThread("test", controller, 0)
+        try:
+            servo_thread.move_to(95)
+            async_helper.wait_for(lambda: controller.channels[0].duty_cycle == controller.bus.records[-1].value)
+            async_helper.wait_for(lambda: servo_thread.angle_current_value == 95)
+            self.assertEqual(controller.bus.write_count, self.bus.stats()["writes"])
+        finally:
+            servo_thread.stop_thread()
+
+    def test_min_interval_paces_writes(self):
+        self.bus.stop_thread()
+        self.bus = I2CBusOwner(min_interval=0.01)
+        channel = GatedChannel()
+        start = time.monotonic()
+        for value in range(3):
+            self.bus.submit(channel, value)
+        self.assertEqual([0, 1, 2], channel.values)
+        self.assertGreaterEqual(time.monotonic() - start, 0.02)
+        self.assertEqual(50, self.bus.wrap(SimulatedPCA9685Controller(realtime=False)).channels[3].frequency)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from src.controllers.leds import LedCtrl
+from src.controllers.motors import Movement
+from src.hardware import backends, pca9685_controller, spi_controller
+from src.hardware.simulator import (
+    I2C_FAST_MODE_HZ,
+    I2C_STANDARD_MODE_HZ,
+    BusTimingModel,
+    SimulatedBus,
+    SimulatedPCA9685Controller,
+    SimulatedSpiDev,
+    i2c_timing,
+    spi_timing,
+)
+from src.hardware.spi_controller import SpiController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBusTimingModel(unittest.TestCase):
+    def test_i2c_channel_write_duration(self):
+        # 6 bytes with ACK bits plus START/STOP, at 100 kHz and 400 kHz
+        self.assertAlmostEqual(56 / 100_000, i2c_timing(I2C_STANDARD_MODE_HZ, latency=0).duration(6))
+        self.assertAlmostEqual(56 / 400_000 + 50e-6, i2c_timing(I2C_FAST_MODE_HZ).duration(6))
+
+    def test_spi_bandwidth(self):
+        timing = spi_timing(6_400_000, latency=0)
+        self.assertEqual(800_000, timing.bandwidth())
+        self.assertAlmostEqual(0.001, timing.duration(800))
+
+    def test_invalid_clock(self):
+        with self.assertRaises(ValueError):
+            BusTimingModel(0)
+
+
+class TestSimulatedBus(unittest.TestCase):
+    def test_writes_are_serialized_and_recorded(self):
+        clock = FakeClock()
+        bus = SimulatedBus(BusTimingModel(1000), realtime=False, clock=clock)
+        self.assertAlmostEqual(0.008, bus.write("a", 1, 1))
+        bus.write("b", 2, 1)
+        # The second write starts when the first has left the bus
+        self.assertEqual([100.0, 100.008], [round(record.timestamp, 6) for record in bus.records])
+        self.assertEqual({"writes": 2, "bytes": 2, "busy_time": 0.016}, bus.stats())
+
+    def test_realtime_bus_sleeps_for_duration(self):
+        sleeps = []
+        bus = SimulatedBus(BusTimingModel(1000), clock=FakeClock(), sleep=sleeps.append)
+        bus.write(0, 0, 2)
+        self.assertEqual([0.016], sleeps)
+
+    def test_record_limit(self):
+        bus = SimulatedBus(BusTimingModel(1000), realtime=False, record_limit=3, capture_payloads=True)
+        for value in range(5):
+            bus.write(0, value, 1)
+        self.assertEqual([2, 3, 4], [record.value for record in bus.records])
+        self.assertEqual(5, bus.write_count)
+
+
+class TestSimulatedPCA9685Controller(unittest.TestCase):
+    def setUp(self):
+        self.controller = SimulatedPCA9685Controller(realtime=False)
+
+    def test_servo_angle_writes_pulse_width(self):
+        servo = self.controller.servo(0)
+        servo.angle = 0
+        servo.angle = 180
+        self.assertEqual([1638, 7864], [record.value for record in self.controller.bus.records])
+        with self.assertRaises(ValueError):
+            servo.angle = 181
+        with self.assertRaises(ValueError):
+            self.controller.servo(8)
+
+    def test_motor_throttle_writes_both_poles(self):
+        motor = self.controller.motor(1)
+        motor.throttle = 0.5
+        motor.throttle = -0.5
+        motor.throttle = 0
+        motor.throttle = None
+        self.assertEqual(
+            [(15, 0xFFFF), (14, 0x8000), (15, 0x8000), (14, 0xFFFF), (15, 0xFFFF), (14, 0xFFFF), (15, 0), (14, 0)],
+            [(record.target, record.value) for record in self.controller.bus.records],
+        )
+        with self.assertRaises(ValueError):
+            motor.throttle = 2
+        with self.assertRaises(ValueError):
+            self.controller.motor(3)
+
+    def test_movement_runs_against_simulator(self):
+        movement = Movement(self.controller, 1, -1, speed=1)
+        movement.forward()
+        movement.stop()
+        # Two motors, two channel writes per throttle change
+        self.assertEqual(8, self.controller.bus.write_count)
+
+    def test_duty_cycle_range(self):
+        with self.assertRaises(ValueError):
+            self.controller.channels[0].duty_cycle = 0x10000
+
+
+class TestSimulatedSpi(unittest.TestCase):
+    def test_spi_controller_chunks_on_simulated_device(self):
+        spi_dev = SimulatedSpiDev(realtime=False)
+        spi = SpiController(chunk_size=4096, spi_dev=spi_dev)
+        spi.write([1, 2, 3] * 300)
+        self.assertEqual([4096, 3104], [record.nbytes for record in spi_dev.bus.records])
+        self.assertEqual(int(8 / 1.25e-6), spi_dev.bus.timing.clock_hz)
+        spi.close()
+        self.assertFalse(spi.is_open)
+
+    def test_payloads_are_recorded_on_request(self):
+        spi_dev = SimulatedSpiDev(realtime=False)
+        spi = SpiController(chunk_size=4096, spi_dev=spi_dev)
+        spi.write([1, 2, 3])
+        self.assertEqual([None], [record.value for record in spi_dev.bus.records])
+        spi_dev = SimulatedSpiDev(realtime=False, capture_payloads=True)
+        spi = SpiController(chunk_size=4096, spi_dev=spi_dev)
+        spi.write([1, 2, 3])
+        self.assertEqual(24, len(spi_dev.bus.records[0].value))
+
+    def test_streaming_writes(self):
+        spi_dev = SimulatedSpiDev(realtime=False)
+        spi = SpiController(bus=1, chunk_size=100, streaming=True, spi_dev=spi_dev)
+        spi.write([0] * 20)
+        self.assertEqual([100, 60], [record.nbytes for record in spi_dev.bus.records])
+        self.assertEqual(8_000_000, spi_dev.bus.timing.clock_hz)
+
+    def test_led_ctrl_on_simulated_spi(self):
+        spi = SpiController(spi_dev=SimulatedSpiDev(realtime=False))
+        led_ctrl = LedCtrl(spi, count=4)
+        led_ctrl.set_all_led_rgb((255, 0, 0))
+        self.assertEqual(2, spi.spi.bus.write_count)
+        led_ctrl.stop()
+
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        # Other test modules replace the hardware modules with mocks; backends imports them lazily
+        modules = {module.__name__: module for module in (pca9685_controller, spi_controller)}
+        patcher = patch.dict(sys.modules, modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_backend_is_real(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(backends.REAL, backends.backend_name())
+        with patch.dict(os.environ, {backends.HARDWARE_BACKEND_ENV: "Simulated"}):
+            self.assertEqual(backends.SIMULATED, backends.backend_name())
+        with self.assertRaises(ValueError):
+            backends.backend_name("fpga")
+
+    def test_create_simulated_controllers(self):
+        env = {backends.HARDWARE_BACKEND_ENV: backends.SIMULATED, backends.SIM_I2C_HZ_ENV: "100000"}
+        with patch.dict(os.environ, env):
+            controller = backends.create_pca9685_controller(realtime=False)
+            spi = backends.create_spi_controller(realtime=False)
+        self.assertIsInstance(controller, SimulatedPCA9685Controller)
+        self.assertEqual(I2C_STANDARD_MODE_HZ, controller.bus.timing.clock_hz)
+        self.assertIsInstance(spi.spi, SimulatedSpiDev)
+
+    def test_create_real_controllers_without_hardware(self):
+        with self.assertRaises(RuntimeError):
+            backends.create_pca9685_controller(backends.REAL)
+        with patch("src.hardware.spi_controller.spidev", None):
+            with self.assertRaises(RuntimeError):
+                backends.create_spi_controller(backends.REAL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import mock_open, patch
+
+from src.hardware import spi_controller
+from src.hardware.spi_controller import SpiController
+
+
+class FakeSpiDev:
+    def __init__(self):
+        self.mode = None
+        self.max_speed_hz = None
+        self.transfers = []
+        self.closed = False
+
+    def open(self, bus, device):
+        self.bus = bus  # pylint: disable=attribute-defined-outside-init
+        self.device = device  # pylint: disable=attribute-defined-outside-init
+
+    def xfer(self, data, speed_hz):
+        self.transfers.append((list(data), speed_hz))
+
+    def writebytes2(self, data):
+        self.transfers.append((list(data), self.max_speed_hz))
+
+    def close(self):
+        self.closed = True
+
+
+class TestSpiController(unittest.TestCase):
+    def setUp(self):
+        self.fake_spi = FakeSpiDev()
+
+    def test_short_strip_is_sent_in_one_transfer(self):
+        spi = SpiController(chunk_size=4096, spi_dev=self.fake_spi)
+        spi.write([255, 0, 0] * 8)
+        self.assertEqual(1, len(self.fake_spi.transfers))
+        data, speed_hz = self.fake_spi.transfers[0]
+        self.assertEqual(8 * 3 * 8, len(data))
+        self.assertEqual(int(8 / 1.25e-6), speed_hz)
+
+    def test_long_strip_is_split_into_chunks(self):
+        spi = SpiController(chunk_size=4096, spi_dev=self.fake_spi)
+        led_color = [10, 20, 30] * 300  # 300 LEDs -> 7200 encoded bytes
+        spi.write(led_color)
+        sizes = [len(data) for data, _ in self.fake_spi.transfers]
+        self.assertEqual([4096, 3104], sizes)
+        # Reassembled chunks must equal the single-buffer encoding
+        sent = [byte for data, _ in self.fake_spi.transfers for byte in data]
+        self.assertEqual(SpiController.encode_ws2812_numpy8(led_color).tolist(), sent)
+        self.assertEqual(7200, spi.bytes_sent)
+        self.assertEqual(2, spi.transfer_count)
+
+    def test_chunks_are_sent_as_lists(self):
+        spi = SpiController(chunk_size=100, spi_dev=self.fake_spi)
+        with patch.object(self.fake_spi, "xfer", wraps=self.fake_spi.xfer) as xfer:
+            spi.write([1, 2, 3] * 10)
+        self.assertEqual(3, xfer.call_count)
+        self.assertTrue(all(isinstance(call.args[0], list) for call in xfer.call_args_list))
+
+    def test_streaming_uses_buffer_writes(self):
+        spi = SpiController(bus=1, mode=0, chunk_size=100, streaming=True, spi_dev=self.fake_spi)
+        spi.write([1, 2, 3] * 10)
+        self.assertEqual([100, 20], [len(data) for data, _ in self.fake_spi.transfers])
+        self.assertEqual(4_000_000, self.fake_spi.max_speed_hz)
+
+    def test_encoding_matches_ws2812_bit_patterns(self):
+        self.assertEqual([0xF8, 0x80] * 4, SpiController.encode_ws2812_numpy8([0xAA]).tolist())
+        self.assertEqual([0xEE, 0x88, 0xEE, 0x88], SpiController.encode_ws2812_numpy4([0xCC]).tolist())
+
+    def test_values_above_255_keep_their_low_byte(self):
+        self.assertEqual([0xF8, 0x80] * 4, SpiController.encode_ws2812_numpy8([0x1AA]).tolist())
+        self.assertEqual([0xEE, 0x88, 0xEE, 0x88], SpiController.encode_ws2812_numpy4([0x3CC]).tolist())
+
+    def test_throughput_and_reset(self):
+        spi = SpiController(chunk_size=64, spi_dev=self.fake_spi)
+        self.assertEqual(0.0, spi.throughput())
+        spi.write([0] * 30)
+        self.assertGreater(spi.throughput(), 0)
+        spi.reset_stats()
+        self.assertEqual((0, 0, 0.0), (spi.bytes_sent, spi.transfer_count, spi.transfer_time))
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            SpiController(chunk_size=-1, spi_dev=self.fake_spi)
+
+    def test_missing_spidev_raises(self):
+        with patch.object(spi_controller, "spidev", None):
+            with self.assertRaises(RuntimeError):
+                SpiController()
+
+    def test_read_spidev_bufsiz(self):
+        with patch("builtins.open", mock_open(read_data="65536\n")):
+            self.assertEqual(65536, spi_controller.read_spidev_bufsiz())
+        with patch("builtins.open", side_effect=OSError):
+            self.assertEqual(spi_controller.SPIDEV_DEFAULT_BUFSIZ, spi_controller.read_spidev_bufsiz())
+
+
+if __name__ == "__main__":
+    unittest.main()
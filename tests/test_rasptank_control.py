@@ -67,6 +67,15 @@ def rebind_servos(arm, hand, wrist, claw, cam):
     )
 
 
+def tearDownModule():  # pylint: disable=invalid-name
+    rasptank_controls.I2C_BUS.stop_thread()
+
+
+class TestI2CBus(unittest.TestCase):
+    def test_import_starts_no_bus_thread(self):
+        self.assertFalse(rasptank_controls.I2C_BUS.is_alive())
+
+
 class TestServoInit(unittest.TestCase):
     def test_servo_pos_init(self):
         arm = Mock()
@@ -274,6 +283,31 @@ class TestAdditionalAsyncFlows(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(payload["title"], "home")
 
 
+class TestQueries(unittest.IsolatedAsyncioTestCase):
+    async def test_query_returns_data_with_optional_argument(self):
+        websocket = AsyncMock()
+        history = Mock(return_value={"resolution": 1.0, "age": [], "series": {}})
+        await WebSocketHandler.process(websocket, "get_history 60", {}, {}, {"get_history": history})
+        await WebSocketHandler.process(websocket, "get_history", {}, {}, {"get_history": history})
+        self.assertEqual([((60,),), ((),)], [call[:1] for call in history.call_args_list])
+        payload = json.loads(websocket.send.call_args_list[0].args[0])
+        self.assertEqual(("ok", "get_history", 1.0), (payload["status"], payload["title"], payload["data"]["resolution"]))
+
+    async def test_handler_dispatches_queries(self):
+        websocket = AsyncMock()
+        websocket.recv.side_effect = ["admin:123456", "get_history 5", ConnectionClosed(None, None)]
+        handler = WebSocketHandler(queries={"get_history": lambda seconds: {"seconds": seconds}})
+        with self.assertRaises(ConnectionClosed):
+            await handler(websocket, "/")
+        payload = json.loads(websocket.send.call_args_list[-1].args[0])
+        self.assertEqual({"seconds": 5}, payload["data"])
+
+    def test_telemetry_sources_are_numeric(self):
+        self.assertIn("get_history", rasptank_controls.queries)
+        for name, source in rasptank_controls.telemetry_sources().items():
+            self.assertIsInstance(float(source()), float, name)
+
+
 class TestWifiCheckAPBranch(unittest.TestCase):
     def test_wifi_check_triggers_ap_on_exception(self):
         # Force socket creation to raise to hit AP thread branch
@@ -1,5 +1,7 @@
 # tests/test_system.py
+import asyncio
 import json
+import subprocess
 
 import unittest
 from unittest.mock import patch, mock_open, call
@@ -29,3 +31,162 @@ class TestSystemGetInfo(unittest.TestCase):
         self.assertTrue(all(isinstance(k, str) for k in info))
         # Entire payload should be JSON-serializable
         json.dumps(info, default=str)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSystemSampler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patchers = [
+            patch("src.system.psutil.cpu_percent", return_value=12.5),
+            patch("src.system.psutil.virtual_memory", return_value=[0, 0, 33.0]),
+            patch("src.system._read_cpu_temp_str", return_value="45.0"),
+            patch("src.system.get_gpu_tempfunc", return_value="50.1'C"),
+        ]
+        self.mocks = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.addCleanup(system.stop_sampler)
+
+    def test_sample_fills_ring_buffer(self):
+        sampler = system.SystemSampler(history=2, clock=self.clock)
+        self.assertIsNone(sampler.latest())
+        for _ in range(3):
+            sampler.sample()
+            self.clock.now += 1
+        self.assertEqual(2, len(sampler.samples))
+        self.assertEqual(
+            {"time": 1002.0, "cpu_temp": 45.0, "cpu_use": 12.5, "ram_use": 33.0, "gpu_temp": "50.1'C"},
+            {key: value for key, value in sampler.latest().items() if key != "info"},
+        )
+
+    def test_gpu_temperature_is_cached_for_ttl(self):
+        get_gpu_temp = self.mocks[3]
+        sampler = system.SystemSampler(gpu_ttl=30, clock=self.clock)
+        sampler.sample()
+        self.clock.now += 10
+        sampler.sample()
+        self.assertEqual(1, get_gpu_temp.call_count)
+        self.clock.now += 30
+        get_gpu_temp.side_effect = FileNotFoundError("vcgencmd")
+        self.assertIsNone(sampler.sample()["gpu_temp"])
+        self.assertEqual(2, get_gpu_temp.call_count)
+
+    def test_hung_gpu_command_gives_no_temperature(self):
+        self.mocks[3].side_effect = subprocess.TimeoutExpired("vcgencmd", 2)
+        sampler = system.SystemSampler(clock=self.clock)
+        self.assertIsNone(sampler.sample()["gpu_temp"])
+
+    def test_failed_cpu_temperature_keeps_last_snapshot(self):
+        sampler = system.SystemSampler(clock=self.clock)
+        first = sampler.sample()
+        self.mocks[2].side_effect = OSError("no thermal zone")
+        self.assertIsNone(sampler.sample())
+        self.assertIs(first, sampler.latest())
+        self.assertEqual(1, sampler.error_count)
+
+    def test_stale_snapshot_is_not_served(self):
+        sampler = system.SystemSampler(interval=1, clock=self.clock)
+        self.assertEqual(3, sampler.max_age)
+        first = sampler.sample()
+        self.mocks[2].side_effect = OSError("no thermal zone")
+        self.clock.now += 3
+        sampler.sample()
+        self.assertIs(first, sampler.latest())
+        self.clock.now += 1
+        sampler.sample()
+        self.assertIsNone(sampler.latest())
+
+    def test_get_info_uses_running_sampler(self):
+        sampler = system.start_sampler(interval=60)
+        self.assertIs(sampler, system.start_sampler())
+        self.assertEqual(["45.0", "12.5", "33.0"], system.get_info())
+        # Requests are answered from the snapshot, not by reading the metrics again
+        read_cpu_temp = self.mocks[2]
+        calls = read_cpu_temp.call_count
+        system.get_info()
+        self.assertEqual(calls, read_cpu_temp.call_count)
+        system.stop_sampler()
+        self.assertFalse(sampler.is_alive())
+
+    def test_get_info_reads_directly_when_sampler_stalls(self):
+        sampler = system.start_sampler(interval=60, clock=self.clock)
+        self.clock.now += 181
+        read_cpu_temp = self.mocks[2]
+        calls = read_cpu_temp.call_count
+        self.assertEqual(["45.0", "12.5", "33.0"], system.get_info())
+        self.assertEqual(calls + 1, read_cpu_temp.call_count)
+        # A failing direct read is reported to the caller instead of an old snapshot
+        read_cpu_temp.side_effect = OSError("no thermal zone")
+        with self.assertRaises(OSError):
+            system.get_info()
+        sampler.stop_thread()
+
+
+class TestTelemetryStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = system.TelemetryStore(("cpu_temp", "loop_lag"), ((1.0, 10), (5.0, 4)), clock=self.clock)
+
+    def record_seconds(self, count):
+        for _ in range(count):
+            self.store.record(self.clock.now, {"cpu_temp": self.clock.now - 1000.0, "loop_lag": None})
+            self.clock.now += 1.0
+        self.clock.now -= 1.0
+
+    def test_query_recent_history_from_finest_tier(self):
+        self.record_seconds(4)
+        history = self.store.query(10)
+        self.assertEqual(1.0, history["resolution"])
+        self.assertEqual([-3.0, -2.0, -1.0, 0.0], history["age"])
+        self.assertEqual([0.0, 1.0, 2.0, 3.0], history["series"]["cpu_temp"])
+        # Metrics without samples are reported as gaps
+        self.assertEqual([None] * 4, history["series"]["loop_lag"])
+        json.dumps(history)
+
+    def test_fine_tier_wraps_and_coarse_tier_downsamples(self):
+        self.record_seconds(25)
+        fine = self.store.query(10, metrics=["cpu_temp"])
+        self.assertEqual([float(value) for value in range(15, 25)], fine["series"]["cpu_temp"])
+        self.assertEqual(["cpu_temp"], list(fine["series"]))
+        coarse = self.store.query(20)
+        self.assertEqual(5.0, coarse["resolution"])
+        # 5 s buckets are averaged; the bucket being filled is reported last
+        self.assertEqual([7.0, 12.0, 17.0, 22.0], coarse["series"]["cpu_temp"])
+        self.assertEqual([-15.0, -10.0, -5.0, 0.0], coarse["age"])
+
+    def test_query_beyond_retention_uses_coarsest_tier(self):
+        self.record_seconds(3)
+        self.assertEqual(5.0, self.store.query(3600)["resolution"])
+
+    def test_sampler_records_sources_into_store(self):
+        with patch("src.system._read_cpu_temp_str", return_value="45.0"), patch(
+            "src.system.psutil.cpu_percent", return_value=1.0
+        ), patch("src.system.psutil.virtual_memory", return_value=[0, 0, 2.0]), patch(
+            "src.system.get_gpu_tempfunc", return_value=""
+        ):
+            sampler = system.SystemSampler(
+                store=self.store, sources={"loop_lag": lambda: 0.25, "broken": lambda: 1 / 0}, clock=self.clock
+            )
+            snapshot = sampler.sample()
+        self.assertIsNone(snapshot["broken"])
+        self.assertEqual([0.25], self.store.query(10)["series"]["loop_lag"])
+
+    def test_get_history_reads_shared_store(self):
+        self.assertEqual({"resolution", "age", "series"}, set(system.get_history(60)))
+
+
+class TestLoopLagProbe(unittest.IsolatedAsyncioTestCase):
+    async def test_probe_measures_lag(self):
+        probe = system.LoopLagProbe(interval=0.01)
+        task = asyncio.create_task(probe.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        self.assertGreaterEqual(probe.lag, 0.0)
@@ -0,0 +1,159 @@
+import asyncio
+import time
+import unittest
+from collections import namedtuple
+from unittest.mock import AsyncMock, Mock
+
+from websockets.exceptions import ConnectionClosed
+
+from src.video_stream import HEADER, FrameBroadcaster, VideoFrame, VideoStreamHandler, pack_frame, unpack_frame
+
+
+class FakeCamera:
+    """Camera publishing a new JPEG frame every `interval` seconds."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.viewers = 0
+        self.generation = 0
+
+    def add_viewer(self):
+        self.viewers += 1
+
+    def remove_viewer(self):
+        self.viewers -= 1
+
+    def wait_jpeg(self, generation, profile=None, timeout=None):  # pylint: disable=unused-argument
+        time.sleep(self.interval)
+        self.generation += 1
+        return self.generation, b"jpeg%d" % self.generation
+
+
+FrameStamp = namedtuple("FrameStamp", ["sequence", "captured"])
+
+
+class StampedCamera(FakeCamera):
+    """Camera whose frames were captured `delay` seconds before they are read."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.stamps = {}
+
+    def wait_jpeg(self, generation, profile=None, timeout=None):
+        latest, jpeg = super().wait_jpeg(generation, profile, timeout)
+        self.stamps[latest] = FrameStamp(latest, time.monotonic() - self.delay)
+        return latest, jpeg
+
+    def frame_stamp(self, generation):
+        return self.stamps.get(generation)
+
+
+def client_websocket(frames, buffered=None):
+    """Websocket that authenticates, then closes after receiving `frames` messages."""
+    websocket = AsyncMock()
+    websocket.recv.return_value = "admin:123456"
+    websocket.remote_address = ("127.0.0.1", 50000)
+    websocket.transport = Mock()
+    websocket.transport.get_write_buffer_size.side_effect = buffered or (lambda: 0)
+    messages = []
+
+    async def send(message):
+        if isinstance(message, bytes):
+            messages.append(message)
+            if len(messages) >= frames:
+                raise ConnectionClosed(None, None)
+
+    websocket.send.side_effect = send
+    return websocket, messages
+
+
+class TestFrameFormat(unittest.TestCase):
+    def test_header_round_trip(self):
+        message = pack_frame(VideoFrame(7, 1700000000.25, b"\xff\xd8jpeg"))
+        self.assertEqual(12, HEADER.size)
+        self.assertEqual(VideoFrame(7, 1700000000.25, b"\xff\xd8jpeg"), unpack_frame(message))
+
+    def test_sequence_wraps_at_32_bits(self):
+        self.assertEqual(1, unpack_frame(pack_frame(VideoFrame(2**32 + 1, 0.0, b""))).sequence)
+
+
+class TestVideoStreamHandler(unittest.IsolatedAsyncioTestCase):
+    async def test_streams_frames_after_handshake(self):
+        camera = FakeCamera()
+        handler = VideoStreamHandler(camera)
+        websocket, messages = client_websocket(5)
+        with self.assertRaises(ConnectionClosed):
+            await handler(websocket)
+        self.assertIn("congratulation", websocket.send.call_args_list[0][0][0])
+        sequences = [unpack_frame(message).sequence for message in messages]
+        self.assertEqual(sequences, sorted(set(sequences)))
+        self.assertTrue(unpack_frame(messages[0]).jpeg.startswith(b"jpeg"))
+        # The client is gone: the camera viewer is released and the stats are empty
+        self.assertEqual(0, camera.viewers)
+        self.assertEqual([], handler.stats())
+
+    async def test_undrained_client_skips_frames(self):
+        handler = VideoStreamHandler(FakeCamera(), max_buffered=1000)
+        backlog = iter([5000, 5000, 5000])
+        websocket, messages = client_websocket(2, lambda: next(backlog, 0))
+        stats = []
+
+        async def send(message):
+            if isinstance(message, bytes):
+                messages.append(message)
+                stats.extend(handler.stats())
+                if len(messages) >= 2:
+                    raise ConnectionClosed(None, None)
+
+        websocket.send.side_effect = send
+        with self.assertRaises(ConnectionClosed):
+            await handler(websocket)
+        first = unpack_frame(messages[0]).sequence
+        # The three frames seen while the transport held 5000 bytes were not sent
+        self.assertGreaterEqual(first, 4)
+        self.assertGreaterEqual(stats[-1]["skipped"], 3)
+        self.assertEqual(("127.0.0.1", 50000), stats[-1]["address"])
+        # The kernel send buffer of the connection was shrunk
+        websocket.transport.get_extra_info.return_value.setsockopt.assert_called_once()
+
+    async def test_clients_share_one_camera_reader(self):
+        camera = FakeCamera(interval=0.01)
+        broadcaster = FrameBroadcaster(camera, clock=lambda: 42.0)
+        handler = VideoStreamHandler(camera, broadcaster=broadcaster)
+        first, first_messages = client_websocket(3)
+        second, second_messages = client_websocket(3)
+        results = await asyncio.gather(handler(first), handler(second), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ConnectionClosed) for result in results))
+        # Both clients were sent the same frames, fetched once from the camera
+        first_sequences = [unpack_frame(message).sequence for message in first_messages]
+        second_sequences = [unpack_frame(message).sequence for message in second_messages]
+        self.assertTrue(set(first_sequences) & set(second_sequences))
+        self.assertEqual(42.0, unpack_frame(first_messages[0]).timestamp)
+        self.assertEqual(0, broadcaster.subscribers)
+
+    async def test_frames_carry_capture_time_and_lag(self):
+        handler = VideoStreamHandler(StampedCamera(delay=0.5))
+        websocket, messages = client_websocket(3)
+        stats = []
+
+        async def send(message):
+            if isinstance(message, bytes):
+                messages.append(message)
+                if len(messages) >= 3:
+                    stats.extend(handler.stats())
+                    raise ConnectionClosed(None, None)
+
+        websocket.send.side_effect = send
+        sent = time.time()
+        with self.assertRaises(ConnectionClosed):
+            await handler(websocket)
+        # The header holds the capture time, not the time the frame was read
+        self.assertAlmostEqual(sent - 0.5, unpack_frame(messages[0]).timestamp, delta=0.2)
+        # Lags of the first two sends: the frame was half a second old
+        self.assertEqual(2, stats[-1]["sent"])
+        self.assertGreaterEqual(stats[-1]["lag_ms"]["max"], 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
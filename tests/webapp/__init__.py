@@ -0,0 +1,7 @@
+# The web/ modules import each other as top-level modules, as when web/ is the working directory
+import os
+import sys
+
+WEB_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "web")
+if WEB_DIR not in sys.path:
+    sys.path.append(WEB_DIR)
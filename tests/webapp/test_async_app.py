@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from static_assets import StaticAssets
+
+# async_app opens the Pi camera through camera_opencv on import; the stand-in is removed afterwards
+sys.modules["camera_opencv"] = Mock()
+try:
+    import async_app
+finally:
+    del sys.modules["camera_opencv"]
+
+
+class TestAsyncApp(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        camera = Mock()
+        camera.governor.settings.return_value = {"fps": 30}
+        camera.governor.changes.return_value = []
+        camera.latency.stats.return_value = {}
+        with patch("async_app.StaticAssets"):
+            self.server = async_app.StreamServer(camera)
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.directory.cleanup)
+        with open(os.path.join(self.directory.name, "index.html"), "w", encoding="utf-8") as f:
+            f.write("<html></html>")
+        self.server.assets["dist"] = StaticAssets(self.directory.name, os.path.join(self.directory.name, ".cache"))
+        self.listener = await asyncio.start_server(self.server.handle, "127.0.0.1", 0, limit=async_app.MAX_HEADER_SIZE)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def exchange(self, data):
+        """Send raw request bytes and return everything the server sends until it closes the connection."""
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(data)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response
+
+    async def test_bad_request_line_is_400(self):
+        response = await self.exchange(b"NONSENSE\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 Bad Request\r\n"))
+
+    async def test_oversized_header_is_431(self):
+        response = await self.exchange(b"GET / HTTP/1.1\r\nX-Big: " + b"x" * async_app.MAX_HEADER_SIZE + b"\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 431 "))
+
+    async def test_unsupported_method_is_405(self):
+        response = await self.exchange(b"POST /stream_settings HTTP/1.1\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 405 "))
+
+    async def test_bad_stream_profile_is_400(self):
+        response = await self.exchange(b"GET /video_feed?fps=0 HTTP/1.1\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+        self.assertTrue(response.endswith(b"fps must be positive"))
+
+    async def test_http_1_1_keeps_the_connection_until_close(self):
+        response = await self.exchange(
+            b"GET /stream_settings HTTP/1.1\r\n\r\n"
+            b"GET /stream_latency HTTP/1.1\r\n\r\n"
+            b"GET /stream_settings HTTP/1.1\r\nConnection: close\r\n\r\n"
+            b"GET /stream_latency HTTP/1.1\r\n\r\n"
+        )
+        self.assertEqual(3, response.count(b"HTTP/1.1 200 OK"))
+        self.assertIn(b'{"current": {"fps": 30}, "history": []}', response)
+
+    async def test_http_1_0_closes_unless_asked_to_keep_alive(self):
+        response = await self.exchange(b"GET /stream_latency HTTP/1.0\r\n\r\nGET /stream_latency HTTP/1.0\r\n\r\n")
+        self.assertEqual(1, response.count(b"HTTP/1.1 200 OK"))
+        self.assertNotIn(b"Connection: keep-alive", response)
+        response = await self.exchange(
+            b"GET /stream_latency HTTP/1.0\r\nConnection: keep-alive\r\n\r\nGET /stream_latency HTTP/1.0\r\n\r\n"
+        )
+        self.assertEqual(2, response.count(b"HTTP/1.1 200 OK"))
+        self.assertEqual(1, response.count(b"Connection: keep-alive"))
+
+    async def test_head_and_304_have_no_body(self):
+        response = await self.exchange(b"HEAD /index.html HTTP/1.1\r\nConnection: close\r\n\r\n")
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertIn(b"Content-Length: 13", head)
+        self.assertEqual(b"", body)
+        etag = self.server.assets["dist"].get("index.html").etag()
+        response = await self.exchange(b"GET / HTTP/1.1\r\nIf-None-Match: " + etag.encode() + b"\r\nConnection: close\r\n\r\n")
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertTrue(head.startswith(b"HTTP/1.1 304 "))
+        self.assertNotIn(b"Content-Type", head)
+        self.assertEqual(b"", body)
+
+    async def test_missing_file_is_404(self):
+        response = await self.exchange(b"GET /js/missing.js HTTP/1.1\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 404 "))
+
+    async def test_head_video_feed_sends_headers_only(self):
+        response = await self.exchange(
+            b"HEAD /video_feed HTTP/1.1\r\n\r\nHEAD /video_feed HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        self.assertEqual(2, response.count(b"Content-Type: multipart/x-mixed-replace; boundary=frame"))
+        self.assertTrue(response.endswith(b"\r\n\r\n"))
+        self.server.camera.add_viewer.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from base_camera import BaseCamera, CameraEvent
+from latency import FrameStamp
+from tests.async_helper import wait_for
+
+
+class TestCameraEvent(unittest.TestCase):
+    def setUp(self):
+        self.event = CameraEvent(history=3)
+
+    def test_newer_frame_is_returned_without_waiting(self):
+        self.event.set("frame 1")
+        self.event.set("frame 2")
+        # a client that missed frame 1 gets the newest frame, not a backlog
+        self.assertEqual((2, "frame 2"), self.event.wait(0, timeout=0))
+        self.assertEqual((2, "frame 2"), self.event.latest())
+
+    def test_timeout_returns_the_generation_already_seen(self):
+        self.event.set("frame 1")
+        started = time.monotonic()
+        self.assertEqual((1, "frame 1"), self.event.wait(1, timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+    def test_one_frame_wakes_every_waiting_client(self):
+        results = []
+        clients = [threading.Thread(target=lambda: results.append(self.event.wait(0, timeout=5))) for _ in range(5)]
+        for client in clients:
+            client.start()
+        time.sleep(0.05)
+        self.event.set("frame 1")
+        for client in clients:
+            client.join(5)
+        self.assertEqual([(1, "frame 1")] * 5, results)
+
+    def test_cleared_event_waits_for_the_next_frame(self):
+        self.event.set("frame 1")
+        self.event.clear()
+        self.assertEqual((1, None), self.event.wait(0, timeout=0.01))
+        self.event.set("frame 2")
+        self.assertEqual((2, "frame 2"), self.event.wait(0, timeout=0))
+
+    def test_stamps_of_recent_frames_are_kept(self):
+        for sequence in range(1, 6):
+            self.event.set("frame", FrameStamp(sequence, 100.0 + sequence))
+        self.assertEqual(FrameStamp(5, 105.0), self.event.stamp(5))
+        self.assertEqual(FrameStamp(3, 103.0), self.event.stamp(3))
+        self.assertIsNone(self.event.stamp(2))
+        self.assertEqual(3, len(self.event.stamps))
+
+
+class FakeCamera(BaseCamera):
+    """Camera producing a small frame every 5 ms."""
+
+    runs = 0
+    keep = False
+
+    @staticmethod
+    def keep_alive():
+        return FakeCamera.keep
+
+    @staticmethod
+    def frames():
+        FakeCamera.runs += 1
+        while True:
+            time.sleep(0.005)
+            yield np.zeros((48, 64, 3), np.uint8)
+
+
+class TestCameraLifecycle(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(BaseCamera, "idle_timeout", 0.1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.stop_camera)
+        FakeCamera.runs = 0
+        FakeCamera.keep = False
+
+    def stop_camera(self):
+        FakeCamera.keep = False
+        wait_for(lambda: BaseCamera.thread is None, 5, 0.01)
+        BaseCamera.last_thread.join(5)
+
+    def test_capture_stops_when_idle_and_restarts_on_the_next_viewer(self):
+        camera = FakeCamera()
+        self.assertIsNotNone(camera.wait_frame(0, timeout=5)[1])
+        camera.add_viewer()
+        time.sleep(0.3)
+        # a viewer keeps capture running past the idle timeout
+        self.assertIsNotNone(BaseCamera.thread)
+        camera.remove_viewer()
+        wait_for(lambda: BaseCamera.thread is None, 5, 0.01)
+        # the last frame is not served after the stop
+        self.assertIsNone(BaseCamera.event.latest()[1])
+        generation = BaseCamera.event.latest()[0]
+        _, frame = camera.wait_frame(generation, timeout=5)
+        self.assertIsNotNone(frame)
+        self.assertEqual(2, FakeCamera.runs)
+
+    def test_vision_mode_keeps_capture_running_without_viewers(self):
+        FakeCamera.keep = True
+        camera = FakeCamera()
+        camera.start()
+        time.sleep(0.3)
+        self.assertIsNotNone(BaseCamera.thread)
+        self.assertEqual(1, FakeCamera.runs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import struct
+import tempfile
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from clip_recorder import AVI_HEADER_SIZE, ClipRecorder, MjpegAviWriter, jpeg_size
+from frame_cache import EncodeProfile
+
+
+def make_jpeg(width=64, height=48, value=0):
+    return cv2.imencode(".jpg", np.full((height, width, 3), value, np.uint8))[1].tobytes()
+
+
+def read_chunks(data, start, end):
+    """Yield (fourcc, payload offset, size) of the RIFF chunks between start and end."""
+    position = start
+    while position < end:
+        fourcc, size = struct.unpack_from("<4sI", data, position)
+        yield fourcc, position + 8, size
+        position += 8 + size + size % 2
+
+
+class Governor:
+    def __init__(self, profile):
+        self.encode = profile
+
+    def profile(self, width, height):  # pylint: disable=unused-argument
+        return self.encode
+
+
+class FakeCamera:
+    def __init__(self, profile=EncodeProfile(None, None, 90)):
+        self.governor = Governor(profile)
+
+
+class TestMjpegAviWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "clip.avi")
+
+    def test_jpeg_size_reads_the_sof_segment(self):
+        self.assertEqual((64, 48), jpeg_size(make_jpeg(64, 48)))
+        self.assertIsNone(jpeg_size(b"\xff\xd8not a jpeg"))
+
+    def test_riff_layout_and_index(self):
+        frames = [make_jpeg(value=value) for value in (0, 128, 255)]
+        writer = MjpegAviWriter(self.path)
+        for number, jpeg in enumerate(frames):
+            writer.write(jpeg, 10.0 + number * 0.25)
+        writer.close()
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        riff, riff_size, form = struct.unpack_from("<4sI4s", data)
+        self.assertEqual((b"RIFF", len(data) - 8, b"AVI "), (riff, riff_size, form))
+        avih = data.index(b"avih") + 8
+        usec, _, _, flags, total_frames = struct.unpack_from("<5I", data, avih)
+        width, height = struct.unpack_from("<2I", data, avih + 32)
+        # 0.5 s between the first and the last of three frames: 4 fps
+        self.assertEqual((250000, 3, (64, 48)), (usec, total_frames, (width, height)))
+        self.assertTrue(flags & 0x10)
+
+        movi = AVI_HEADER_SIZE - 4
+        self.assertEqual(b"movi", data[movi : movi + 4])
+        chunks = list(read_chunks(data, AVI_HEADER_SIZE, len(data)))
+        self.assertEqual([b"00dc"] * 3 + [b"idx1"], [fourcc for fourcc, _, _ in chunks])
+        _, index, index_size = chunks[-1]
+        self.assertEqual(3 * 16, index_size)
+        for number, jpeg in enumerate(frames):
+            fourcc, _, offset, size = struct.unpack_from("<4sIII", data, index + 16 * number)
+            # idx1 offsets point at the chunk header, counted from the 'movi' fourcc
+            self.assertEqual((b"00dc", len(jpeg)), (fourcc, size))
+            self.assertEqual(b"00dc", data[movi + offset : movi + offset + 4])
+            self.assertEqual(jpeg, data[movi + offset + 8 : movi + offset + 8 + size])
+
+    def test_existing_file_is_not_overwritten(self):
+        with open(self.path, "wb") as f:
+            f.write(b"older clip")
+        with self.assertRaises(FileExistsError):
+            MjpegAviWriter(self.path)
+
+
+class TestClipRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.directory.cleanup)
+        self.camera = FakeCamera()
+        self.jpeg = make_jpeg()
+
+    def recorder(self, **kwargs):
+        return ClipRecorder(self.camera, directory=self.directory.name, **kwargs)
+
+    def test_pre_roll_is_bounded_by_time_and_bytes(self):
+        recorder = self.recorder(pre_roll=1.1)
+        for number in range(30):
+            recorder.add(self.jpeg, number * 0.25)
+        self.assertEqual(5, len(recorder.buffer))
+        self.assertEqual(5 * len(self.jpeg), recorder.buffered_bytes)
+        recorder = self.recorder(pre_roll=1.1, max_bytes=3 * len(self.jpeg))
+        for number in range(30):
+            recorder.add(self.jpeg, number * 0.25)
+        self.assertEqual(3, len(recorder.buffer))
+        self.assertEqual([], recorder.clips)
+
+    def test_trigger_writes_pre_roll_and_post_roll(self):
+        recorder = self.recorder(pre_roll=0.6, post_roll=0.6)
+        start = time.monotonic()
+        for number in range(10):
+            recorder.add(self.jpeg, start - 2.5 + number * 0.25)
+        recorder.trigger()
+        timestamp = recorder.triggered
+        while recorder.writer is not None or not recorder.clips:
+            recorder.add(self.jpeg, timestamp)
+            timestamp += 0.25
+        self.assertEqual(1, len(recorder.clips))
+        self.assertTrue(os.path.isfile(recorder.clips[0]))
+        self.assertEqual([os.path.basename(recorder.clips[0])], os.listdir(self.directory.name))
+        with open(recorder.clips[0], "rb") as f:
+            data = f.read()
+        frames = [fourcc for fourcc, _, _ in read_chunks(data, AVI_HEADER_SIZE, len(data)) if fourcc == b"00dc"]
+        # 0.6 s of pre-roll (3 frames) and the frames until 0.6 s after the trigger
+        self.assertEqual(3 + 4, len(frames))
+        self.assertEqual((0, 0), (len(recorder.buffer), recorder.buffered_bytes))
+        self.assertIsNone(recorder.stats()["recording"])
+
+    def test_clip_is_cut_after_max_seconds(self):
+        recorder = self.recorder(post_roll=10.0, max_seconds=1.0)
+        recorder.trigger()
+        timestamp = recorder.triggered
+        for _ in range(12):
+            recorder.add(self.jpeg, timestamp)
+            timestamp += 0.25
+        # still triggered: a second clip follows the first one
+        self.assertEqual(2, len(recorder.clips))
+        self.assertEqual(2, len(set(recorder.clips)))
+        self.assertIsNotNone(recorder.stats()["recording"])
+        recorder.writer.close()
+
+    def test_clip_keeps_its_size_when_the_stream_is_scaled(self):
+        recorder = self.recorder()
+        self.assertEqual(EncodeProfile(None, None, 90), recorder.encode_profile(640, 480))
+        recorder.trigger()
+        recorder.add(make_jpeg(640, 480), recorder.triggered)
+        self.camera.governor.encode = EncodeProfile(320, 240, 50)
+        self.assertEqual(EncodeProfile(640, 480, 50), recorder.encode_profile(640, 480))
+        recorder.writer.close()
+        self.assertEqual(EncodeProfile(1, 2, 3), self.recorder(profile=EncodeProfile(1, 2, 3)).encode_profile(640, 480))
+
+    def test_pre_roll_of_another_size_is_left_out(self):
+        recorder = self.recorder(pre_roll=5.0)
+        start = time.monotonic()
+        recorder.add(make_jpeg(32, 24), start - 0.2)
+        recorder.add(self.jpeg, start - 0.1)
+        recorder.trigger()
+        recorder.add(self.jpeg, recorder.triggered)
+        self.assertEqual(2, len(recorder.writer.index))
+        self.assertEqual((64, 48), recorder.writer.size)
+        recorder.writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from frame_cache import (
+    STREAM_PROFILES,
+    EncodedFrameCache,
+    EncodeProfile,
+    StreamProfile,
+    encode_jpeg,
+    frame_etag,
+    output_size,
+    parse_stream_profile,
+)
+
+
+def slow_encode(image, quality):
+    # long enough for every client thread to ask for the same frame
+    time.sleep(0.05)
+    return b"%dx%d q%d" % (image.shape[1], image.shape[0], quality)
+
+
+class TestEncodedFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = EncodedFrameCache()
+        self.image = np.zeros((480, 640, 3), np.uint8)
+
+    def test_encode_jpeg(self):
+        self.assertTrue(encode_jpeg(self.image, 50).startswith(b"\xff\xd8"))
+
+    def test_concurrent_clients_share_one_encode(self):
+        results = []
+        with patch("frame_cache.encode_jpeg", side_effect=slow_encode) as encode:
+            clients = [
+                threading.Thread(target=lambda: results.append(self.cache.get(1, self.image, EncodeProfile(None, None, 80))))
+                for _ in range(8)
+            ]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join(5)
+        self.assertEqual([b"640x480 q80"] * 8, results)
+        self.assertEqual(1, encode.call_count)
+        self.assertEqual({"generation": 1, "cached": 1, "encodes": 1, "resizes": 0, "hits": 7}, self.cache.stats())
+
+    def test_profiles_of_one_size_share_the_resize(self):
+        with patch("frame_cache.encode_jpeg", side_effect=slow_encode):
+            self.assertEqual(b"320x240 q50", self.cache.get(1, self.image, EncodeProfile(320, 240, 50)))
+            self.assertEqual(b"320x240 q70", self.cache.get(1, self.image, EncodeProfile(320, None, 70)))
+        self.assertEqual((2, 1), (self.cache.stats()["encodes"], self.cache.stats()["resizes"]))
+
+    def test_newer_frame_drops_older_entries(self):
+        profile = EncodeProfile(None, None, 80)
+        with patch("frame_cache.encode_jpeg", side_effect=slow_encode) as encode:
+            self.cache.get(1, self.image, profile)
+            self.cache.get(2, self.image, profile)
+            self.assertEqual(1, self.cache.stats()["cached"])
+            # a late client still gets frame 1, encoded again and not cached
+            self.cache.get(1, self.image, profile)
+            self.assertEqual((3, 2), (encode.call_count, self.cache.stats()["generation"]))
+
+    def test_output_size_never_upscales(self):
+        self.assertIsNone(output_size(self.image, EncodeProfile(None, None, 80)))
+        self.assertEqual((320, 240), output_size(self.image, EncodeProfile(None, 240, 80)))
+        self.assertIsNone(output_size(self.image, EncodeProfile(1280, 960, 80)))
+
+
+class TestStreamProfiles(unittest.TestCase):
+    def test_named_profiles(self):
+        self.assertEqual(StreamProfile(None, None), parse_stream_profile({}))
+        self.assertEqual(STREAM_PROFILES["low"], parse_stream_profile({"profile": "low"}))
+        self.assertEqual(StreamProfile(None, 5), parse_stream_profile({"fps": "5"}))
+
+    def test_explicit_settings_override_the_profile(self):
+        self.assertEqual(
+            StreamProfile(EncodeProfile(320, 240, 60), 10), parse_stream_profile({"profile": "low", "quality": "60"})
+        )
+        # sizes are rounded down to SIZE_STEP and kept above MIN_SIZE; an empty value is not set
+        self.assertEqual(
+            StreamProfile(EncodeProfile(320, None, 95), None), parse_stream_profile({"width": "333", "height": ""})
+        )
+        self.assertEqual(EncodeProfile(64, 64, 95), parse_stream_profile({"w": "10", "h": "1"}).encode)
+
+    def test_bad_values_raise_value_error(self):
+        for args in (
+            {"profile": "ultra"},
+            {"fps": "0"},
+            {"quality": "0"},
+            {"q": "101"},
+            {"width": "wide"},
+        ):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                parse_stream_profile(args)
+
+    def test_frame_etag_names_the_frame_and_its_encoding(self):
+        etag = frame_etag(7, EncodeProfile(320, None, 60))
+        self.assertTrue(etag.endswith("-7-320-0-60"))
+        self.assertNotEqual(etag, frame_etag(8, EncodeProfile(320, None, 60)))
+        self.assertNotEqual(etag, frame_etag(7, EncodeProfile(320, None, 70)))
+
+
+if __name__ == "__main__":
+    unittest.main()
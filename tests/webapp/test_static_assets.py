@@ -0,0 +1,100 @@
+import gzip
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+
+from static_assets import IMMUTABLE, REVALIDATE, StaticAssets, accepted_encodings
+
+SCRIPT = "function main() { return 'robot'; }\n" * 40
+
+
+def load_flask_app():
+    """Import web/app.py under another name: tests/test_rasptank_control.py puts a stand-in at 'app'."""
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "web", "app.py")
+    spec = importlib.util.spec_from_file_location("web_flask_app", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["camera_opencv"] = Mock()
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        del sys.modules["camera_opencv"]
+    return module
+
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, "dist")
+        os.makedirs(os.path.join(self.root, "js"))
+        self.write("index.html", "<html></html>")
+        self.write("js/app.6a3c9e3b.js", SCRIPT)
+        with open(os.path.join(directory.name, "secret.txt"), "w", encoding="utf-8") as f:
+            f.write("outside the root")
+        self.assets = StaticAssets(self.root, os.path.join(directory.name, "cache"))
+
+    def write(self, name, text):
+        with open(os.path.join(self.root, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_paths_outside_the_root_are_not_served(self):
+        for name in ("../secret.txt", "/../secret.txt", "js/../../secret.txt", "js/missing.js"):
+            with self.subTest(name=name):
+                self.assertIsNone(self.assets.respond(name))
+
+    def test_directory_path_serves_its_index(self):
+        status, headers, body = self.assets.respond("/")
+        self.assertEqual((200, b"<html></html>"), (status, body))
+        self.assertIn(("Cache-Control", REVALIDATE), headers)
+        self.assertIn(("Content-Type", "text/html; charset=utf-8"), headers)
+
+    def test_gzip_is_sent_to_clients_accepting_it(self):
+        status, headers, body = self.assets.respond("js/app.6a3c9e3b.js", accept_encoding="deflate, gzip;q=0.8")
+        self.assertEqual(200, status)
+        self.assertIn(("Content-Encoding", "gzip"), headers)
+        self.assertIn(("Cache-Control", IMMUTABLE), headers)
+        self.assertEqual(SCRIPT.encode(), gzip.decompress(body))
+        _, headers, body = self.assets.respond("js/app.6a3c9e3b.js", accept_encoding="gzip;q=0")
+        self.assertNotIn("Content-Encoding", dict(headers))
+        self.assertEqual(SCRIPT.encode(), body)
+        self.assertEqual({"br", "gzip"}, accepted_encodings("br, gzip;q=0.5, identity;q=0"))
+
+    def test_matching_etag_gets_304_without_body(self):
+        etag = dict(self.assets.respond("index.html")[1])["ETag"]
+        status, headers, body = self.assets.respond("index.html", if_none_match=etag)
+        self.assertEqual((304, b""), (status, body))
+        self.assertNotIn("Content-Type", dict(headers))
+        self.assertEqual(200, self.assets.respond("index.html", if_none_match='"other"')[0])
+
+    def test_changed_file_is_rebuilt(self):
+        etag = dict(self.assets.respond("index.html")[1])["ETag"]
+        # a different size, so the change is seen whatever the mtime resolution
+        time.sleep(0.01)
+        self.write("index.html", "<html><body></body></html>")
+        status, headers, body = self.assets.respond("index.html", if_none_match=etag)
+        self.assertEqual((200, b"<html><body></body></html>"), (status, body))
+        self.assertNotEqual(etag, dict(headers)["ETag"])
+
+    def test_deleted_file_is_404(self):
+        os.remove(os.path.join(self.root, "index.html"))
+        self.assertIsNone(self.assets.respond("index.html"))
+        self.assertEqual(1, self.assets.stats()["files"])
+
+
+class TestFlaskSendAsset(unittest.TestCase):
+    def test_304_has_no_content_type(self):
+        app = load_flask_app()
+        etag = app.assets.get("index.html").etag()
+        with app.app.test_request_context("/", headers={"If-None-Match": etag}):
+            response = app.send_asset(app.assets, "index.html")
+        self.assertEqual(304, response.status_code)
+        self.assertNotIn("Content-Type", response.headers)
+        self.assertEqual(b"", response.get_data())
+
+
+if __name__ == "__main__":
+    unittest.main()
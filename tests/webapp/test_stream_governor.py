@@ -0,0 +1,86 @@
+import unittest
+
+from frame_cache import EncodeProfile
+from stream_governor import LEVELS, RAISE_AFTER, UPDATE_INTERVAL, StreamGovernor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStreamGovernor(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cpu = 50.0
+        self.governor = StreamGovernor(cpu=lambda: self.cpu, clock=self.clock)
+
+    def decide(self, send_times=()):
+        self.clock.now += UPDATE_INTERVAL
+        for seconds in send_times:
+            self.governor.report_send(seconds)
+        return self.governor.tick()
+
+    def test_decides_at_most_once_per_interval(self):
+        self.cpu = 95.0
+        self.assertTrue(self.decide())
+        self.clock.now += UPDATE_INTERVAL / 2
+        self.assertFalse(self.governor.tick())
+        self.assertEqual(1, self.governor.level)
+
+    def test_high_cpu_steps_down_to_the_last_level(self):
+        self.cpu = 95.0
+        for _ in range(len(LEVELS) + 2):
+            self.decide()
+        self.assertEqual(len(LEVELS) - 1, self.governor.level)
+        self.assertEqual(len(LEVELS) - 1, len(self.governor.history))
+        self.assertIn("cpu 95%", self.governor.settings()["reason"])
+
+    def test_slow_client_steps_down(self):
+        # 50 ms to send a frame every 33 ms
+        self.assertTrue(self.decide([0.01, 0.05]))
+        self.assertEqual(1, self.governor.level)
+        self.assertIn("clients behind", self.governor.reason)
+
+    def test_steps_up_only_after_sustained_headroom(self):
+        self.cpu = 95.0
+        self.decide()
+        self.decide()
+        self.cpu = 70.0  # between CPU_LOW and CPU_HIGH: no change either way
+        for _ in range(RAISE_AFTER + 1):
+            self.assertFalse(self.decide())
+        self.cpu = 20.0
+        for _ in range(RAISE_AFTER - 1):
+            self.assertFalse(self.decide())
+        self.assertTrue(self.decide())
+        self.assertEqual(1, self.governor.level)
+        # one busy decision starts the count again
+        self.cpu = 70.0
+        self.decide()
+        self.cpu = 20.0
+        for _ in range(RAISE_AFTER - 1):
+            self.decide()
+        self.assertEqual(1, self.governor.level)
+
+    def test_profile_follows_the_level(self):
+        self.assertEqual(EncodeProfile(None, None, LEVELS[0][1]), self.governor.profile(640, 480))
+        self.governor.level = len(LEVELS) - 1
+        # half size, rounded down to SIZE_STEP
+        self.assertEqual(EncodeProfile(320, 240, LEVELS[-1][1]), self.governor.profile(640, 480))
+        self.assertEqual(1.0 / LEVELS[-1][0], self.governor.frame_interval())
+
+    def test_settings_give_the_age_of_each_change(self):
+        self.cpu = 95.0
+        self.decide()
+        self.clock.now += 4
+        self.decide()
+        self.clock.now += 2
+        self.assertEqual(2.0, self.governor.settings()["seconds_since_change"])
+        self.assertEqual([7.0, 2.0], [change["seconds_since_change"] for change in self.governor.changes()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+import vision
+from frame_pool import FramePool
+
+
+def overlap(box, other):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    left, top = max(box[0], other[0]), max(box[1], other[1])
+    right = min(box[0] + box[2], other[0] + other[2])
+    bottom = min(box[1] + box[3], other[1] + other[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    return inter / float(box[2] * box[3] + other[2] * other[3] - inter)
+
+
+class TestScanLines(unittest.TestCase):
+    def test_scanlines_match_the_full_frame_and_outlive_the_pool(self):
+        frame = vision.synthetic_line_frame(center=200)
+        roi = vision.LineScanROI((100, 400))
+        pool = FramePool()
+        lines = vision.scan_lines(frame, 80, roi, pool)
+        expected = vision.scan_lines_full(frame, 80, (100, 400))
+        for row in (100, 400):
+            np.testing.assert_array_equal(expected[row], lines[row])
+        # the next frame goes through the same pooled buffers
+        frame[:] = 255
+        vision.scan_lines(frame, 80, roi, pool)
+        for row in (100, 400):
+            np.testing.assert_array_equal(expected[row], lines[row])
+
+
+class TestMotionDetectors(unittest.TestCase):
+    def test_lite_and_full_frame_detectors_agree_on_a_moving_block(self):
+        lite = vision.make_motion_detector("lite")
+        full = vision.make_motion_detector("full")
+        for index, frame in enumerate(vision.synthetic_motion_frames(count=20, start=5)):
+            lite_boxes = sorted(lite.detect(frame))
+            full_boxes = sorted(full.detect(frame))
+            with self.subTest(frame=index):
+                self.assertEqual(index >= 5, bool(full_boxes))
+                self.assertEqual(len(full_boxes), len(lite_boxes))
+                for lite_box, full_box in zip(lite_boxes, full_boxes):
+                    self.assertGreater(overlap(lite_box, full_box), 0.7)
+
+    def test_unknown_detector_is_refused(self):
+        self.assertIsInstance(vision.make_motion_detector("full"), vision.FullFrameMotion)
+        with self.assertRaises(ValueError):
+            vision.make_motion_detector("fast")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from tests.async_helper import wait_for
+from vision_process import VisionProcesses, Worker
+
+WATCHDOG = {"lite": True, "pixel_threshold": 12, "min_changed": 0.01, "min_area": 5000}
+
+
+class TestVisionProcesses(unittest.TestCase):
+    def setUp(self):
+        self.processes = VisionProcesses(2).start()
+        self.addCleanup(self.processes.stop)
+        self.image = np.zeros((120, 160, 3), np.uint8)
+
+    def test_frame_round_trip(self):
+        self.assertTrue(self.processes.submit(self.image, "watchDog", 10.0, 1, WATCHDOG))
+        self.assertEqual(("watchDog", 1, 10.0, []), self.processes.get(timeout=30))
+        self.assertEqual(1, self.processes.stats()["done"])
+
+    def test_submit_does_not_wait_for_a_dead_worker_to_stop(self):
+        dead = self.processes.workers[0]
+        dead.process.kill()
+        dead.process.wait()
+        stop = Worker.stop
+        stopping = threading.Event()
+
+        def slow_stop(worker):
+            stopping.set()
+            time.sleep(0.5)
+            stop(worker)
+
+        with patch.object(Worker, "stop", slow_stop):
+            checker = threading.Thread(target=self.processes.stats)
+            checker.start()
+            self.assertTrue(stopping.wait(5))
+            started = time.monotonic()
+            # the dead worker gets no frame: it goes to the live one
+            self.assertTrue(self.processes.submit(self.image, "findlineCV", 10.0, 1, {}))
+            self.assertLess(time.monotonic() - started, 0.25)
+            checker.join(5)
+        self.assertEqual(1, self.processes.restarts)
+        self.assertIsNot(dead, self.processes.workers[0])
+        wait_for(lambda: self.processes.workers[0].alive(), 5, 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
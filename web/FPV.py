@@ -16,9 +16,13 @@ import imutils
 import PID
 import Kalman_filter
 import datetime
+import time
 import move
 import numpy as np
 import RPIservo
+import vision
+from frame_pool import FramePool, buffer as pool_buffer
+from latency import FrameStamp, LatencyMonitor, draw_overlay
 
 pid = PID.PID()
 pid.SetKp(0.5)
@@ -39,6 +43,7 @@ lineColorSet = 255
 frameRender = 0
 findLineError = 20
 Threshold = 80
+line_roi = vision.LineScanROI((linePos_1, linePos_2))
 findLineMove = 1
 tracking_servo_status = 0
 FLCV_Status = 0
@@ -103,13 +108,18 @@ def findLineCtrl(posInput, setCenter):
             pass
 
 
-def cvFindLine(frame_image):
-    frame_findline = cv2.cvtColor(frame_image, cv2.COLOR_BGR2GRAY)
-    retval, frame_findline = cv2.threshold(frame_findline, Threshold, 255, cv2.THRESH_BINARY)
-    frame_findline = cv2.erode(frame_findline, None, iterations=2)
-    frame_findline = cv2.dilate(frame_findline, None, iterations=2)
-    colorPos_1 = frame_findline[linePos_1]
-    colorPos_2 = frame_findline[linePos_2]
+def cvFindLine(frame_image, pool=None):
+    if frameRender:
+        # The overlay goes on the colour frame: only the scanline bands need processing
+        line_roi.set_rows(linePos_1, linePos_2)
+        scanlines = vision.scan_lines(frame_image, Threshold, line_roi, pool)
+        frame_findline = None
+    else:
+        # The binarized frame is what gets streamed
+        frame_findline = vision.binarize(frame_image, Threshold, pool)
+        scanlines = {linePos_1: frame_findline[linePos_1], linePos_2: frame_findline[linePos_2]}
+    colorPos_1 = scanlines[linePos_1]
+    colorPos_2 = scanlines[linePos_2]
     try:
         lineColorCount_Pos1 = np.sum(colorPos_1 == lineColorSet)
         lineColorCount_Pos2 = np.sum(colorPos_2 == lineColorSet)
@@ -153,14 +163,17 @@ def cvFindLine(frame_image):
         if lineColorSet == 255:
             cv2.putText(frame_image, ('Following White Line'), (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 255, 128), 1,
                         cv2.LINE_AA)
-            cv2.putText(frame_findline, ('Following White Line'), (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 255, 128), 1,
-                        cv2.LINE_AA)
+            if frame_findline is not None:
+                cv2.putText(frame_findline, ('Following White Line'), (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 255, 128), 1,
+                            cv2.LINE_AA)
         else:
             cv2.putText(frame_image, ('Following Black Line'), (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 255, 128), 1,
                         cv2.LINE_AA)
-            cv2.putText(frame_findline, ('Following Black Line'), (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 255, 128), 1,
-                        cv2.LINE_AA)
-        frame_findline=cv2.merge((frame_findline.copy(),frame_findline.copy(),frame_findline.copy()))
+            if frame_findline is not None:
+                cv2.putText(frame_findline, ('Following Black Line'), (30, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 255, 128), 1,
+                            cv2.LINE_AA)
+        if frame_findline is not None:
+            frame_findline=cv2.merge((frame_findline,frame_findline,frame_findline))
 
         if frameRender:
             cv2.line(frame_image, (left_Pos1, (linePos_1 + 30)), (left_Pos1, (linePos_1 - 30)), (255, 128, 64), 1)
@@ -214,6 +227,7 @@ class FPV:
     def __init__(self):
         self.frame_num = 0
         self.fps = 0
+        self.latency = LatencyMonitor()  # capture to send times of the footage socket, see latency.py
         self.colorUpper = (44, 255, 255)
         self.colorLower = (24, 100, 100)
 
@@ -293,6 +307,9 @@ class FPV:
             else:
                 FPV.Y_lock = 1
 
+    def latencyOverlay(self, invar):
+        self.latency.overlay = bool(invar)
+
     def changeMode(self, textPut):
         global modeText
         modeText = textPut
@@ -308,9 +325,12 @@ class FPV:
         print(IPinver)
         footage_socket.connect('tcp://%s:5555' % IPinver)
 
-        avg = None
+        pool = FramePool()  # conversion and mask buffers reused from frame to frame
+        motion_detector = vision.make_motion_detector(pool=pool)  # MOTION_DETECTOR picks lite or full frame
         motionCounter = 0
         lastMovtionCaptured = datetime.datetime.now()
+        client = self.latency.add_client('zmq', IPinver)
+        sequence = 0
 
         with Picamera2() as camera:
             if not camera.is_open:
@@ -329,21 +349,24 @@ class FPV:
                 frame_image = camera.capture_array()
                 if frame_image is None:
                     continue
+                sequence += 1
+                stamp = FrameStamp(sequence, time.monotonic())
                 timestamp = datetime.datetime.now()
 
                 if FindLineMode:
-                    frame_findline = cvFindLine(frame_image)
+                    frame_findline = cvFindLine(frame_image, pool)
                     camera.exposure_mode = 'off'
                 else:
                     camera.exposure_mode = 'auto'
 
-                frame_image = cv2.cvtColor(frame_image, cv2.COLOR_RGB2BGR)
+                shape = frame_image.shape[:2]
+                frame_image = cv2.cvtColor(frame_image, cv2.COLOR_RGB2BGR, dst=pool_buffer(pool, 'bgr', frame_image.shape))
                 if FindColorMode:
                     ####>>>OpenCV Start<<<####
-                    mask = cv2.inRange(frame_image, colorLower, colorUpper)  # 1
-                    mask = cv2.erode(mask, None, iterations=2)
-                    mask = cv2.dilate(mask, None, iterations=2)
-                    cnts = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL,
+                    mask = cv2.inRange(frame_image, colorLower, colorUpper, dst=pool_buffer(pool, 'mask', shape))  # 1
+                    mask = cv2.erode(mask, None, dst=pool_buffer(pool, 'eroded', shape), iterations=2)
+                    mask = cv2.dilate(mask, None, dst=pool_buffer(pool, 'mask', shape), iterations=2)
+                    cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL,
                                             cv2.CHAIN_APPROX_SIMPLE)[-2]
                     center = None
                     if len(cnts) > 0:
@@ -367,37 +390,25 @@ class FPV:
                         move.motorStop()
 
                 if WatchDogMode:
-                    gray = cv2.cvtColor(frame_image, cv2.COLOR_BGR2GRAY)
-                    gray = cv2.GaussianBlur(gray, (21, 21), 0)
-
-                    if avg is None:
-                        print("[INFO] starting background model...")
-                        avg = gray.copy().astype("float")
-                        continue
-
-                    cv2.accumulateWeighted(gray, avg, 0.5)
-                    frameDelta = cv2.absdiff(gray, cv2.convertScaleAbs(avg))
-                    thresh = cv2.threshold(frameDelta, 5, 255,
-                                           cv2.THRESH_BINARY)[1]
-                    thresh = cv2.dilate(thresh, None, iterations=2)
-                    cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL,
-                                            cv2.CHAIN_APPROX_SIMPLE)
-                    cnts = imutils.grab_contours(cnts)
-                    for c in cnts:
-                        if cv2.contourArea(c) < 5000:
-                            continue
-
-                        (x, y, w, h) = cv2.boundingRect(c)
+                    for (x, y, w, h) in motion_detector.detect(frame_image):
                         cv2.rectangle(frame_image, (x, y), (x + w, y + h), (128, 255, 0), 1)
                         motionCounter += 1
                         lastMovtionCaptured = timestamp
+                if self.latency.overlay:
+                    frame_image = draw_overlay(frame_image, stamp)
+                    if FindLineMode and not frameRender:
+                        frame_findline = draw_overlay(frame_findline, stamp)
+                self.latency.record('publish', time.monotonic() - stamp.captured)
+                encoding = time.monotonic()
                 if FindLineMode and not frameRender:
                     buffer = cv2.imencode('.jpg', frame_findline)[1].tobytes()
                 else:
                     if cv2.imencode('.jpg', frame_image)[0]:
                         buffer = cv2.imencode('.jpg', frame_image)[1].tobytes()
+                self.latency.record('encode', time.monotonic() - encoding)
                 jpg_as_text = base64.b64encode(buffer)
                 footage_socket.send(jpg_as_text)
+                self.latency.sent(client, stamp)
 
                 stream.seek(0)
                 stream.truncate()
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 from importlib import import_module
 import os
-from flask import Flask, render_template, Response, send_from_directory
+import time
+from flask import Flask, render_template, Response, abort, jsonify, request
 from flask_cors import *
 # import camera driver
 
 from camera_opencv import Camera
+from frame_cache import frame_etag, parse_stream_profile
+from static_assets import CONTROLLER_DIR, DIST_DIR, StaticAssets
 import threading
 
 # Raspberry Pi camera module (requires picamera package)
@@ -14,49 +17,157 @@ import threading
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 camera = Camera()
-
-def gen(camera):
-    """Video streaming generator function."""
-    while True:
-        frame = camera.get_frame()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+SNAPSHOT_TIMEOUT = 2.0  # seconds to wait for a first frame when the camera is not running
+
+def gen(camera, profile=None, address=None):
+    """Video streaming generator function.
+
+    `profile` (a frame_cache.StreamProfile) sets the size, JPEG quality and
+    maximum frame rate of this client; clients with the same settings share
+    one resize and encode per frame. Without one the stream governor picks
+    them and the frame rate, and the time each frame takes to send is
+    reported back to it.
+    The age of each frame when sent and the frames skipped are counted in
+    camera.latency under the client `address`."""
+    encode = profile.encode if profile else None
+    interval = 1.0 / profile.max_fps if profile and profile.max_fps else 0
+    generation = 0
+    # the generator is closed when the client disconnects, which releases the viewer
+    camera.add_viewer()
+    client = camera.latency.add_client('mjpeg', address)
+    try:
+        while True:
+            started = time.monotonic()
+            generation, frame = camera.wait_jpeg(generation, encode)
+            if frame is None:
+                continue
+            sending = time.monotonic()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+            if encode is None:
+                camera.governor.report_send(time.monotonic() - sending)
+            camera.latency.sent(client, camera.frame_stamp(generation))
+            # frames published while waiting out the interval are skipped
+            pace = interval if interval or encode is not None else camera.governor.frame_interval()
+            delay = pace - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        camera.latency.remove_client(client)
+        camera.remove_viewer()
 
 @app.route('/video_feed')
 def video_feed():
-    """Video streaming route. Put this in the src attribute of an img tag."""
-    return Response(gen(camera),
+    """Video streaming route. Put this in the src attribute of an img tag.
+
+    Optional query parameters: profile=auto|full|high|medium|low, width, height,
+    quality (1-100) and fps, e.g. /video_feed?profile=low or
+    /video_feed?width=320&quality=60&fps=5."""
+    try:
+        profile = parse_stream_profile(request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    return Response(gen(camera, profile, request.remote_addr),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/snapshot.jpg')
+def snapshot():
+    """The latest camera frame as a single JPEG, without waiting for the next one.
+
+    Takes the profile, width, height and quality parameters of /video_feed.
+    The ETag names the frame and its encoding, so a poller sending it back
+    in If-None-Match gets an empty 304 until a new frame has been captured.
+    Polling keeps the camera running like an open stream does."""
+    try:
+        encode = parse_stream_profile(request.args).encode
+    except ValueError as e:
+        abort(400, str(e))
+    generation, frame = camera.event.latest()
+    if frame is None:
+        generation, frame = camera.wait_frame(generation, SNAPSHOT_TIMEOUT)
+        if frame is None:
+            abort(503, 'no camera frame available')
+    else:
+        camera.start()
+    if encode is None:
+        encode = camera.governor.profile(frame.shape[1], frame.shape[0])
+    etag = frame_etag(generation, encode)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        jpeg = camera.encode_jpeg(generation, frame, encode)
+        if jpeg is None:
+            abort(500, 'frame encoding failed')
+        response = Response(jpeg, mimetype='image/jpeg')
+    response.set_etag(etag)
+    response.headers['X-Frame-Sequence'] = str(generation)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/stream_settings')
+def stream_settings():
+    """Current stream governor settings and the latest changes with their reasons."""
+    return jsonify(current=camera.governor.settings(), history=camera.governor.changes())
+
+@app.route('/stream_latency')
+def stream_latency():
+    """Capture to publish, encode and capture to send times, and the lag and skipped frames of each client."""
+    return jsonify(camera.latency.stats())
+
+@app.route('/vision_stats')
+def vision_stats():
+    """Capture and vision frame rates and the age of the latest vision result."""
+    return jsonify(camera.vision_stats())
+
 dir_path = os.path.dirname(os.path.realpath(__file__))
+# compressed once at startup, see static_assets.py
+assets = StaticAssets(DIST_DIR)
+controller_assets = StaticAssets(CONTROLLER_DIR)
+
+def send_asset(files, filename):
+    """Serve a file of `files` in the best encoding the client accepts, or a 304 if its ETag matches."""
+    result = files.respond(filename, request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'))
+    if result is None:
+        abort(404)
+    status, headers, body = result
+    response = Response(body, status=status, headers=headers)
+    if status == 304:
+        # a 304 has no body: drop the text/html default Flask adds
+        response.headers.remove('Content-Type')
+    return response
 
 @app.route('/api/img/<path:filename>')
 def sendimg(filename):
-    return send_from_directory(dir_path+'/dist/img', filename)
+    return send_asset(assets, 'img/' + filename)
 
 @app.route('/js/<path:filename>')
 def sendjs(filename):
-    return send_from_directory(dir_path+'/dist/js', filename)
+    return send_asset(assets, 'js/' + filename)
 
 @app.route('/css/<path:filename>')
 def sendcss(filename):
-    return send_from_directory(dir_path+'/dist/css', filename)
+    return send_asset(assets, 'css/' + filename)
 
 @app.route('/api/img/icon/<path:filename>')
 def sendicon(filename):
-    return send_from_directory(dir_path+'/dist/img/icon', filename)
+    return send_asset(assets, 'img/icon/' + filename)
 
 @app.route('/fonts/<path:filename>')
 def sendfonts(filename):
-    return send_from_directory(dir_path+'/dist/fonts', filename)
+    return send_asset(assets, 'fonts/' + filename)
+
+@app.route('/controller/')
+@app.route('/controller/<path:filename>')
+def sendcontroller(filename=''):
+    return send_asset(controller_assets, filename)
 
 @app.route('/<path:filename>')
 def sendgen(filename):
-    return send_from_directory(dir_path+'/dist', filename)
+    return send_asset(assets, filename)
 
 @app.route('/')
 def index():
-    return send_from_directory(dir_path+'/dist', 'index.html')
+    return send_asset(assets, 'index.html')
 
 class webapp:
     def __init__(self):
@@ -64,11 +175,19 @@ class webapp:
 
     def modeselect(self, modeInput):
         Camera.modeSelect = modeInput
+        # computer vision modes keep the camera running without viewers
+        self.camera.start()
 
     def colorFindSet(self, H, S, V):
         camera.colorFindSet(H, S, V)
 
     def thread(self):
+        if os.environ.get('WEB_SERVER') == 'async':
+            # all clients on one event loop instead of a thread each, see async_app.py
+            import asyncio
+            import async_app
+            asyncio.run(async_app.serve(self.camera))
+            return
         app.run(host='0.0.0.0', port=5000,threaded=True)
 
     def startthread(self):
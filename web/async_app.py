@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# File name   : async_app.py
+# Description : Single event loop HTTP server for the MJPEG stream and the web UI, a drop-in for app.py
+import asyncio
+import json
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+from http import HTTPStatus
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from camera_opencv import Camera
+from frame_cache import frame_etag, parse_stream_profile
+from static_assets import CONTROLLER_DIR, DIST_DIR, StaticAssets
+
+camera = Camera()
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+SNAPSHOT_TIMEOUT = 2.0  # seconds to wait for a first frame when the camera is not running
+FRAME_TIMEOUT = 1.0  # longest wait of the frame reader thread, so it notices when viewers leave
+MAX_HEADER_SIZE = 16 * 1024
+# URL prefix -> (files, path prefix in them), most specific first, as the routes of app.py
+STATIC_ROUTES = (
+    ('/controller/', 'controller', ''),
+    ('/api/img/icon/', 'dist', 'img/icon/'),
+    ('/api/img/', 'dist', 'img/'),
+    ('/js/', 'dist', 'js/'),
+    ('/css/', 'dist', 'css/'),
+    ('/fonts/', 'dist', 'fonts/'),
+    ('/', 'dist', ''),
+)
+
+Request = namedtuple('Request', ['method', 'path', 'args', 'headers', 'version'])
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=''):
+        super(HttpError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class FrameHub(object):
+    """Newest camera frame for the viewer tasks.
+
+    One executor thread waits on the camera for all viewers and publishes each
+    frame on the event loop, so a viewer is a task awaiting the hub rather than
+    a thread blocked in the camera. The reader runs while viewers are connected.
+    """
+    def __init__(self, camera):
+        self.camera = camera
+        self.generation = 0
+        self.frame = None
+        self.viewers = 0
+        self.condition = asyncio.Condition()
+        self.task = None
+
+    def add_viewer(self):
+        self.viewers += 1
+        self.camera.add_viewer()
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.read())
+
+    def remove_viewer(self):
+        self.viewers -= 1
+        self.camera.remove_viewer()
+
+    async def wait(self, generation):
+        """Wait for a frame newer than `generation` and return the newest (generation, frame)."""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.frame is not None and self.generation != generation)
+            return self.generation, self.frame
+
+    async def read(self):
+        loop = asyncio.get_running_loop()
+        generation = self.generation
+        while self.viewers > 0:
+            latest, frame = await loop.run_in_executor(None, self.camera.wait_frame, generation, FRAME_TIMEOUT)
+            if latest == generation or frame is None:
+                continue
+            generation = latest
+            async with self.condition:
+                self.generation, self.frame = latest, frame
+                self.condition.notify_all()
+
+
+class StreamServer(object):
+    """HTTP/1.1 server for the routes of app.py: /video_feed, /snapshot.jpg,
+    /stream_settings, /stream_latency, /vision_stats, the web UI files under
+    dist/ and the controller UI under /controller/.
+
+    Every connection is a task on one event loop. JPEG encoding and file
+    reads run on the loop's default executor, whose size does not depend on
+    the number of viewers.
+    """
+    def __init__(self, camera):
+        self.camera = camera
+        self.hub = FrameHub(camera)
+        # compressed once at startup, see static_assets.py
+        self.assets = {'dist': StaticAssets(DIST_DIR), 'controller': StaticAssets(CONTROLLER_DIR)}
+        self.routes = {
+            '/video_feed': self.video_feed,
+            '/snapshot.jpg': self.snapshot,
+            '/stream_settings': self.stream_settings,
+            '/vision_stats': self.vision_stats,
+            '/stream_latency': self.stream_latency,
+        }
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one connection until it is closed."""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = await self.dispatch(request, writer)
+                except HttpError as e:
+                    await send(writer, None, e.status, e.message.encode(), 'text/plain; charset=utf-8')
+                    keep_alive = False
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, writer):
+        if request.method == 'OPTIONS':
+            await send(writer, request, 200, headers=[('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')])
+            return True
+        if request.method not in ('GET', 'HEAD'):
+            raise HttpError(405, 'method not allowed')
+        route = self.routes.get(request.path, self.static)
+        await route(request, writer)
+        return keep_alive(request)
+
+    async def video_feed(self, request, writer):
+        """Multipart JPEG stream, with the query parameters of app.video_feed."""
+        try:
+            profile = parse_stream_profile(request.args)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        encode = profile.encode
+        interval = 1.0 / profile.max_fps if profile.max_fps else 0
+        loop = asyncio.get_running_loop()
+        headers = [('Content-Type', 'multipart/x-mixed-replace; boundary=frame'), ('Cache-Control', 'no-cache')]
+        if request.method == 'HEAD':
+            # headers only: no viewer is added and the connection can serve further requests
+            writer.write(response_head(200, headers + connection_headers(request) + cors_headers(request)))
+            await writer.drain()
+            return
+        writer.write(response_head(200, headers + [('Connection', 'close')] + cors_headers(request)))
+        generation = 0
+        self.hub.add_viewer()
+        peer = writer.get_extra_info('peername')
+        client = self.camera.latency.add_client('mjpeg', peer[0] if peer else None)
+        try:
+            while True:
+                started = time.monotonic()
+                generation, frame = await self.hub.wait(generation)
+                jpeg = await loop.run_in_executor(None, self.camera.encode_jpeg, generation, frame, encode)
+                if jpeg is None:
+                    continue
+                sending = time.monotonic()
+                writer.write(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+                await writer.drain()
+                if encode is None:
+                    # only the clients of the governed stream drive it
+                    self.camera.governor.report_send(time.monotonic() - sending)
+                self.camera.latency.sent(client, self.camera.frame_stamp(generation))
+                # frames published while waiting out the interval are skipped; auto clients follow the governor
+                pace = interval if interval or encode is not None else self.camera.governor.frame_interval()
+                delay = pace - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            self.camera.latency.remove_client(client)
+            self.hub.remove_viewer()
+
+    async def snapshot(self, request, writer):
+        """The latest frame as one JPEG, with the ETag handling of app.snapshot."""
+        try:
+            encode = parse_stream_profile(request.args).encode
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        loop = asyncio.get_running_loop()
+        generation, frame = self.camera.event.latest()
+        if frame is None:
+            generation, frame = await loop.run_in_executor(None, self.camera.wait_frame, generation, SNAPSHOT_TIMEOUT)
+            if frame is None:
+                raise HttpError(503, 'no camera frame available')
+        else:
+            self.camera.start()
+        if encode is None:
+            encode = self.camera.governor.profile(frame.shape[1], frame.shape[0])
+        etag = '"%s"' % frame_etag(generation, encode)
+        headers = [('ETag', etag), ('X-Frame-Sequence', str(generation)), ('Cache-Control', 'no-cache')]
+        if etag in request.headers.get('if-none-match', ''):
+            await send(writer, request, 304, headers=headers)
+            return
+        jpeg = await loop.run_in_executor(None, self.camera.encode_jpeg, generation, frame, encode)
+        if jpeg is None:
+            raise HttpError(500, 'frame encoding failed')
+        await send(writer, request, 200, jpeg, 'image/jpeg', headers)
+
+    async def stream_settings(self, request, writer):
+        governor = self.camera.governor
+        await send_json(writer, request, {'current': governor.settings(), 'history': governor.changes()})
+
+    async def stream_latency(self, request, writer):
+        await send_json(writer, request, self.camera.latency.stats())
+
+    async def vision_stats(self, request, writer):
+        await send_json(writer, request, self.camera.vision_stats())
+
+    async def static(self, request, writer):
+        """Web UI files, precompressed and with the cache headers of app.send_asset."""
+        for prefix, files, directory in STATIC_ROUTES:
+            if request.path.startswith(prefix):
+                break
+        # uncompressed bodies are read from disk
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, self.assets[files].respond, directory + request.path[len(prefix):],
+            request.headers.get('if-none-match'), request.headers.get('accept-encoding'))
+        if result is None:
+            raise HttpError(404, 'not found')
+        status, headers, body = result
+        await send(writer, request, status, body, headers=headers)
+
+
+async def read_request(reader):
+    """Read one request head; return None when the client closed the connection between requests."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise HttpError(400, 'incomplete request')
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, 'request header too large')
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise HttpError(400, 'bad request line')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if value:
+            headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    return Request(method, unquote(url.path), dict(parse_qsl(url.query)), headers, version.strip().upper())
+
+
+def keep_alive(request):
+    """Whether the connection stays open after `request`: the HTTP/1.1 default unless the client
+    asks to close, and only on request for HTTP/1.0 clients."""
+    connection = request.headers.get('connection', '').lower()
+    if request.version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+def connection_headers(request):
+    # an HTTP/1.0 client only keeps the connection when told so
+    if request is not None and request.version == 'HTTP/1.0' and keep_alive(request):
+        return [('Connection', 'keep-alive')]
+    return []
+
+
+def cors_headers(request):
+    # as flask_cors with supports_credentials: the origin is echoed back
+    origin = request.headers.get('origin') if request else None
+    if not origin:
+        return []
+    return [('Access-Control-Allow-Origin', origin), ('Access-Control-Allow-Credentials', 'true'), ('Vary', 'Origin')]
+
+
+def response_head(status, headers):
+    lines = ['HTTP/1.1 %d %s' % (status, HTTPStatus(status).phrase)]
+    lines += ['%s: %s' % header for header in headers]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send(writer, request, status, body=b'', content_type=None, headers=()):
+    headers = list(headers) + connection_headers(request) + cors_headers(request)
+    if content_type:
+        headers.append(('Content-Type', content_type))
+    headers.append(('Content-Length', str(len(body))))
+    head = response_head(status, headers)
+    # HEAD requests and 304 responses have no body
+    if (request is not None and request.method == 'HEAD') or status == 304:
+        body = b''
+    writer.write(head + body)
+    await writer.drain()
+
+
+async def send_json(writer, request, value):
+    await send(writer, request, 200, json.dumps(value).encode(), 'application/json')
+
+
+async def serve(camera, host='0.0.0.0', port=5000):
+    server = StreamServer(camera)
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER_SIZE)
+    async with listener:
+        await listener.serve_forever()
+
+
+class webapp:
+    """Same interface as app.webapp, serving from one event loop thread."""
+    def __init__(self):
+        self.camera = camera
+
+    def modeselect(self, modeInput):
+        Camera.modeSelect = modeInput
+        # computer vision modes keep the camera running without viewers
+        self.camera.start()
+
+    def colorFindSet(self, H, S, V):
+        camera.colorFindSet(H, S, V)
+
+    def thread(self):
+        asyncio.run(serve(self.camera))
+
+    def startthread(self):
+        fps_threading = threading.Thread(target=self.thread)
+        fps_threading.daemon = False
+        fps_threading.start()
+
+
+if __name__ == "__main__":
+    WEB = webapp()
+    try:
+        WEB.startthread()
+    except:
+        print("exit")
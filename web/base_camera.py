@@ -1,105 +1,208 @@
+import os
 import time
 import threading
 import cv2
-try:
-    from greenlet import getcurrent as get_ident
-except ImportError:
-    try:
-        from thread import get_ident
-    except ImportError:
-        from _thread import get_ident
+from latency import FrameStamp, LatencyMonitor, draw_overlay
+from frame_cache import EncodedFrameCache
+from stream_governor import StreamGovernor
 
 
 class CameraEvent(object):
-    """An Event-like class that signals all active clients when a new frame is
+    """A frame broadcast that signals all active clients when a new frame is
     available.
+
+    The camera thread stores each frame together with a generation number
+    under a single condition and wakes every waiting client at once. Clients
+    remember the last generation they have seen themselves, so the camera keeps
+    no per-client state: publishing a frame costs the same for one viewer or
+    fifty, and a client that goes away leaves nothing behind to clean up.
     """
-    def __init__(self):
-        self.events = {}
-
-    def wait(self):
-        """Invoked from each client's thread to wait for the next frame."""
-        ident = get_ident()
-        if ident not in self.events:
-            # this is a new client
-            # add an entry for it in the self.events dict
-            # each entry has two elements, a threading.Event() and a timestamp
-            self.events[ident] = [threading.Event(), time.time()]
-        return self.events[ident][0].wait()
-
-    def set(self):
-        """Invoked by the camera thread when a new frame is available."""
-        now = time.time()
-        remove = None
-        for ident, event in self.events.items():
-            if not event[0].isSet():
-                # if this client's event is not set, then set it
-                # also update the last set timestamp to now
-                event[0].set()
-                event[1] = now
-            else:
-                # if the client's event is already set, it means the client
-                # did not process a previous frame
-                # if the event stays set for more than 5 seconds, then assume
-                # the client is gone and remove it
-                if now - event[1] > 5:
-                    remove = ident
-        if remove:
-            del self.events[remove]
+    def __init__(self, history=64):
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.frame = None
+        self.stamps = {}  # generation -> latency.FrameStamp of the last `history` frames
+        self.history = history
+
+    def wait(self, generation, timeout=None):
+        """Invoked from each client to wait for a frame newer than
+        `generation`. Returns the (generation, frame) pair of the newest frame,
+        which is unchanged if the timeout expires first."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation and self.frame is not None, timeout)
+            return self.generation, self.frame
+
+    def latest(self):
+        """Return the newest (generation, frame) pair without waiting."""
+        with self.condition:
+            return self.generation, self.frame
+
+    def stamp(self, generation):
+        """Return the latency.FrameStamp of a recent frame `generation`, or None."""
+        return self.stamps.get(generation)
+
+    def set(self, frame, stamp=None):
+        """Invoked by the camera thread when a new frame is available,
+        captured as told by latency.FrameStamp `stamp`."""
+        with self.condition:
+            self.frame = frame
+            self.generation += 1
+            if stamp is not None:
+                self.stamps[self.generation] = stamp
+                self.stamps.pop(self.generation - self.history, None)
+            self.condition.notify_all()
 
     def clear(self):
-        """Invoked from each client's thread after a frame was processed."""
-        self.events[get_ident()][0].clear()
+        """Invoked by the camera thread when it stops, so that no client is
+        served a stale frame after a restart."""
+        with self.condition:
+            self.frame = None
 
 
 class BaseCamera(object):
     thread = None  # background thread that reads frames from camera
+    last_thread = None  # most recently started thread, joined by its successor
     frame = None  # current frame is stored here by background thread
     last_access = 0  # time of last client access to the camera
+    viewers = 0  # number of open streams
+    idle_timeout = float(os.environ.get('CAMERA_IDLE_TIMEOUT', 10))  # seconds without viewers before capture stops
+    lock = threading.Lock()
     event = CameraEvent()
+    jpeg = EncodedFrameCache()  # JPEG encodings of the newest frame, shared by all clients
+    governor = StreamGovernor()  # frame rate and quality/size of the default stream
+    latency = LatencyMonitor()  # stage timings and per-client lag, see frame_stamp()
+    client = threading.local()  # last generation seen by each get_frame() caller
 
     def __init__(self):
         """Start the background camera thread if it isn't running yet."""
         if BaseCamera.thread is None:
-            BaseCamera.last_access = time.time()
-
-            # start background frame thread
-            BaseCamera.thread = threading.Thread(target=self._thread)
-            BaseCamera.thread.start()
+            self.start()
 
             # wait until frames are available
-            while self.get_frame() is None:
-                time.sleep(0)
+            self.wait_frame(0)
 
-    def get_frame(self):
-        """Return the current camera frame."""
-        BaseCamera.last_access = time.time()
+    def start(self):
+        """Start the background camera thread if it isn't running yet."""
+        with BaseCamera.lock:
+            BaseCamera.last_access = time.time()
+            if BaseCamera.thread is None:
+                BaseCamera.thread = threading.Thread(target=self._thread, args=(BaseCamera.last_thread,))
+                BaseCamera.last_thread = BaseCamera.thread
+                BaseCamera.thread.start()
+
+    def add_viewer(self):
+        """Register an open stream; capture runs while at least one is open."""
+        with BaseCamera.lock:
+            BaseCamera.viewers += 1
+        self.start()
+
+    def remove_viewer(self):
+        """Unregister a stream, once it is closed. Capture stops after
+        idle_timeout seconds without viewers."""
+        with BaseCamera.lock:
+            BaseCamera.viewers -= 1
+            BaseCamera.last_access = time.time()
 
-        # wait for a signal from the camera thread
-        BaseCamera.event.wait()
-        BaseCamera.event.clear()
+    @staticmethod
+    def keep_alive():
+        """Return True while capture must go on without viewers, e.g. for
+        computer vision modes. Overridden by subclasses."""
+        return False
+
+    def wait_frame(self, generation, timeout=None):
+        """Wait for a frame newer than `generation` and return the
+        (generation, frame) pair. Streaming clients keep the returned
+        generation and pass it back on their next call."""
+        self.start()
+        return BaseCamera.event.wait(generation, timeout)
+
+    def wait_jpeg(self, generation, profile=None, timeout=None):
+        """Like wait_frame(), with the frame encoded as JPEG for `profile`
+        (by default the profile chosen by the governor). The bytes are None if
+        the encoding failed."""
+        generation, frame = self.wait_frame(generation, timeout)
+        if frame is None:
+            return generation, None
+        return generation, self.encode_jpeg(generation, frame, profile)
+
+    def encode_jpeg(self, generation, frame, profile=None):
+        """Return `frame` of `generation` encoded for `profile` through the
+        shared JPEG cache, or None if the encoding failed."""
+        if profile is None:
+            profile = BaseCamera.governor.profile(frame.shape[1], frame.shape[0])
+        started = time.monotonic()
+        jpeg = BaseCamera.jpeg.get(generation, frame, profile)
+        BaseCamera.latency.record('encode', time.monotonic() - started)
+        return jpeg
+
+    def frame_stamp(self, generation):
+        """Return the capture latency.FrameStamp of frame `generation`, or
+        None once it is too old. Stream clients pass it to
+        BaseCamera.latency.sent()."""
+        return BaseCamera.event.stamp(generation)
 
-        return BaseCamera.frame
+    def get_frame(self):
+        """Return the next camera frame for the calling thread, as JPEG bytes."""
+        generation = getattr(BaseCamera.client, 'generation', 0)
+        BaseCamera.client.generation, frame = self.wait_jpeg(generation)
+        return frame
 
     @staticmethod
     def frames():
-        """"Generator that returns frames from the camera."""
+        """"Generator that returns frames from the camera as BGR images, or as
+        (image, latency.FrameStamp) pairs when it knows when each was
+        captured. Encoding is left to the shared JPEG cache."""
         raise RuntimeError('Must be implemented by subclasses.')
 
     @classmethod
-    def _thread(cls):
+    def _idle(cls):
+        """Return True, detaching the current thread, once capture is no longer needed."""
+        with BaseCamera.lock:
+            if BaseCamera.viewers > 0 or cls.keep_alive() or time.time() - BaseCamera.last_access < BaseCamera.idle_timeout:
+                return False
+            BaseCamera.thread = None
+            return True
+
+    @classmethod
+    def _thread(cls, previous=None):
         """Camera background thread."""
+        if previous is not None:
+            # let the previous run release the camera first
+            previous.join()
         print('Starting camera thread.')
         frames_iterator = cls.frames()
-        for frame in frames_iterator:
-            BaseCamera.frame = frame
-            BaseCamera.event.set()  # send signal to clients
-            time.sleep(0)
-
-            # if there hasn't been any clients asking for frames in
-            # the last 10 seconds then stop the thread
-            # if time.time() - BaseCamera.last_access > 10:
-            #     frames_iterator.close()
-            #     print('Stopping camera thread due to inactivity.')
-            #     break
-        BaseCamera.thread = None
+        started = time.monotonic()
+        sequence = 0
+        try:
+            for frame in frames_iterator:
+                if isinstance(frame, tuple):
+                    frame, stamp = frame
+                else:
+                    sequence += 1
+                    stamp = FrameStamp(sequence, time.monotonic())
+                if BaseCamera.latency.overlay:
+                    frame = draw_overlay(frame, stamp)
+                BaseCamera.frame = frame
+                BaseCamera.event.set(frame, stamp)  # send signal to clients
+                BaseCamera.latency.record('publish', time.monotonic() - stamp.captured)
+                BaseCamera.governor.tick()
+
+                # if there hasn't been any clients asking for frames in
+                # the last idle_timeout seconds then stop the thread
+                if cls._idle():
+                    print('Stopping camera thread due to inactivity.')
+                    break
+
+                # cap the capture rate at the governor's fps, except for the vision modes:
+                # they steer the robot from every frame, only the stream is slowed for them
+                if not cls.keep_alive():
+                    delay = BaseCamera.governor.frame_interval() - (time.monotonic() - started)
+                    time.sleep(max(delay, 0))
+                started = time.monotonic()
+        finally:
+            frames_iterator.close()
+            BaseCamera.frame = None
+            BaseCamera.event.clear()
+            with BaseCamera.lock:
+                if BaseCamera.thread is threading.current_thread():
+                    BaseCamera.thread = None
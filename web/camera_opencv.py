@@ -12,9 +12,13 @@ import Kalman_filter
 import PID
 import time
 import threading
-import imutils
-import libcamera
-from picamera2 import Picamera2
+import vision
+import vision_worker
+import vision_process
+import clip_recorder
+from latency import FrameStamp
+from frame_pool import FramePool
+import frame_source
 import io
 
 
@@ -32,6 +36,7 @@ CVRun = 1
 linePos_1 = 440
 linePos_2 = 380
 lineColorSet = 255
+line_roi = vision.LineScanROI((linePos_1, linePos_2))  # bands processed by findlineCV
 frameRender = 1
 findLineError = 20
 
@@ -45,6 +50,11 @@ ImgIsNone = 0
 
 colorUpper = np.array([44, 255, 255])
 colorLower = np.array([24, 100, 100])
+color_tracker = vision.ColorTracker(pool=FramePool())  # downscaled findColor with a search window around the last target
+motion_detector = vision.make_motion_detector(pool=FramePool())  # MOTION_DETECTOR=lite: watchDog on a small frame
+if not isinstance(motion_detector, vision.MotionDetector):
+    motion_detector = None  # full-frame watchDog, run by CVThread.full_motion
+recorder = None  # clip_recorder.ClipRecorder started by Camera.recordSet (CLIP_RECORD=1), triggered by watchDog
 
 def map(input, in_min,in_max,out_min,out_max):
     return (input-in_min)/(in_max-out_min)*(out_max-out_min)+out_min
@@ -78,20 +88,19 @@ class CVThread(threading.Thread):
     def __init__(self, *args, **kwargs):
         self.CVThreading = 0
         self.CVMode = 'none'
-        self.imgCV = None
+        self.mailbox = vision_worker.FrameMailbox()  # newest frame waiting for the worker
+        self.result = None  # latest VisionResult, only ever replaced as a whole
+        self.rate = vision_worker.RateMeter()  # processed frames per second
+        self.pool = FramePool()  # buffers of the worker thread
+        self.draw_pool = FramePool()  # buffers of elementDraw, which runs on the capture thread
 
         self.mov_x = None
         self.mov_y = None
         self.mov_w = None
         self.mov_h = None
 
-        self.radius = 0
-        self.box_x = None
-        self.box_y = None
         self.drawing = 0
 
-        self.findColorDetection = 0
-
         self.left_Pos1 = None
         self.right_Pos1 = None
         self.center_Pos1 = None
@@ -109,48 +118,83 @@ class CVThread(threading.Thread):
         self.servo_right_stop = 0
 
         super(CVThread, self).__init__(*args, **kwargs)
-        self.__flag = threading.Event()
-        # self.__flag = Event()
-        self.__flag.clear()
 
-        self.avg = None
+        self.full_motion = vision.FullFrameMotion(pool=self.pool)  # watchDog when motion_detector is None
         self.motionCounter = 0
         self.lastMovtionCaptured = datetime.datetime.now()
-        self.frameDelta = None
-        self.thresh = None
-        self.cnts = None
+        self.processes = None  # vision_process.VisionProcesses doing the image work, None: this thread does
 
-    def mode(self, invar, imgInput):
+    def mode(self, invar, imgInput, timestamp=None, sequence=None):
+        """Hand a frame to the worker, replacing any frame it has not started on.
+        The frame becomes read-only: overlays must be drawn on a copy. With
+        worker processes it is copied to an idle worker's ring slot instead, or dropped."""
         self.CVMode = invar
-        self.imgCV = imgInput
-        self.resume()
+        processes = self.processes
+        if processes is not None:
+            # copied into shared memory: the worker processes read it there
+            processes.submit(imgInput, invar, time.monotonic() if timestamp is None else timestamp, sequence,
+                             self.settings(invar))
+            return
+        self.mailbox.put(vision_worker.snapshot(imgInput, timestamp, sequence))
+
+    def settings(self, mode):
+        """The settings of `mode` for vision_process.Analysers, which run without this module."""
+        if mode == 'findlineCV':
+            return {'threshold': Threshold, 'rows': (linePos_1, linePos_2), 'color': lineColorSet}
+        if mode == 'findColor':
+            result = self.result
+            last = None
+            if result is not None and result.mode == 'findColor' and result.values.get('detected'):
+                last = (result.values['x'], result.values['y'], result.values['radius'])
+            return {'lower': tuple(int(value) for value in colorLower), 'upper': tuple(int(value) for value in colorUpper),
+                    'scale': color_tracker.scale, 'window': color_tracker.window, 'last': last}
+        if mode == 'watchDog':
+            detector = motion_detector
+            if detector is None:
+                return {'lite': False}
+            return {'lite': True, 'pixel_threshold': detector.pixel_threshold, 'min_changed': detector.min_changed,
+                    'min_area': detector.min_area}
+        return {}
+
+    def useProcesses(self, count):
+        """Run the image work of the vision modes in `count` worker processes, 0: on this thread.
+        Servo and motor control stays on this thread either way."""
+        previous = self.processes
+        self.processes = vision_process.VisionProcesses(count).start() if count > 0 else None
+        if previous is not None:
+            previous.stop()
 
     def elementDraw(self,imgInput):
+        # The worker publishes a new result object instead of updating attributes,
+        # so one frame is always drawn from one consistent result
+        result = self.result
+        values = result.values if result is not None and result.mode == self.CVMode else {}
+
         if self.CVMode == 'none':
             pass
 
         elif self.CVMode == 'findColor':
-            if self.findColorDetection:
+            if values.get('detected'):
                 cv2.putText(imgInput,'Target Detected',(40,60), CVThread.font, 0.5,(255,255,255),1,cv2.LINE_AA)
-                self.drawing = 1
+                drawing = 1
             else:
                 cv2.putText(imgInput,'Target Detecting',(40,60), CVThread.font, 0.5,(255,255,255),1,cv2.LINE_AA)
-                self.drawing = 0
+                drawing = 0
 
-            if self.radius > 10 and self.drawing:
-                cv2.rectangle(imgInput,(int(self.box_x-self.radius),int(self.box_y+self.radius)),(int(self.box_x+self.radius),int(self.box_y-self.radius)),(255,255,255),1)
+            if values.get('radius', 0) > 10 and drawing:
+                box_x, box_y, radius = values['x'], values['y'], values['radius']
+                cv2.rectangle(imgInput,(int(box_x-radius),int(box_y+radius)),(int(box_x+radius),int(box_y-radius)),(255,255,255),1)
 
         elif self.CVMode == 'findlineCV':
             CVThread.scGear.moveAngle(4, -30) # The camera looks down.
 
             if frameRender:
-                imgInput = cv2.cvtColor(imgInput, cv2.COLOR_BGR2GRAY)
                 '''
                 Image binarization, the method of processing functions can be searched for "threshold" in the link: http://docs.opencv.org/3.0.0/examples.html
                 '''
-                retval_bw, imgInput =  cv2.threshold(imgInput, Threshold, 255, cv2.THRESH_BINARY) # Set the threshold manually and set it to 80.
-                imgInput = cv2.erode(imgInput, None, iterations=2) #  erode
-                imgInput = cv2.dilate(imgInput, None, iterations=2) # dilate
+                # Gray, threshold (80 by default), erode and dilate into reused buffers;
+                # the merge below makes the published copy
+                imgInput = vision.binarize(imgInput, Threshold, self.draw_pool)
 
             try:
                 if lineColorSet == 255:
@@ -158,69 +202,60 @@ class CVThread(threading.Thread):
                 else:
                     cv2.putText(imgInput,('Following Black Line'),(30,50), cv2.FONT_HERSHEY_SIMPLEX, 0.5,(128,255,128),1,cv2.LINE_AA)
                 
-                imgInput=cv2.merge((imgInput.copy(),imgInput.copy(),imgInput.copy()))
-                cv2.line(imgInput,(self.left_Pos1,(linePos_1+30)),(self.left_Pos1,(linePos_1-30)),(255,128,64),2)
-                cv2.line(imgInput,(self.right_Pos1,(linePos_1+30)),(self.right_Pos1,(linePos_1-30)),(64,128,255),2)
+                imgInput=cv2.merge((imgInput,imgInput,imgInput))
+                left_Pos1, right_Pos1 = values['left_Pos1'], values['right_Pos1']
+                left_Pos2, right_Pos2 = values['left_Pos2'], values['right_Pos2']
+                center = values['center']
+                cv2.line(imgInput,(left_Pos1,(linePos_1+30)),(left_Pos1,(linePos_1-30)),(255,128,64),2)
+                cv2.line(imgInput,(right_Pos1,(linePos_1+30)),(right_Pos1,(linePos_1-30)),(64,128,255),2)
                 cv2.line(imgInput,(0,linePos_1),(640,linePos_1),(255,128,64),1)
 
-                cv2.line(imgInput,(self.left_Pos2,(linePos_2+30)),(self.left_Pos2,(linePos_2-30)),(64,128,255),2)
-                cv2.line(imgInput,(self.right_Pos2,(linePos_2+30)),(self.right_Pos2,(linePos_2-30)),(64,128,255),2)
+                cv2.line(imgInput,(left_Pos2,(linePos_2+30)),(left_Pos2,(linePos_2-30)),(64,128,255),2)
+                cv2.line(imgInput,(right_Pos2,(linePos_2+30)),(right_Pos2,(linePos_2-30)),(64,128,255),2)
                 cv2.line(imgInput,(0,linePos_2),(640,linePos_2),(64,128,255),1)
 
-                cv2.line(imgInput,((self.center-20),int((linePos_1+linePos_2)/2)),((self.center+20),int((linePos_1+linePos_2)/2)),(0,0,0),1)
-                cv2.line(imgInput,((self.center),int((linePos_1+linePos_2)/2+20)),((self.center),int((linePos_1+linePos_2)/2-20)),(0,0,0),1)
+                cv2.line(imgInput,((center-20),int((linePos_1+linePos_2)/2)),((center+20),int((linePos_1+linePos_2)/2)),(0,0,0),1)
+                cv2.line(imgInput,((center),int((linePos_1+linePos_2)/2+20)),((center),int((linePos_1+linePos_2)/2-20)),(0,0,0),1)
 
             except:
                 pass
 
         elif self.CVMode == 'watchDog':
-            if self.drawing:
-                cv2.rectangle(imgInput, (self.mov_x, self.mov_y), (self.mov_x + self.mov_w, self.mov_y + self.mov_h), (128, 255, 0), 1)
+            if values.get('drawing'):
+                (mov_x, mov_y, mov_w, mov_h) = values['box']
+                cv2.rectangle(imgInput, (mov_x, mov_y), (mov_x + mov_w, mov_y + mov_h), (128, 255, 0), 1)
 
         return imgInput
 
 
     def watchDog(self, imgInput):
+        detector = motion_detector
+        if detector is None:
+            return self.watchDogFull(imgInput)
         timestamp = datetime.datetime.now()
-        gray = cv2.cvtColor(imgInput, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
+        return self.motionFound(detector.detect(imgInput)[:1], timestamp)
 
-        if self.avg is None:
+    def watchDogFull(self, imgInput):
+        timestamp = datetime.datetime.now()
+        if self.full_motion.avg is None:
             print("[INFO] starting background model...")
-            self.avg = gray.copy().astype("float")
-            return 'background model'
-
-        cv2.accumulateWeighted(gray, self.avg, 0.5)
-        self.frameDelta = cv2.absdiff(gray, cv2.convertScaleAbs(self.avg))
-
-        # threshold the delta image, dilate the thresholded image to fill
-        # in holes, then find contours on thresholded image
-        self.thresh = cv2.threshold(self.frameDelta, 5, 255,
-            cv2.THRESH_BINARY)[1]
-        self.thresh = cv2.dilate(self.thresh, None, iterations=2)
-        self.cnts = cv2.findContours(self.thresh.copy(), cv2.RETR_EXTERNAL,
-            cv2.CHAIN_APPROX_SIMPLE)
-        self.cnts = imutils.grab_contours(self.cnts)
-        # print('x')
-        # loop over the contours
-        for c in self.cnts:
-            # if the contour is too small, ignore it
-            if cv2.contourArea(c) < 5000:
-                continue
-     
-            # compute the bounding box for the contour, draw it on the frame,
-            # and update the text
-            (self.mov_x, self.mov_y, self.mov_w, self.mov_h) = cv2.boundingRect(c)
+            self.full_motion.detect(imgInput)
+            return {'drawing': 0, 'box': None}
+        return self.motionFound(self.full_motion.detect(imgInput), timestamp)
+
+    def motionFound(self, boxes, timestamp):
+        """Count and keep the moving regions `boxes` found in a frame taken at `timestamp`."""
+        for box in boxes:
+            (self.mov_x, self.mov_y, self.mov_w, self.mov_h) = box
             self.drawing = 1
-            
             self.motionCounter += 1
-            #print(motionCounter)
-            #print(text)
             self.lastMovtionCaptured = timestamp
+            if recorder is not None:
+                recorder.trigger()
 
         if (timestamp - self.lastMovtionCaptured).seconds >= 0.5:
             self.drawing = 0
-        self.pause()
+        return {'drawing': self.drawing, 'box': (self.mov_x, self.mov_y, self.mov_w, self.mov_h)}
 
 
     # def findLineCtrl(self, posInput, setCenter):
@@ -277,57 +312,24 @@ class CVThread(threading.Thread):
 
 
     def findlineCV(self, frame_image):
-        frame_findline = cv2.cvtColor(frame_image, cv2.COLOR_BGR2GRAY)
-        retval, frame_findline =  cv2.threshold(frame_findline, Threshold, 255, cv2.THRESH_BINARY) # Set the threshold manually and set it to 80.
-        frame_findline = cv2.erode(frame_findline, None, iterations=2)
-        frame_findline = cv2.dilate(frame_findline, None, iterations=2)
-        colorPos_1 = frame_findline[linePos_1]
-        colorPos_2 = frame_findline[linePos_2]
-        
-        try:
-            lineColorCount_Pos1 = np.sum(colorPos_1 == lineColorSet)
-            lineColorCount_Pos2 = np.sum(colorPos_2 == lineColorSet)
-
-            lineIndex_Pos1 = np.where(colorPos_1 == lineColorSet)
-            lineIndex_Pos2 = np.where(colorPos_2 == lineColorSet)
-
-            # Roughly judge whether there is a color to track.
-            if lineIndex_Pos1 !=[]:
-                if abs(lineIndex_Pos1[0][-1] - lineIndex_Pos1[0][0]) > 500:
-                    print("Tracking color not found")
-                    findLineMove = 0    # No tracking color, stop moving
-                else:
-                    findLineMove = 1
-            elif lineIndex_Pos2!= []:
-                if abs(lineIndex_Pos2[0][-1] - lineIndex_Pos2[0][0]) > 500:
-                    print("Tracking color not found")
-                    findLineMove = 0
-                else:
-                    findLineMove = 1
-
-            if lineColorCount_Pos1 == 0:
-                lineColorCount_Pos1 = 1
-            if lineColorCount_Pos2 == 0:
-                lineColorCount_Pos2 = 1
-
-            self.left_Pos1 = lineIndex_Pos1[0][1] # Is [1] instead of [0], in order to remove black/white edges that may appear on the far left
-            self.right_Pos1 = lineIndex_Pos1[0][lineColorCount_Pos1-2]   # 
-
-            self.center_Pos1 = int((self.left_Pos1+self.right_Pos1)/2)
-
-            self.left_Pos2 =  lineIndex_Pos2[0][1]
-            self.right_Pos2 = lineIndex_Pos2[0][lineColorCount_Pos2-2]
-            self.center_Pos2 = int((self.left_Pos2+self.right_Pos2)/2)
-            # print("2L/C/R: %s/%s/%s" %(self.left_Pos2, self.center_Pos2, self.right_Pos2))
-
-            self.center = int((self.center_Pos1+self.center_Pos2)/2)
-        except:
-            self.center = None
-            pass
+        # Only the bands around the two scanlines are thresholded, eroded and dilated
+        scanlines = vision.scan_lines(frame_image, Threshold, line_roi, self.pool)
+        return self.lineFound(vision.find_line(scanlines[linePos_1], scanlines[linePos_2], lineColorSet))
+
+    def lineFound(self, found):
+        """Follow the line positions `found` by vision.find_line; positions it did not find keep their last value."""
+        # Roughly judge whether there is a color to track. Only reported:
+        # findlineCV never changed the findLineMove that findLineCtrl reads
+        if found.get('move') == 0:
+            print("Tracking color not found")
+        for name in ('left_Pos1', 'right_Pos1', 'center_Pos1', 'left_Pos2', 'right_Pos2', 'center_Pos2'):
+            if name in found:
+                setattr(self, name, found[name])
+        self.center = found.get('center')
 
         self.findLineCtrl(self.center)
-        self.pause()
-
+        return {'left_Pos1': self.left_Pos1, 'right_Pos1': self.right_Pos1, 'left_Pos2': self.left_Pos2,
+                'right_Pos2': self.right_Pos2, 'center': self.center}
 
     def servoMove(ID, Dir, errorInput):
         if ID == 1:
@@ -352,63 +354,119 @@ class CVThread(threading.Thread):
             print('No servoPort %d assigned.'%ID)
 
     def findColor(self, frame_image):
-        hsv = cv2.cvtColor(frame_image, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, colorLower, colorUpper)#1
-        mask = cv2.erode(mask, None, iterations=2)
-        mask = cv2.dilate(mask, None, iterations=2)
-        cnts = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL,
-            cv2.CHAIN_APPROX_SIMPLE)[-2]
-        center = None
-        if len(cnts) > 0:
-            self.findColorDetection = 1
-            c = max(cnts, key=cv2.contourArea)
-            ((self.box_x, self.box_y), self.radius) = cv2.minEnclosingCircle(c)
-            M = cv2.moments(c)
-            center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
-            X = int(self.box_x)
-            Y = int(self.box_y)
+        return self.colorFound(color_tracker.find(frame_image, colorLower, colorUpper))
+
+    def colorFound(self, target):
+        """Point the camera at `target`, (x, y, radius) from vision.ColorTracker, or None."""
+        if target is not None:
+            (box_x, box_y, radius) = target
+            X = int(box_x)
+            Y = int(box_y)
             error_Y = 240 - Y
             error_X = 320 - X
             # CVThread.servoMove(CVThread.P_servo, CVThread.P_direction, error_X)
             CVThread.servoMove(CVThread.T_servo, CVThread.T_direction, error_Y)
+            return {'detected': 1, 'x': box_x, 'y': box_y, 'radius': radius}
         else:
-            self.findColorDetection = 0
             # move.motorStop()
-        self.pause()
+            return {'detected': 0}
 
 
     def pause(self):
-        self.__flag.clear()
-
-    def resume(self):
-        self.__flag.set()
+        """Drop the frame waiting for the worker, if any."""
+        self.mailbox.clear()
+
+    def stats(self):
+        result = self.result
+        now = time.monotonic()
+        stats = {
+            'mode': self.CVMode,
+            'vision_fps': round(self.rate.rate(), 1),
+            'frames_dropped': self.mailbox.dropped,
+            'result_sequence': result.sequence if result else None,
+            'result_age': round(now - result.frame_time, 3) if result else None,
+            'processing_time': round(result.done_time - result.frame_time, 3) if result else None,
+        }
+        if motion_detector is not None:
+            stats['motion'] = motion_detector.stats()
+        if self.processes is not None:
+            stats['processes'] = self.processes.stats()
+        return stats
 
     def run(self):
         while 1:
-            self.__flag.wait()
-            if self.CVMode == 'none':
+            processes = self.processes
+            if processes is not None:
+                if processes.failed:
+                    print('Vision worker processes keep failing, analysing frames on the vision thread again')
+                    self.useProcesses(0)
+                    continue
+                self.applyFound(processes.get(timeout=0.5))
                 continue
-            
-            elif self.CVMode == 'findColor':
-                self.CVThreading = 1
-                self.findColor(self.imgCV)
-                self.CVThreading = 0
-            elif self.CVMode == 'findlineCV':
-                self.CVThreading = 1
+
+            frame = self.mailbox.get(timeout=0.5)
+            mode = self.CVMode
+            if frame is None or mode == 'none':
+                continue
+
+            self.CVThreading = 1
+            if mode == 'findColor':
+                values = self.findColor(frame.image)
+            elif mode == 'findlineCV':
                 # Camera.CVRunSet(1)
-                self.findlineCV(self.imgCV)
-                self.CVThreading = 0
-            elif self.CVMode == 'watchDog':
-                self.CVThreading = 1
-                self.watchDog(self.imgCV)
-                self.CVThreading = 0
+                values = self.findlineCV(frame.image)
+            elif mode == 'watchDog':
+                values = self.watchDog(frame.image)
             else:
-                pass
+                values = None
+            self.CVThreading = 0
+            if values is not None:
+                self.publish(mode, frame.sequence, frame.timestamp, values)
+
+    def applyFound(self, item):
+        """Act on what a worker process found, unless the mode changed or a newer frame was already acted on."""
+        if item is None:
+            return
+        mode, sequence, frame_time, found = item
+        result = self.result
+        if mode != self.CVMode:
+            return
+        if result is not None and result.mode == mode and result.sequence is not None and sequence is not None \
+                and sequence <= result.sequence:
+            return
+
+        self.CVThreading = 1
+        if mode == 'findColor':
+            values = self.colorFound(found)
+        elif mode == 'findlineCV':
+            values = self.lineFound(found)
+        else:
+            values = self.motionFound(found, datetime.datetime.now())
+        self.CVThreading = 0
+        self.publish(mode, sequence, frame_time, values)
+
+    def publish(self, mode, sequence, frame_time, values):
+        self.result = vision_worker.VisionResult(mode, sequence, frame_time, time.monotonic(), values)
+        self.rate.tick()
+        BaseCamera.latency.record('vision', self.result.done_time - frame_time)
 
 
 class Camera(BaseCamera):
-    video_source = 0
+    video_source = frame_source.FRAME_SOURCE  # frame_source.open_source() name or FrameSource
+    source = None  # FrameSource in use, opened by the first capture run and then kept
     modeSelect = 'none'
+    cvt = None
+    vision_processes = vision_process.VISION_PROCESSES  # worker processes of the vision modes, see visionProcessesSet
+    capture_rate = vision_worker.RateMeter()  # captured frames per second
+
+    def __init__(self):
+        super(Camera, self).__init__()
+        if clip_recorder.CLIP_RECORD and recorder is None:
+            self.recordSet(True)
+
+    @staticmethod
+    def keep_alive():
+        return Camera.modeSelect != 'none'
 
     def colorFindSet(self, invarH, invarS, invarV):
         global colorUpper, colorLower
@@ -434,6 +492,50 @@ class Camera(BaseCamera):
         print(colorUpper)
         print(colorLower)
 
+    def colorScaleSet(self, scale, window=vision.COLOR_WINDOW):
+        """Set the findColor processing scale (0-1] and search window in target radii (0: full frame only)."""
+        color_tracker.scale = min(max(float(scale), 0.1), 1.0)
+        color_tracker.window = max(float(window), 0)
+
+    def motionSet(self, lite=True, pixel_threshold=vision.MOTION_PIXEL_THRESHOLD,
+                  min_changed=vision.MOTION_MIN_CHANGED, min_area=vision.MOTION_MIN_AREA):
+        """Choose the downscaled watchDog (lite) or the full-frame one, and the lite detector sensitivity:
+        grey level change of a pixel, fraction of changed pixels before contours are analysed,
+        and smallest moving region in full-frame pixels."""
+        global motion_detector
+        if not lite:
+            motion_detector = None
+            return
+        if motion_detector is None:
+            motion_detector = vision.MotionDetector(pool=FramePool())
+        motion_detector.pixel_threshold = int(pixel_threshold)
+        motion_detector.min_changed = float(min_changed)
+        motion_detector.min_area = float(min_area)
+
+    def recordSet(self, enable, pre_roll=clip_recorder.CLIP_PRE_ROLL, post_roll=clip_recorder.CLIP_POST_ROLL,
+                  max_bytes=clip_recorder.CLIP_MAX_BYTES):
+        """Record a clip to clip_recorder.CLIP_DIR each time watchDog sees motion, starting
+        `pre_roll` seconds before it. The pre-roll buffer holds at most `max_bytes` of JPEG frames."""
+        global recorder
+        if recorder is not None:
+            recorder.stop()
+            recorder = None
+        if enable:
+            recorder = clip_recorder.ClipRecorder(self, pre_roll=float(pre_roll), post_roll=float(post_roll),
+                                                              max_bytes=int(max_bytes))
+            recorder.start()
+
+    def visionProcessesSet(self, count):
+        """Run the image work of the vision modes in `count` processes fed from shared memory,
+        or on the vision thread for 0. On a Pi 4 three leave a core for capture and streaming."""
+        Camera.vision_processes = max(int(count), 0)
+        if Camera.cvt is not None:
+            Camera.cvt.useProcesses(Camera.vision_processes)
+
+    def latencyOverlaySet(self, enable):
+        """Draw the capture sequence and time on the streamed frames, see latency.draw_overlay."""
+        BaseCamera.latency.overlay = bool(enable)
+
     def modeSet(self, invar):
         Camera.modeSelect = invar
 
@@ -444,10 +546,12 @@ class Camera(BaseCamera):
     def linePosSet_1(self, invar):
         global linePos_1
         linePos_1 = invar
+        line_roi.set_rows(linePos_1, linePos_2)
 
     def linePosSet_2(self, invar):
         global linePos_2
         linePos_2 = invar
+        line_roi.set_rows(linePos_1, linePos_2)
 
     def colorSet(self, invar):
         global lineColorSet
@@ -471,44 +575,54 @@ class Camera(BaseCamera):
 
     @staticmethod
     def set_video_source(source):
+        """Read frames from `source`, a frame_source.open_source() name such as
+        'synthetic' or 'video:/home/pi/run.mp4', or a FrameSource, from the
+        next start of the capture thread on."""
         Camera.video_source = source
-
-
+        Camera.source = source if isinstance(source, frame_source.FrameSource) else None
 
     @staticmethod
     def frames():
-        global ImgIsNone,hflip,vflip
-        picam2 = Picamera2() 
-        
-        preview_config = picam2.preview_configuration
-        preview_config.size = (640, 480)
-        preview_config.format = 'RGB888'  # 'XRGB8888', 'XBGR8888', 'RGB888', 'BGR888', 'YUV420'
-        # hflip = 0
-        # vflip = 0
-        preview_config.transform = libcamera.Transform(hflip=hflip, vflip=vflip)
-        preview_config.colour_space = libcamera.ColorSpace.Sycc()
-        preview_config.buffer_count = 4
-        preview_config.queue = True
-
-        if not picam2.is_open:
-            raise RuntimeError('Could not start camera.')
+        if Camera.source is None:
+            Camera.source = frame_source.open_source(Camera.video_source, hflip=hflip, vflip=vflip)
+        source = Camera.source
+        source.start()
+
+        if Camera.cvt is None:
+            # the vision worker alone never keeps the program running
+            Camera.cvt = CVThread(daemon=True)
+            Camera.cvt.useProcesses(Camera.vision_processes)
+            Camera.cvt.start()
+        cvt = Camera.cvt
 
         try:
-            picam2.start()
-        except Exception as e:
-            print(f"\033[38;5;1mError:\033[0m\n{e}")
-            print("\nPlease check whether the camera is connected well,  \
-                  and disable the \"legacy camera driver\" on raspi-config")
+            yield from Camera.capture(source, cvt)
+        finally:
+            cvt.pause()
+            source.stop()
 
-        cvt = CVThread()
-        cvt.start()
+    @staticmethod
+    def vision_stats():
+        """Capture and vision rates, measured separately, and the age of the latest vision result."""
+        stats = Camera.cvt.stats() if Camera.cvt is not None else {}
+        stats['capture_fps'] = round(Camera.capture_rate.rate(), 1)
+        if recorder is not None:
+            stats['recorder'] = recorder.stats()
+        return stats
 
+    @staticmethod
+    def capture(source, cvt):
+        global ImgIsNone
+        sequence = 0
         while True:
-            start_time = time.time()
             # read current frame
-            img = picam2.capture_array()
+            img = source.read()
+            captured = time.monotonic()
 
             if img is None:
+                if source.finished:
+                    # the end of a recording that is not looped
+                    return
                 if ImgIsNone == 0:
                     print("--------------------")
                     print("\033[31merror: Unable to read camera data.\033[0m")
@@ -521,22 +635,21 @@ class Camera(BaseCamera):
                     ImgIsNone = 1
                 continue
 
+            sequence += 1
+            Camera.capture_rate.tick()
+
             if Camera.modeSelect == 'none':
                 # switch.switch(1,0)
                 cvt.pause()
             else:
-                if cvt.CVThreading:
-                    pass
-                else:
-                    pass
-                    cvt.mode(Camera.modeSelect, img)
-                    cvt.resume()
+                # The worker gets the frame itself, read-only, and runs at its own pace:
+                # a frame it has not picked up yet is replaced by this one
+                cvt.mode(Camera.modeSelect, img, captured, sequence)
                 try:
-                    pass
-                    img = cvt.elementDraw(img)
+                    img = cvt.elementDraw(img.copy())
                 except:
                     pass
             
-            if cv2.imencode('.jpg', img)[0]:
-                yield cv2.imencode('.jpg', img)[1].tobytes()
+            # encoded once per profile by BaseCamera.jpeg, only when a client asks for it
+            yield img, FrameStamp(sequence, captured)
             
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# File name   : clip_recorder.py
+# Description : Motion triggered MJPEG/AVI clips with a pre-roll of already encoded frames
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from frame_cache import STREAM_PROFILES, EncodeProfile
+
+# Record clips from the start, as Camera.recordSet(True) does
+CLIP_RECORD = os.environ.get('CLIP_RECORD', '0') == '1'
+CLIP_DIR = os.environ.get('CLIP_DIR', os.path.join(os.path.dirname(os.path.realpath(__file__)), 'clips'))
+CLIP_PRE_ROLL = float(os.environ.get('CLIP_PRE_ROLL', 5))  # seconds kept before the trigger
+CLIP_POST_ROLL = float(os.environ.get('CLIP_POST_ROLL', 5))  # seconds recorded after the last trigger
+CLIP_MAX_SECONDS = float(os.environ.get('CLIP_MAX_SECONDS', 60))  # longest clip, a new one starts after that
+CLIP_MAX_BYTES = int(os.environ.get('CLIP_MAX_BYTES', 8 * 1024 * 1024))  # memory cap of the pre-roll buffer
+# stream profile name of a fixed clip encoding; 'auto' reuses the JPEGs of the governed stream
+CLIP_PROFILE = STREAM_PROFILES[os.environ.get('CLIP_PROFILE', 'auto')].encode
+
+AVI_KEYFRAME = 0x10
+AVIF_HASINDEX = 0x10
+# RIFF + hdrl list (avih, strl list with strh and strf) + movi list header
+AVI_HEADER_SIZE = 12 + 12 + 64 + 12 + 64 + 48 + 12
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data):
+    """Return (width, height) read from the SOF segment of JPEG `data`, or None."""
+    position = 2
+    while position + 9 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker in SOF_MARKERS:
+            height, width = struct.unpack_from('>HH', data, position + 5)
+            return width, height
+        position += 2 + struct.unpack_from('>H', data, position + 2)[0]
+    return None
+
+
+class MjpegAviWriter(object):
+    """Write JPEG frames as they are into an MJPEG AVI file.
+
+    The headers are written with placeholder counts and rewritten by close(),
+    which also appends the index. The frame rate stored in the file is the
+    average rate of the timestamps given to write(). The size in the headers
+    is the one of the first frame; each MJPEG frame carries its own size.
+    """
+    def __init__(self, path):
+        self.path = path
+        # 'xb': never overwrite another clip
+        self.file = open(path, 'xb')
+        self.file.write(b'\0' * AVI_HEADER_SIZE)
+        self.index = []
+        self.size = None
+        self.first_time = None
+        self.last_time = None
+        self.max_frame = 0
+
+    def write(self, jpeg, timestamp):
+        if self.size is None:
+            self.size = jpeg_size(jpeg) or (0, 0)
+            self.first_time = timestamp
+        self.last_time = timestamp
+        # offsets in idx1 are relative to the 'movi' fourcc
+        self.index.append((self.file.tell() - (AVI_HEADER_SIZE - 4), len(jpeg)))
+        self.file.write(b'00dc' + struct.pack('<I', len(jpeg)) + jpeg)
+        if len(jpeg) % 2:
+            self.file.write(b'\0')
+        self.max_frame = max(self.max_frame, len(jpeg))
+
+    def duration(self):
+        return self.last_time - self.first_time if self.index else 0.0
+
+    def close(self):
+        frames = len(self.index)
+        movi_size = self.file.tell() - (AVI_HEADER_SIZE - 4)
+        self.file.write(b'idx1' + struct.pack('<I', 16 * frames))
+        for offset, size in self.index:
+            self.file.write(b'00dc' + struct.pack('<III', AVI_KEYFRAME, offset, size))
+        riff_size = self.file.tell() - 8
+        usec = int(1e6 * self.duration() / (frames - 1)) if frames > 1 else 100000
+        self.file.seek(0)
+        self.file.write(self._headers(riff_size, movi_size, frames, max(usec, 1)))
+        self.file.close()
+
+    def _headers(self, riff_size, movi_size, frames, usec):
+        width, height = self.size or (0, 0)
+        avih = struct.pack('<14I', usec, self.max_frame * 1000000 // usec, 0, AVIF_HASINDEX, frames, 0, 1,
+                           self.max_frame, width, height, 0, 0, 0, 0)
+        strh = struct.pack('<4s4sIHHIIIIIIiI4H', b'vids', b'MJPG', 0, 0, 0, 0, usec, 1000000, 0, frames,
+                           self.max_frame, -1, 0, 0, 0, width, height)
+        strf = struct.pack('<IiiHH4sIiiII', 40, width, height, 1, 24, b'MJPG', width * height * 3, 0, 0, 0, 0)
+        strl = b'strl' + b'strh' + struct.pack('<I', len(strh)) + strh + b'strf' + struct.pack('<I', len(strf)) + strf
+        hdrl = b'hdrl' + b'avih' + struct.pack('<I', len(avih)) + avih + b'LIST' + struct.pack('<I', len(strl)) + strl
+        return (b'RIFF' + struct.pack('<I', riff_size) + b'AVI ' + b'LIST' + struct.pack('<I', len(hdrl)) + hdrl
+                + b'LIST' + struct.pack('<I', movi_size) + b'movi')
+
+
+class ClipRecorder(threading.Thread):
+    """Keep the last `pre_roll` seconds of streamed JPEG frames and write them to a clip on trigger().
+
+    Without a fixed `profile` the frames are the ones encoded for the auto
+    stream (camera.encode_jpeg with the governor's profile), so recording
+    costs no extra encode while that stream is watched. A clip keeps the size
+    it started with: if the governor scales the stream during a clip, the rest
+    of the clip is encoded at that size, and pre-roll frames of another size
+    are left out. Frames are timestamped with their capture time.
+    Until a trigger the frames only go to a ring buffer bounded by
+    both `pre_roll` and `max_bytes`. A trigger writes the ring buffer and then
+    the live frames to an AVI file in `directory` until `post_roll` seconds
+    after the last trigger, or until the clip is `max_seconds` long. The
+    recorder follows the camera thread and never starts it.
+    """
+    def __init__(self, camera, directory=CLIP_DIR, pre_roll=CLIP_PRE_ROLL, post_roll=CLIP_POST_ROLL,
+                 max_seconds=CLIP_MAX_SECONDS, max_bytes=CLIP_MAX_BYTES, profile=CLIP_PROFILE):
+        super(ClipRecorder, self).__init__(name='clip-recorder')
+        self.daemon = True
+        self.camera = camera
+        self.directory = directory
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.profile = profile
+        self.buffer = deque()  # (timestamp, jpeg)
+        self.buffered_bytes = 0
+        self.triggered = None  # time of the last trigger
+        self.writer = None
+        self.clips = []
+        self.running = True
+
+    def trigger(self):
+        """Start a clip, or extend the one being recorded."""
+        self.triggered = time.monotonic()
+
+    def add(self, jpeg, timestamp):
+        """Buffer or record one frame; called from the recorder thread."""
+        triggered = self.triggered
+        if self.writer is None and triggered is not None and timestamp - triggered < self.post_roll:
+            self._open(jpeg_size(jpeg))
+        if self.writer is None:
+            self.buffer.append((timestamp, jpeg))
+            self.buffered_bytes += len(jpeg)
+            while self.buffer and (self.buffered_bytes > self.max_bytes or timestamp - self.buffer[0][0] > self.pre_roll):
+                self.buffered_bytes -= len(self.buffer.popleft()[1])
+            return
+        self.writer.write(jpeg, timestamp)
+        if timestamp - self.triggered >= self.post_roll or self.writer.duration() >= self.max_seconds:
+            self._close()
+
+    def encode_profile(self, width, height):
+        """Return the EncodeProfile of the next frame, of width x height."""
+        if self.profile is not None:
+            return self.profile
+        stream = self.camera.governor.profile(width, height)
+        size = (stream.width or width, stream.height or height)
+        if self.writer is None or self.writer.size in (None, size):
+            return stream
+        return EncodeProfile(self.writer.size[0], self.writer.size[1], stream.quality)
+
+    def _open(self, size):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        now = time.time()
+        stem = time.strftime('clip-%Y%m%d-%H%M%S', time.localtime(now)) + '-%03d' % (now * 1000 % 1000)
+        attempt = 0
+        while self.writer is None:
+            name = stem + ('-%d.avi' % attempt if attempt else '.avi')
+            attempt += 1
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                continue
+            try:
+                self.writer = MjpegAviWriter(path + '.part')
+            except FileExistsError:
+                continue
+        print('Recording clip %s' % name)
+        while self.buffer:
+            timestamp, jpeg = self.buffer.popleft()
+            if jpeg_size(jpeg) == size:
+                self.writer.write(jpeg, timestamp)
+        self.buffered_bytes = 0
+
+    def _close(self):
+        writer, self.writer = self.writer, None
+        writer.close()
+        path = writer.path[:-len('.part')]
+        os.rename(writer.path, path)
+        self.clips.append(path)
+        print('Clip saved: %s (%d frames, %.1f s)' % (path, len(writer.index), writer.duration()))
+
+    def run(self):
+        generation = 0
+        try:
+            while self.running:
+                latest, frame = self.camera.event.wait(generation, timeout=0.5)
+                if latest == generation or frame is None:
+                    # the camera may have stopped: do not leave a finished clip open
+                    if self.writer is not None and time.monotonic() - self.triggered >= self.post_roll:
+                        self._close()
+                    continue
+                generation = latest
+                jpeg = self.camera.encode_jpeg(generation, frame, self.encode_profile(frame.shape[1], frame.shape[0]))
+                if jpeg is not None:
+                    stamp = self.camera.frame_stamp(generation)
+                    self.add(jpeg, stamp.captured if stamp is not None else time.monotonic())
+        finally:
+            if self.writer is not None:
+                self._close()
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+    def stats(self):
+        writer = self.writer
+        return {
+            'buffered_frames': len(self.buffer),
+            'buffered_bytes': self.buffered_bytes,
+            'recording': os.path.basename(writer.path[:-len('.part')]) if writer else None,
+            'clips': [os.path.basename(path) for path in self.clips[-10:]],
+        }
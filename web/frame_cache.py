@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# File name   : frame_cache.py
+# Description : Encode-once JPEG cache and stream profiles shared by all stream consumers
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# Output of one encoding: width/height of None keep the captured size
+EncodeProfile = namedtuple('EncodeProfile', ['width', 'height', 'quality'])
+DEFAULT_PROFILE = EncodeProfile(None, None, 95)  # cv2.IMWRITE_JPEG_QUALITY default
+
+# A /video_feed client: what it receives and how often (max_fps of None: every frame).
+# An encode profile of None follows the stream governor.
+StreamProfile = namedtuple('StreamProfile', ['encode', 'max_fps'])
+STREAM_PROFILES = {
+    'auto': StreamProfile(None, None),
+    'full': StreamProfile(DEFAULT_PROFILE, None),
+    'high': StreamProfile(EncodeProfile(None, None, 85), 30),
+    'medium': StreamProfile(EncodeProfile(480, 360, 70), 15),
+    'low': StreamProfile(EncodeProfile(320, 240, 50), 10),
+}
+# part of frame ETags: frame generations start again from 0 when the server restarts
+BOOT_ID = '%x' % int(time.time())
+SIZE_STEP = 16  # requested sizes are rounded so similar requests share one encoding
+MIN_SIZE = 64
+
+
+def parse_stream_profile(args):
+    """Build a StreamProfile from /video_feed query parameters.
+
+    `profile` selects a named profile (default 'auto', set by the stream
+    governor); `width`/`w`, `height`/`h`, `quality`/`q` and `fps` override its
+    fields. Raises ValueError on bad values.
+    """
+    name = args.get('profile', 'auto')
+    if name not in STREAM_PROFILES:
+        raise ValueError('unknown profile %r, expected one of %s' % (name, ', '.join(STREAM_PROFILES)))
+    encode, max_fps = STREAM_PROFILES[name]
+    max_fps = _int_arg(args, ('fps',), max_fps)
+    if max_fps is not None and max_fps <= 0:
+        raise ValueError('fps must be positive')
+    if not any(args.get(key) not in (None, '') for key in ('width', 'w', 'height', 'h', 'quality', 'q')):
+        return StreamProfile(encode, max_fps)
+    # explicit settings take the stream out of the governor's hands
+    encode = encode or DEFAULT_PROFILE
+    width = _int_arg(args, ('width', 'w'), encode.width)
+    height = _int_arg(args, ('height', 'h'), encode.height)
+    quality = _int_arg(args, ('quality', 'q'), encode.quality)
+    if width is not None:
+        width = max(MIN_SIZE, width // SIZE_STEP * SIZE_STEP)
+    if height is not None:
+        height = max(MIN_SIZE, height // SIZE_STEP * SIZE_STEP)
+    if not 1 <= quality <= 100:
+        raise ValueError('quality must be between 1 and 100')
+    return StreamProfile(EncodeProfile(width, height, quality), max_fps)
+
+
+def _int_arg(args, names, default):
+    for name in names:
+        if args.get(name) not in (None, ''):
+            return int(args.get(name))
+    return default
+
+
+def output_size(image, profile):
+    """Return the (width, height) `profile` asks for `image`, or None to keep its size.
+
+    A missing dimension follows the image aspect ratio and frames are never upscaled.
+    """
+    height, width = image.shape[:2]
+    if profile.width is None and profile.height is None:
+        return None
+    out_width, out_height = profile.width, profile.height
+    if out_width is None:
+        out_width = width * out_height // height
+    if out_height is None:
+        out_height = height * out_width // width
+    if out_width >= width or out_height >= height:
+        return None
+    return out_width, out_height
+
+
+def frame_etag(generation, profile):
+    """Return an ETag naming frame `generation` encoded with EncodeProfile `profile`."""
+    return '%s-%d-%s' % (BOOT_ID, generation, '-'.join(str(value or 0) for value in profile))
+
+
+def encode_jpeg(image, quality=DEFAULT_PROFILE.quality):
+    """Return the JPEG bytes of `image`, or None on failure."""
+    ok, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    if not ok:
+        return None
+    return buffer.tobytes()
+
+
+class _Result(object):
+    """One pending or finished computation; concurrent requesters wait on `ready`."""
+    def __init__(self):
+        self.ready = threading.Event()
+        self.value = None
+
+
+class EncodedFrameCache(object):
+    """JPEG encodings of the newest frame, keyed by frame generation and profile.
+
+    The first consumer asking for a (generation, profile) pair encodes it while
+    the others wait for the same bytes, so each combination is encoded exactly
+    once however many clients stream it. Downscaled images are shared the same
+    way between profiles of equal size. Entries of older generations are
+    dropped as soon as a newer frame is requested.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.entries = {}
+        self.encode_count = 0
+        self.resize_count = 0
+        self.hit_count = 0
+
+    def get(self, generation, image, profile=DEFAULT_PROFILE):
+        """Return the JPEG bytes of `image` (frame `generation`) for `profile`."""
+        return self._once(generation, profile, lambda: self._encode(generation, image, profile))
+
+    def _encode(self, generation, image, profile):
+        size = output_size(image, profile)
+        if size is not None:
+            image = self._once(generation, size, lambda: self._resize(image, size))
+        with self.lock:
+            self.encode_count += 1
+        return encode_jpeg(image, profile.quality)
+
+    def _resize(self, image, size):
+        with self.lock:
+            self.resize_count += 1
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _once(self, generation, key, compute):
+        with self.lock:
+            if generation > self.generation:
+                # a newer frame supersedes everything cached
+                self.generation = generation
+                self.entries = {}
+            entry = None
+            owner = True
+            if generation == self.generation:
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = self.entries[key] = _Result()
+                else:
+                    self.hit_count += 1
+                    owner = False
+        if entry is None:
+            # a late client asking for an older frame: serve it without caching
+            return compute()
+        if owner:
+            try:
+                entry.value = compute()
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+        return entry.value
+
+    def stats(self):
+        with self.lock:
+            return {'generation': self.generation, 'cached': len(self.entries), 'encodes': self.encode_count,
+                    'resizes': self.resize_count, 'hits': self.hit_count}
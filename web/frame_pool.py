@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# File name   : frame_pool.py
+# Description : Reusable numpy buffers for the per-frame processing stages
+from collections import OrderedDict
+
+import numpy as np
+
+POOL_SIZE = 32  # buffers kept per pool; the least recently used one is dropped beyond that
+
+
+class FramePool(object):
+    """Preallocated frame buffers keyed by stage name, shape and dtype.
+
+    Processing stages pass pool buffers as OpenCV `dst=` outputs, so a
+    steady stream of frames of one resolution allocates nothing after the
+    first frame. A buffer is overwritten the next time its stage runs:
+    results that outlive the frame must be copied. Pools are not thread
+    safe; each processing thread uses its own.
+    """
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.buffers = OrderedDict()
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.requests = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        self.requests += 1
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = np.empty(shape, dtype)
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+            if len(self.buffers) > self.size:
+                self.buffers.popitem(last=False)
+        else:
+            self.buffers.move_to_end(key)
+        return buffer
+
+    def stats(self):
+        return {'buffers': len(self.buffers), 'bytes': sum(buffer.nbytes for buffer in self.buffers.values()),
+                'allocations': self.allocations, 'allocated_bytes': self.allocated_bytes, 'requests': self.requests}
+
+
+def buffer(pool, name, shape, dtype=np.uint8):
+    """Return a pool buffer, or None (let OpenCV allocate) without a pool."""
+    if pool is None:
+        return None
+    return pool.get(name, shape, dtype)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# File name   : frame_source.py
+# Description : Camera, image file, video file and synthetic frame sources for Camera.frames
+import glob
+import math
+import os
+
+import cv2
+import numpy as np
+
+# Where Camera.frames() reads from, see open_source(): camera, synthetic[:WxH], images:<dir or glob>, video:<file>
+FRAME_SOURCE = os.environ.get('FRAME_SOURCE', 'camera')
+FRAME_SIZE = (640, 480)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource(object):
+    """Images for the capture loop of Camera.
+
+    start() is called before the first read() of a capture run and stop()
+    after its last one; a source is started again when capture restarts.
+    read() returns the next BGR image, or None if there is none this time.
+    A source that has run out of frames sets `finished`.
+    """
+    finished = False
+
+    def start(self):
+        pass
+
+    def read(self):
+        raise RuntimeError('Must be implemented by subclasses.')
+
+    def stop(self):
+        pass
+
+
+class PicameraSource(FrameSource):
+    """The Raspberry Pi camera, opened and configured once, then only started and stopped."""
+    def __init__(self, size=FRAME_SIZE, hflip=0, vflip=0):
+        self.size = size
+        self.hflip = hflip
+        self.vflip = vflip
+        self.picam2 = None
+
+    def open(self):
+        import libcamera
+        from picamera2 import Picamera2
+        picam2 = Picamera2()
+
+        preview_config = picam2.preview_configuration
+        preview_config.size = self.size
+        preview_config.format = 'RGB888'  # 'XRGB8888', 'XBGR8888', 'RGB888', 'BGR888', 'YUV420'
+        preview_config.transform = libcamera.Transform(hflip=self.hflip, vflip=self.vflip)
+        preview_config.colour_space = libcamera.ColorSpace.Sycc()
+        preview_config.buffer_count = 4
+        preview_config.queue = True
+
+        if not picam2.is_open:
+            raise RuntimeError('Could not start camera.')
+        return picam2
+
+    def start(self):
+        # Keeping the configured camera between runs makes a restart after an
+        # idle stop a plain start(), well within the 3 s first-frame budget
+        if self.picam2 is None:
+            self.picam2 = self.open()
+        try:
+            self.picam2.start()
+        except Exception as e:
+            print(f"\033[38;5;1mError:\033[0m\n{e}")
+            print("\nPlease check whether the camera is connected well,  \
+                  and disable the \"legacy camera driver\" on raspi-config")
+
+    def read(self):
+        return self.picam2.capture_array()
+
+    def stop(self):
+        self.picam2.stop()
+
+
+class ImageFileSource(FrameSource):
+    """Still images replayed in name order, decoded once and looped unless `loop` is False."""
+    def __init__(self, pattern, loop=True):
+        if os.path.isdir(pattern):
+            paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            paths = glob.glob(pattern)
+        paths = sorted(path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS))
+        self.images = [image for image in (cv2.imread(path) for path in paths) if image is not None]
+        if not self.images:
+            raise ValueError('no images in %r' % pattern)
+        self.loop = loop
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.images):
+            if not self.loop:
+                self.finished = True
+                return None
+            self.index = 0
+        image = self.images[self.index]
+        self.index += 1
+        # the capture loop may draw on the frame: keep the recording intact
+        return image.copy()
+
+
+class VideoFileSource(FrameSource):
+    """A video file decoded frame by frame with cv2.VideoCapture, looped unless `loop` is False."""
+    def __init__(self, path, loop=True):
+        if not os.path.isfile(path):
+            raise ValueError('no video file %r' % path)
+        self.path = path
+        self.loop = loop
+        self.capture = None
+
+    def start(self):
+        if self.capture is None:
+            self.capture = cv2.VideoCapture(self.path)
+
+    def read(self):
+        ok, image = self.capture.read()
+        if not ok and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.capture.read()
+        if not ok:
+            self.finished = True
+            return None
+        return image
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class SyntheticSource(FrameSource):
+    """A generated scene exercising every vision mode: a white line on a dark
+    floor in the bottom half for findlineCV, and a yellow ball circling in the
+    top half, in the default findColor range and moving for watchDog.
+
+    Frame `n` is always the same image, so runs can be compared.
+    """
+    def __init__(self, size=FRAME_SIZE, period=90):
+        self.size = size
+        self.period = period  # frames per ball revolution
+        width, height = size
+        rng = np.random.default_rng(0)
+        # a little texture, as a real floor has, so thresholds and motion see noise
+        self.floor = rng.integers(30, 50, (height, width, 3), dtype=np.uint8)
+        self.index = 0
+
+    def frame(self, index):
+        width, height = self.size
+        image = self.floor.copy()
+        phase = 2 * math.pi * index / self.period
+        line_x = int(width / 2 + width / 8 * math.sin(phase / 3))
+        cv2.line(image, (line_x - width // 16, height), (line_x + width // 16, height // 2), (230, 230, 230),
+                 max(width // 20, 2))
+        ball = (int(width / 2 + width / 4 * math.cos(phase)), int(height / 4 + height / 8 * math.sin(phase)))
+        cv2.circle(image, ball, max(width // 20, 4), (0, 255, 255), -1)
+        return image
+
+    def read(self):
+        self.index += 1
+        return self.frame(self.index)
+
+
+def open_source(spec=None, **kwargs):
+    """Return the FrameSource named by `spec` (FRAME_SOURCE by default):
+
+    camera              the Pi camera (keyword arguments go to PicameraSource); a device
+                        number, as Camera.video_source used to hold, names it too
+    synthetic[:WxH]     SyntheticSource, 640x480 by default
+    images:<dir|glob>   ImageFileSource
+    video:<file>        VideoFileSource
+    """
+    spec = FRAME_SOURCE if spec is None else spec
+    if isinstance(spec, int):
+        return PicameraSource(**kwargs)
+    kind, _, argument = spec.partition(':')
+    if kind == 'camera':
+        return PicameraSource(**kwargs)
+    if kind == 'synthetic':
+        if not argument:
+            return SyntheticSource()
+        width, _, height = argument.lower().partition('x')
+        return SyntheticSource((int(width), int(height)))
+    if kind == 'images':
+        return ImageFileSource(argument)
+    if kind == 'video':
+        return VideoFileSource(argument)
+    raise ValueError('unknown frame source %r, expected camera, synthetic[:WxH], images:<path> or video:<file>' % spec)
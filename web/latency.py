@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# File name   : latency.py
+# Description : Capture stamps, per-stage timings and per-client lag of the video stream
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+# When and in which order a frame was captured: time.monotonic() seconds and the capture loop count
+FrameStamp = namedtuple('FrameStamp', ['sequence', 'captured'])
+LATENCY_WINDOW = 300  # samples kept per stage and per client
+# draw the capture sequence and wall clock time on every streamed frame, for glass-to-glass checks
+LATENCY_OVERLAY = os.environ.get('LATENCY_OVERLAY', '0') == '1'
+
+
+def summary(samples):
+    """Return count, mean, p50, p95 and max of `samples` (seconds) in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        'count': len(ordered),
+        'mean_ms': round(1000 * sum(ordered) / len(ordered), 2),
+        'p50_ms': round(1000 * ordered[last // 2], 2),
+        'p95_ms': round(1000 * ordered[last * 95 // 100], 2),
+        'max_ms': round(1000 * ordered[last], 2),
+    }
+
+
+def draw_overlay(image, frame_stamp):
+    """Write the sequence and capture wall clock time of `frame_stamp` in the top left corner of `image`.
+
+    Filming the viewer screen next to a millisecond clock, or comparing the
+    stamp with the clock of the viewing device, gives the glass-to-glass
+    latency. Returns the image drawn on, a copy if `image` is read-only.
+    """
+    if not image.flags.writeable:
+        image = image.copy()
+    wall = time.time() - (time.monotonic() - frame_stamp.captured)
+    text = '#%d %s.%03d' % (frame_stamp.sequence, time.strftime('%H:%M:%S', time.localtime(wall)),
+                            int(wall * 1000) % 1000)
+    cv2.rectangle(image, (0, 0), (12 + 11 * len(text), 26), (0, 0, 0), -1)
+    cv2.putText(image, text, (6, 19), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+    return image
+
+
+class ClientLatency(object):
+    """Frames sent to one stream client, how old they were when sent, and the frames captured meanwhile
+    that it was not sent (frame rate cap or slow connection)."""
+    def __init__(self, kind, address=None, window=LATENCY_WINDOW):
+        self.kind = kind
+        self.address = address
+        self.connected = time.monotonic()
+        self.sent = 0
+        self.dropped = 0
+        self.sequence = None
+        self.lags = deque(maxlen=window)  # capture to end of send, seconds
+
+    def sent_frame(self, frame_stamp, now=None):
+        """Count a frame written to the client; frames captured since the previous one count as dropped."""
+        if frame_stamp is None:
+            self.sent += 1
+            return
+        if self.sequence is not None and frame_stamp.sequence > self.sequence + 1:
+            self.dropped += frame_stamp.sequence - self.sequence - 1
+        self.sequence = frame_stamp.sequence
+        self.sent += 1
+        self.lags.append((time.monotonic() if now is None else now) - frame_stamp.captured)
+
+    def stats(self):
+        stats = {'kind': self.kind, 'address': self.address, 'seconds': round(time.monotonic() - self.connected, 1),
+                 'sent': self.sent, 'dropped': self.dropped, 'lag': summary(self.lags)}
+        if self.lags:
+            stats['lag']['last_ms'] = round(1000 * self.lags[-1], 2)
+        return stats
+
+
+class LatencyMonitor(object):
+    """Timings of the streaming stages and the connected clients.
+
+    Stages are named by the code recording them: 'publish' is capture to
+    hand-over to the clients (vision overlays included), 'encode' the time a
+    client waits for its JPEG, 'send' capture to end of send and 'vision'
+    capture to vision result.
+    """
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.clients = []
+        self.overlay = LATENCY_OVERLAY
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.stages.get(stage)
+            if samples is None:
+                samples = self.stages[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def add_client(self, kind, address=None):
+        client = ClientLatency(kind, address, self.window)
+        with self.lock:
+            self.clients.append(client)
+        return client
+
+    def remove_client(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def sent(self, client, frame_stamp):
+        """Count a frame sent to `client` and record its capture to send time."""
+        now = time.monotonic()
+        client.sent_frame(frame_stamp, now)
+        if frame_stamp is not None:
+            self.record('send', now - frame_stamp.captured)
+
+    def reset(self):
+        """Forget the samples and counters recorded so far; clients stay registered."""
+        with self.lock:
+            self.stages = {}
+            for client in self.clients:
+                client.sent = client.dropped = 0
+                client.lags.clear()
+
+    def stats(self):
+        with self.lock:
+            stages = {stage: list(samples) for stage, samples in self.stages.items()}
+            clients = list(self.clients)
+        return {'overlay': self.overlay, 'stages': {stage: summary(samples) for stage, samples in stages.items()},
+                'clients': [client.stats() for client in clients]}
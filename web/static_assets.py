@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# File name   : static_assets.py
+# Description : Precompressed, content-hashed web UI files with long-lived cache headers
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+DIST_DIR = os.path.join(dir_path, 'dist')  # the web UI
+CONTROLLER_DIR = os.path.join(os.path.dirname(dir_path), 'controller_web')  # the websocket controller UI
+ASSET_CACHE_DIR = os.environ.get('ASSET_CACHE_DIR', os.path.join(dir_path, '.asset_cache'))
+MIN_COMPRESS_SIZE = 512  # smaller files are sent as they are
+# types that are not compressed already
+COMPRESSIBLE = re.compile(r'^(text/|application/(javascript|json|manifest\+json|xml)|image/(svg\+xml|x-icon|vnd\.microsoft\.icon)'
+                          r'|font/(ttf|otf)|application/(x-font-ttf|vnd\.ms-fontobject|font-sfnt))')
+EXTRA_TYPES = {'.map': 'application/json', '.webmanifest': 'application/manifest+json', '.woff2': 'font/woff2',
+               '.woff': 'font/woff', '.ttf': 'font/ttf', '.eot': 'application/vnd.ms-fontobject'}
+# file names carrying a content hash (app.6a3c9e3b.js) never change: browsers may keep them for a year
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'  # other files are revalidated with their ETag on each load
+ENCODINGS = ('br', 'gzip')  # in order of preference
+
+
+def content_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    mimetype = EXTRA_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    # as flask's send_from_directory
+    return mimetype + '; charset=utf-8' if mimetype.startswith('text/') else mimetype
+
+
+def accepted_encodings(accept_encoding):
+    """Return the content codings listed in an Accept-Encoding header, without those refused with q=0."""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def file_stat(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Asset(object):
+    """One file: its digest, cache policy and compressed forms.
+
+    The uncompressed body is read from disk on each request, the compressed
+    ones are kept in memory. `stat` is the (mtime, size) of the file they were
+    made from: StaticAssets.get() rebuilds the asset when the file changed.
+    """
+    def __init__(self, path, digest, bodies, stat):
+        self.path = path
+        self.digest = digest
+        self.stat = stat
+        self.content_type = content_type(path)
+        self.cache_control = IMMUTABLE if FINGERPRINTED.search(os.path.basename(path)) else REVALIDATE
+        self.bodies = bodies  # encoding -> bytes
+
+    def etag(self, encoding=None):
+        # each representation has its own strong ETag
+        return '"%s%s"' % (self.digest, '.' + encoding if encoding else '')
+
+    def matches(self, if_none_match):
+        return bool(if_none_match) and (if_none_match.strip() == '*' or '"%s' % self.digest in if_none_match)
+
+    def encoding(self, accept_encoding):
+        """Return the encoding to send for an Accept-Encoding header, None for the plain file."""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return None
+
+    def body(self, encoding):
+        if encoding:
+            return self.bodies[encoding]
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def headers(self, encoding):
+        headers = [('Content-Type', self.content_type), ('ETag', self.etag(encoding)),
+                   ('Cache-Control', self.cache_control)]
+        if self.bodies:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return headers
+
+
+class StaticAssets(object):
+    """The files under `root`, hashed and compressed when loaded and when they change.
+
+    Compressed forms are stored in `cache_dir` under their content digest, so
+    a restart only compresses files that changed. Brotli is used when the
+    brotli module is installed, gzip always.
+    """
+    def __init__(self, root, cache_dir=ASSET_CACHE_DIR):
+        self.root = os.path.realpath(root)  # a missing directory has no files
+        self.cache_dir = cache_dir
+        self.assets = {}
+        self.compressed = 0
+        self.load()
+
+    def load(self):
+        assets = {}
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                assets[os.path.relpath(path, self.root).replace(os.sep, '/')] = self._asset(path)
+        self.assets = assets
+
+    def _asset(self, path):
+        with open(path, 'rb') as f:
+            stat = file_stat(os.fstat(f.fileno()))
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        bodies = {}
+        if len(data) >= MIN_COMPRESS_SIZE and COMPRESSIBLE.match(content_type(path)):
+            for encoding in ENCODINGS:
+                body = self._compressed(data, digest, encoding)
+                # keep a compressed form only if it saves something
+                if body is not None and len(body) < len(data):
+                    bodies[encoding] = body
+        return Asset(path, digest, bodies, stat)
+
+    def _compressed(self, data, digest, encoding):
+        if encoding == 'br' and brotli is None:
+            return None
+        cached = os.path.join(self.cache_dir, '%s.%s' % (digest, encoding))
+        try:
+            with open(cached, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            pass
+        if encoding == 'br':
+            body = brotli.compress(data, quality=11)
+        else:
+            # mtime=0: the same input always gives the same bytes
+            body = gzip.compress(data, 9, mtime=0)
+        self.compressed += 1
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(cached + '.tmp', 'wb') as f:
+                f.write(body)
+            os.rename(cached + '.tmp', cached)
+        except (IOError, OSError):
+            pass  # read-only install: compress again next start
+        return body
+
+    def get(self, name):
+        """Return the Asset for a path relative to root, or None; a directory path names its index.html."""
+        name = name.lstrip('/')
+        if not name or name.endswith('/'):
+            name += 'index.html'
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        # the identity body is read from disk: its digest and compressed forms must follow the file
+        try:
+            if file_stat(os.stat(asset.path)) != asset.stat:
+                asset = self.assets[name] = self._asset(asset.path)
+        except (IOError, OSError):
+            # deleted since it was loaded
+            self.assets.pop(name, None)
+            return None
+        return asset
+
+    def respond(self, name, if_none_match=None, accept_encoding=None):
+        """Return (status, headers, body) for a request of `name`, or None if there is no such file."""
+        asset = self.get(name)
+        if asset is None:
+            return None
+        encoding = asset.encoding(accept_encoding)
+        headers = asset.headers(encoding)
+        if asset.matches(if_none_match):
+            # a 304 has the headers of a 200 but no body
+            return 304, [header for header in headers if header[0] != 'Content-Type'], b''
+        try:
+            body = asset.body(encoding)
+        except (IOError, OSError):
+            return None  # deleted after get()
+        return 200, headers, body
+
+    def stats(self):
+        sizes = {encoding: sum(len(asset.bodies.get(encoding, b'')) for asset in self.assets.values())
+                 for encoding in ENCODINGS}
+        return {'files': len(self.assets), 'compressed_files': sum(1 for asset in self.assets.values() if asset.bodies),
+                'gzip_bytes': sizes['gzip'], 'br_bytes': sizes['br'], 'compressed_at_load': self.compressed}
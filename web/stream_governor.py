@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# File name   : stream_governor.py
+# Description : Adaptive frame rate and JPEG quality for the video stream
+import threading
+import time
+from collections import deque
+
+import psutil
+
+from frame_cache import SIZE_STEP, EncodeProfile
+
+# Settings ladder from best to cheapest: (stream fps, JPEG quality, scale of the captured size)
+LEVELS = (
+    (30, 90, 1.0),
+    (25, 80, 1.0),
+    (20, 70, 1.0),
+    (15, 60, 0.75),
+    (10, 50, 0.75),
+    (5, 40, 0.5),
+)
+CPU_HIGH = 85.0  # percent: step down above this
+CPU_LOW = 60.0  # percent: step up only below this
+SEND_HIGH = 1.0  # client send time as a fraction of the frame interval: step down above this
+SEND_LOW = 0.5  # step up only below this
+UPDATE_INTERVAL = 1.0  # seconds between two decisions
+RAISE_AFTER = 5  # consecutive decisions with headroom before stepping up
+
+
+def cpu_busy_percent():
+    """Return a callable giving the system CPU use since its previous call, in percent.
+
+    Keeps its own cpu_times() reference so it does not disturb other
+    psutil.cpu_percent() users such as info.get_cpu_use()."""
+    state = {'last': psutil.cpu_times()}
+
+    def sample():
+        now = psutil.cpu_times()
+        last, state['last'] = state['last'], now
+        total = sum(now) - sum(last)
+        idle = (now.idle + getattr(now, 'iowait', 0)) - (last.idle + getattr(last, 'iowait', 0))
+        return 100.0 * (total - idle) / total if total > 0 else 0.0
+    return sample
+
+
+class StreamGovernor(object):
+    """Caps the frame rate and picks the JPEG quality and size of the default
+    stream. The frame rate caps capture too, unless a vision mode keeps the
+    camera running: then only the default stream clients follow it.
+
+    Every UPDATE_INTERVAL the governor looks at the CPU load and at how long
+    clients need to send a frame. It steps down the LEVELS ladder as soon as
+    either is too high, and steps back up after RAISE_AFTER quiet intervals.
+    The current settings and the reason for every change are kept in
+    settings() and changes().
+    """
+    def __init__(self, levels=LEVELS, level=0, cpu=None, clock=time.monotonic, history=50):
+        self.levels = levels
+        self.level = level
+        self.cpu = cpu or cpu_busy_percent()
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reason = 'initial settings'
+        self.changed_at = clock()
+        self.history = deque(maxlen=history)  # (changed_at, settings)
+        self.last_update = clock()
+        self.headroom = 0
+        self.send_times = []
+        self.last_cpu = 0.0
+        self.last_send = 0.0
+
+    @property
+    def fps(self):
+        return self.levels[self.level][0]
+
+    @property
+    def quality(self):
+        return self.levels[self.level][1]
+
+    @property
+    def scale(self):
+        return self.levels[self.level][2]
+
+    def frame_interval(self):
+        return 1.0 / self.fps
+
+    def profile(self, width, height):
+        """Return the EncodeProfile of the governed stream for frames of width x height."""
+        if self.scale >= 1.0:
+            return EncodeProfile(None, None, self.quality)
+        return EncodeProfile(int(width * self.scale) // SIZE_STEP * SIZE_STEP,
+                             int(height * self.scale) // SIZE_STEP * SIZE_STEP, self.quality)
+
+    def report_send(self, seconds):
+        """Invoked by stream clients with the time one frame took to send."""
+        with self.lock:
+            self.send_times.append(seconds)
+
+    def tick(self):
+        """Invoked by the camera thread once per frame; decides at most once per UPDATE_INTERVAL."""
+        now = self.clock()
+        if now - self.last_update < UPDATE_INTERVAL:
+            return False
+        self.last_update = now
+        with self.lock:
+            send_times, self.send_times = self.send_times, []
+        cpu = self.cpu()
+        # the slowest client decides: its frames queue up first
+        send = max(send_times) / self.frame_interval() if send_times else 0.0
+        self.last_cpu, self.last_send = cpu, send
+        if cpu > CPU_HIGH and self.level < len(self.levels) - 1:
+            self.headroom = 0
+            return self._change(self.level + 1, 'cpu %.0f%% above %.0f%%' % (cpu, CPU_HIGH), now)
+        if send > SEND_HIGH and self.level < len(self.levels) - 1:
+            self.headroom = 0
+            return self._change(self.level + 1, 'clients behind: send %.0f ms for a %.0f ms frame interval'
+                                % (max(send_times) * 1000, self.frame_interval() * 1000), now)
+        if cpu < CPU_LOW and send < SEND_LOW:
+            self.headroom += 1
+        else:
+            self.headroom = 0
+        if self.headroom >= RAISE_AFTER and self.level > 0:
+            self.headroom = 0
+            return self._change(self.level - 1, 'headroom: cpu %.0f%%, send %.0f%% of frame interval'
+                                % (cpu, send * 100), now)
+        return False
+
+    def _change(self, level, reason, now):
+        self.level = level
+        self.reason = reason
+        self.changed_at = now
+        self.history.append((now, self.settings()))
+        print('Stream governor: %d fps, quality %d, scale %.2f (%s)' % (self.fps, self.quality, self.scale, reason))
+        return True
+
+    def settings(self):
+        """Return the current settings and why they were chosen, ready for JSON."""
+        # the clock is monotonic: only its differences mean something to a client
+        return {
+            'fps': self.fps,
+            'quality': self.quality,
+            'scale': self.scale,
+            'level': self.level,
+            'reason': self.reason,
+            'seconds_since_change': round(self.clock() - self.changed_at, 1),
+            'cpu': round(self.last_cpu, 1),
+            'send': round(self.last_send, 3),
+        }
+
+    def changes(self):
+        """Return the settings of the last changes, oldest first, each with its own seconds_since_change."""
+        now = self.clock()
+        return [dict(settings, seconds_since_change=round(now - changed_at, 1))
+                for changed_at, settings in list(self.history)]
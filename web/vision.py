@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# File name   : vision.py
+# Description : Frame processing helpers shared by camera_opencv.py and FPV.py
+import os
+import time
+
+import cv2
+import numpy as np
+
+from frame_pool import buffer
+
+# Rows of context kept on each side of a scanline: two erosions and two
+# dilations with the default 3x3 kernel each reach one row further, so four
+# rows make the scanline exactly what full-frame processing gives
+LINE_ROI_MARGIN = 4
+
+COLOR_SCALE = 0.5  # findColor works on frames downscaled by this factor
+COLOR_WINDOW = 3.0  # search window half-size around the last target, in target radii (0: always full frame)
+COLOR_WINDOW_MIN = 48  # smallest search window half-size in pixels
+COLOR_LUT_BITS = 5  # bits kept per BGR channel by ColorLookupTable: 32768 table entries
+
+MOTION_DETECTOR = os.environ.get('MOTION_DETECTOR', 'lite')  # watchDog: 'lite' (MotionDetector) or 'full' (FullFrameMotion)
+MOTION_SIZE = (160, 120)  # MotionDetector works on frames downscaled to this size
+MOTION_PIXEL_THRESHOLD = 12  # grey level change that marks a pixel as changed
+MOTION_MIN_CHANGED = 0.01  # fraction of changed pixels before contours are analysed
+MOTION_MIN_AREA = 5000  # smallest moving region in full-frame pixels, as in watchDog
+MOTION_LEARN_SHIFT = 1  # background moves 1/2**shift of the way to each frame (1: like accumulateWeighted 0.5)
+MOTION_FRACTION_BITS = 4  # fixed point fraction bits of the integer background
+
+
+class LineScanROI(object):
+    """Row bands of the frame that line following looks at.
+
+    Only the scanlines (linePos_1, linePos_2) are read after thresholding and
+    morphology, so only a band of LINE_ROI_MARGIN rows around each of them is
+    processed. Bands are recomputed when the scanlines are moved with
+    set_rows() or the frame height changes.
+    """
+    def __init__(self, rows, margin=LINE_ROI_MARGIN):
+        self.margin = margin
+        self.rows = tuple(rows)
+        self.height = None
+        self.bands = []
+
+    def set_rows(self, *rows):
+        if rows != self.rows:
+            self.rows = tuple(rows)
+            self.height = None
+
+    def get_bands(self, height):
+        """Return [(top, bottom, [scanline rows inside])] for frames of `height` rows."""
+        if height != self.height:
+            self.height = height
+            self.bands = []
+            for row in sorted(set(self.rows)):
+                top = max(0, row - self.margin)
+                bottom = min(height, row + self.margin + 1)
+                if self.bands and top <= self.bands[-1][1]:
+                    # overlapping bands are processed once
+                    previous_top, _, inside = self.bands.pop()
+                    self.bands.append((previous_top, bottom, inside + [row]))
+                else:
+                    self.bands.append((top, bottom, [row]))
+        return self.bands
+
+
+def downscale(image, scale, pool=None):
+    """Return `image` resized by `scale` (unchanged for 1.0), averaging pixels."""
+    if scale == 1.0:
+        return image
+    size = (int(round(image.shape[1] * scale)), int(round(image.shape[0] * scale)))
+    dst = buffer(pool, 'downscale', (size[1], size[0]) + image.shape[2:])
+    return cv2.resize(image, size, dst=dst, interpolation=cv2.INTER_AREA)
+
+
+def binarize(image, threshold, pool=None):
+    """Grayscale, threshold, erode and dilate `image` like the line following modes do.
+    With a FramePool every stage writes into a reused buffer."""
+    shape = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=buffer(pool, 'gray', shape))
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY, dst=buffer(pool, 'binary', shape))
+    eroded = cv2.erode(binary, None, dst=buffer(pool, 'eroded', shape), iterations=2)
+    return cv2.dilate(eroded, None, dst=buffer(pool, 'binary', shape), iterations=2)
+
+
+def scan_lines(image, threshold, roi, pool=None):
+    """Return {row: binarized scanline} for the scanlines of `roi`, processing only their bands."""
+    lines = {}
+    for top, bottom, rows in roi.get_bands(image.shape[0]):
+        band = binarize(image[top:bottom], threshold, pool)
+        for row in rows:
+            # copied: the next band is binarized into the same pool buffer
+            lines[row] = band[row - top].copy()
+    return lines
+
+
+def scan_lines_full(image, threshold, rows):
+    """Reference implementation of scan_lines(): binarize the whole frame and read the rows."""
+    binary = binarize(image, threshold)
+    return {row: binary[row] for row in rows}
+
+
+def find_line(line_1, line_2, color=255):
+    """Locate the line in two binarized scanlines as findlineCV does.
+
+    Returns what findlineCV updates: 'move' (0 when the first scanline is
+    covered edge to edge, which findlineCV reports as no line), the left, right and
+    centre positions of each scanline and the overall 'center'. Keys are
+    missing from the first scanline without enough line pixels on.
+    """
+    found = {}
+    try:
+        count_1 = max(int(np.count_nonzero(line_1 == color)), 1)
+        count_2 = max(int(np.count_nonzero(line_2 == color)), 1)
+        index_1 = np.flatnonzero(line_1 == color)
+        index_2 = np.flatnonzero(line_2 == color)
+        found['move'] = 0 if abs(index_1[-1] - index_1[0]) > 500 else 1
+        # [1] and [count - 2] leave out the black/white edges that may appear at the ends
+        found['left_Pos1'] = int(index_1[1])
+        found['right_Pos1'] = int(index_1[count_1 - 2])
+        found['center_Pos1'] = int((found['left_Pos1'] + found['right_Pos1']) / 2)
+        found['left_Pos2'] = int(index_2[1])
+        found['right_Pos2'] = int(index_2[count_2 - 2])
+        found['center_Pos2'] = int((found['left_Pos2'] + found['right_Pos2']) / 2)
+        found['center'] = int((found['center_Pos1'] + found['center_Pos2']) / 2)
+    except IndexError:
+        pass
+    return found
+
+
+class ColorLookupTable(object):
+    """Quantised BGR to mask table for one pair of HSV bounds.
+
+    Every BGR colour is reduced to `bits` bits per channel, and the table
+    holds the inRange() result of each quantised cell centre, so masking a
+    frame is one table lookup per pixel instead of an HSV conversion and a
+    range test. The table is rebuilt only when the bounds change. Colours
+    within one quantisation step of a bound can land on the other side of it.
+
+    Not used by the tracker: on the CPUs measured so far the HSV conversion is
+    faster. scripts/bench_color_lut.py compares the two.
+    """
+    def __init__(self, bits=COLOR_LUT_BITS):
+        self.bits = bits
+        self.shift = 8 - bits
+        self.dtype = np.uint16 if 3 * bits <= 16 else np.uint32
+        self.bounds = None
+        self.table = None
+        self.rebuild_count = 0
+
+    def update(self, lower, upper):
+        """Rebuild the table if the HSV bounds differ from the ones it was built for."""
+        bounds = (tuple(int(value) for value in lower), tuple(int(value) for value in upper))
+        if bounds == self.bounds:
+            return False
+        values = (np.arange(1 << self.bits, dtype=np.uint16) << self.shift) + ((1 << self.shift) >> 1)
+        blue, green, red = np.meshgrid(values, values, values, indexing='ij')
+        cells = np.stack([blue, green, red], axis=-1).astype(np.uint8).reshape(-1, 1, 3)
+        hsv = cv2.cvtColor(cells, cv2.COLOR_BGR2HSV)
+        self.table = cv2.inRange(hsv, np.array(bounds[0]), np.array(bounds[1])).reshape(-1)
+        self.bounds = bounds
+        self.rebuild_count += 1
+        return True
+
+    def mask(self, image, lower, upper, pool=None):
+        """Return the 0/255 mask of the pixels of the BGR `image` within the HSV bounds."""
+        self.update(lower, upper)
+        shape = image.shape[:2]
+        quantised = np.right_shift(image, self.shift, out=buffer(pool, 'quantised', image.shape))
+        index = buffer(pool, 'lut_index', shape, self.dtype)
+        if index is None:
+            index = np.empty(shape, self.dtype)
+        index[...] = quantised[..., 0]
+        index <<= self.bits
+        index |= quantised[..., 1]
+        index <<= self.bits
+        index |= quantised[..., 2]
+        return self.table.take(index, out=buffer(pool, 'mask', shape))
+
+
+def color_mask(image, lower, upper, pool=None):
+    """Return the mask of the pixels of `image` within the HSV bounds."""
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=buffer(pool, 'hsv', image.shape))
+    return cv2.inRange(hsv, lower, upper, dst=buffer(pool, 'mask', image.shape[:2]))
+
+
+def find_color_blob(image, lower, upper, pool=None):
+    """Return ((x, y), radius) of the largest blob of `image` within the HSV bounds, or None."""
+    mask = color_mask(image, lower, upper, pool)
+    eroded = cv2.erode(mask, None, dst=buffer(pool, 'eroded', mask.shape), iterations=2)
+    mask = cv2.dilate(eroded, None, dst=buffer(pool, 'mask', mask.shape), iterations=2)
+    cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    if len(cnts) == 0:
+        return None
+    return cv2.minEnclosingCircle(max(cnts, key=cv2.contourArea))
+
+
+class ColorTracker(object):
+    """Colour target detection on a downscaled frame, searching near the last
+    target first.
+
+    find() returns (x, y, radius) in full-frame coordinates. While a target is
+    tracked only a window of COLOR_WINDOW radii around it is searched; when the
+    target is lost there, or touches the window edge, the whole frame is
+    searched again.
+    """
+    def __init__(self, scale=COLOR_SCALE, window=COLOR_WINDOW, min_window=COLOR_WINDOW_MIN, pool=None):
+        self.scale = scale
+        self.pool = pool
+        self.window = window
+        self.min_window = min_window
+        self.last = None
+        self.window_hits = 0
+        self.full_searches = 0
+
+    def find(self, image, lower, upper):
+        target = None
+        if self.last is not None and self.window > 0:
+            target = self._find_in_window(image, lower, upper)
+            if target is not None:
+                self.window_hits += 1
+        if target is None:
+            self.full_searches += 1
+            target = self._find_in(image, 0, 0, lower, upper)
+        self.last = target
+        return target
+
+    def _find_in_window(self, image, lower, upper):
+        x, y, radius = self.last
+        # rounded so that pooled buffers are reused while the target size changes a little
+        half = max(self.min_window, int(self.window * radius) // 16 * 16)
+        height, width = image.shape[:2]
+        left, top = int(max(0, x - half)), int(max(0, y - half))
+        right, bottom = int(min(width, x + half)), int(min(height, y + half))
+        if right - left < 2 or bottom - top < 2:
+            return None
+        target = self._find_in(image[top:bottom, left:right], left, top, lower, upper)
+        if target is None:
+            return None
+        x, y, radius = target
+        inside = (x - radius > left or left == 0) and (x + radius < right or right == width) and \
+                 (y - radius > top or top == 0) and (y + radius < bottom or bottom == height)
+        return target if inside else None
+
+    def _find_in(self, image, left, top, lower, upper):
+        """Detect in `image`, a crop at (left, top) of the frame, and map the result back to the frame."""
+        image = downscale(image, self.scale, self.pool)
+        blob = find_color_blob(image, lower, upper, self.pool)
+        if blob is None:
+            return None
+        (x, y), radius = blob
+        return left + x / self.scale, top + y / self.scale, radius / self.scale
+
+
+class MotionDetector(object):
+    """Motion detection on a small greyscale frame against an integer running background.
+
+    The frame is shrunk to MOTION_SIZE, which also smooths it, and compared
+    with a fixed point int16 background that follows each frame by a power of
+    two fraction. Contours are only extracted when the number of changed
+    pixels crosses min_changed, so a still scene costs a resize, a
+    subtraction and a pixel count. Boxes are returned in full-frame
+    coordinates. CPU time spent per frame is kept in stats().
+    """
+    def __init__(self, size=MOTION_SIZE, pixel_threshold=MOTION_PIXEL_THRESHOLD, min_changed=MOTION_MIN_CHANGED,
+                 min_area=MOTION_MIN_AREA, learn_shift=MOTION_LEARN_SHIFT, pool=None):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.min_area = min_area
+        self.learn_shift = learn_shift
+        self.pool = pool
+        self.background = None
+        self.frames = 0
+        self.analysed = 0
+        self.cpu_time = 0.0
+        self.last_cpu_time = 0.0
+        self.changed = 0
+
+    def reset(self):
+        self.background = None
+
+    def detect(self, image):
+        """Return the bounding boxes (x, y, w, h) of moving regions in `image`, largest first."""
+        start = time.thread_time()
+        boxes = self._detect(image)
+        self.last_cpu_time = time.thread_time() - start
+        self.cpu_time += self.last_cpu_time
+        self.frames += 1
+        return boxes
+
+    def _detect(self, image):
+        width, height = self.size
+        shape = (height, width)
+        small = cv2.resize(image, self.size, dst=buffer(self.pool, 'motion_small', shape + image.shape[2:]),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=buffer(self.pool, 'motion_gray', shape))
+        if self.background is None:
+            self.background = gray.astype(np.int16) << MOTION_FRACTION_BITS
+            self.changed = 0
+            return []
+
+        # |frame - background| in whole grey levels
+        current = buffer(self.pool, 'motion_current', shape, np.int16)
+        if current is None:
+            current = np.empty(shape, np.int16)
+        np.left_shift(gray, MOTION_FRACTION_BITS, out=current, dtype=np.int16)
+        difference = buffer(self.pool, 'motion_difference', shape, np.int16)
+        if difference is None:
+            difference = np.empty(shape, np.int16)
+        np.subtract(current, self.background, out=difference)
+        # the background moves towards the frame by difference >> learn_shift
+        self.background += difference >> self.learn_shift
+        np.abs(difference, out=difference)
+        changed = buffer(self.pool, 'motion_changed', shape)
+        if changed is None:
+            changed = np.empty(shape, np.uint8)
+        np.greater(difference, self.pixel_threshold << MOTION_FRACTION_BITS, out=changed.view(bool))
+        self.changed = cv2.countNonZero(changed)
+        if self.changed < self.min_changed * width * height:
+            return []
+
+        self.analysed += 1
+        mask = cv2.dilate(changed, None, dst=buffer(self.pool, 'motion_mask', shape), iterations=2)
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        scale_x = image.shape[1] / float(width)
+        scale_y = image.shape[0] / float(height)
+        min_area = self.min_area / (scale_x * scale_y)
+        boxes = []
+        for c in cnts:
+            if cv2.contourArea(c) < min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(c)
+            boxes.append((int(x * scale_x), int(y * scale_y), int(w * scale_x), int(h * scale_y)))
+        boxes.sort(key=lambda box: box[2] * box[3], reverse=True)
+        return boxes
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'analysed': self.analysed,
+            'changed_pixels': self.changed,
+            'cpu_ms_per_frame': round(1000 * self.cpu_time / self.frames, 3) if self.frames else 0.0,
+            'last_cpu_ms': round(1000 * self.last_cpu_time, 3),
+        }
+
+
+class FullFrameMotion(object):
+    """The full-frame watchDog: a blurred greyscale frame against an
+    accumulateWeighted running average, for when MotionDetector is off.
+
+    detect() returns the boxes (x, y, w, h) of changed regions of at least
+    `min_area` pixels, in contour order; the first frame only starts the
+    background model.
+    """
+    def __init__(self, min_area=MOTION_MIN_AREA, pool=None):
+        self.min_area = min_area
+        self.pool = pool
+        self.avg = None
+
+    def reset(self):
+        self.avg = None
+
+    def detect(self, image):
+        shape = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=buffer(self.pool, 'gray', shape))
+        gray = cv2.GaussianBlur(gray, (21, 21), 0, dst=buffer(self.pool, 'blur', shape))
+        if self.avg is None:
+            self.avg = gray.astype("float")
+            return []
+
+        cv2.accumulateWeighted(gray, self.avg, 0.5)
+        average = cv2.convertScaleAbs(self.avg, dst=buffer(self.pool, 'average', shape))
+        delta = cv2.absdiff(gray, average, dst=buffer(self.pool, 'delta', shape))
+        # threshold the delta image, dilate the thresholded image to fill
+        # in holes, then find contours on thresholded image
+        thresh = cv2.threshold(delta, 5, 255, cv2.THRESH_BINARY, dst=buffer(self.pool, 'thresh', shape))[1]
+        thresh = cv2.dilate(thresh, None, dst=buffer(self.pool, 'dilated', shape), iterations=2)
+        # findContours leaves its input unchanged since OpenCV 3.2
+        cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        return [cv2.boundingRect(c) for c in cnts if cv2.contourArea(c) >= self.min_area]
+
+
+def make_motion_detector(kind=MOTION_DETECTOR, pool=None):
+    """Return the watchDog detector named by `kind`: 'lite' for MotionDetector, 'full' for FullFrameMotion."""
+    if kind == 'lite':
+        return MotionDetector(pool=pool)
+    if kind == 'full':
+        return FullFrameMotion(pool=pool)
+    raise ValueError("unknown motion detector %r, expected 'lite' or 'full'" % (kind,))
+
+
+def synthetic_line_frame(width=640, height=480, center=320, line_width=80, seed=0):
+    """Return a noisy dark floor with a bright vertical line, for benchmarks."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(30, 100, size=(height, width, 3), dtype=np.uint8)
+    frame[:, center - line_width // 2:center + line_width // 2] = rng.integers(
+        180, 250, size=(height, line_width, 3), dtype=np.uint8)
+    return frame
+
+
+def synthetic_target_frame(x, y, radius=40, width=640, height=480, color=(0, 220, 220), seed=0):
+    """Return a noisy grey scene with a filled coloured disc at (x, y), for benchmarks."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 140, size=(height, width, 3), dtype=np.uint8)
+    cv2.circle(frame, (int(x), int(y)), radius, color, -1)
+    return frame
+
+
+def synthetic_motion_frames(count=20, width=640, height=480, start=5, seed=0):
+    """Return `count` noisy frames of a still scene where a bright block starts moving at frame `start`."""
+    rng = np.random.default_rng(seed)
+    scene = rng.integers(40, 120, size=(height, width, 3), dtype=np.uint8)
+    frames = []
+    for index in range(count):
+        frame = scene + rng.integers(0, 4, size=scene.shape, dtype=np.uint8)
+        if index >= start:
+            x = 40 + 20 * (index - start) % (width - 200)
+            cv2.rectangle(frame, (x, height // 3), (x + 120, height // 3 + 120), (220, 220, 220), -1)
+        frames.append(frame)
+    return frames
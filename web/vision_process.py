@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# File name   : vision_process.py
+# Description : Vision workers in their own processes, reading frames from a shared memory ring
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import Pipe, resource_tracker
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+
+import vision
+from frame_pool import FramePool
+
+# Worker processes for the vision modes; 0 runs them on the CVThread of the streaming process
+VISION_PROCESSES = int(os.environ.get('VISION_PROCESSES', '0'))
+# Modes whose frames must all go, in order, to the same worker: the motion background follows the frames
+ORDERED_MODES = ('watchDog',)
+# Worker restarts after which VisionProcesses.failed asks for the vision thread to take over
+MAX_RESTARTS = 3
+
+
+class FrameRing(object):
+    """Frames of one shape in shared memory, one slot per worker process.
+
+    The streaming process creates the ring and copies each frame it hands
+    out into a slot once; workers attach to it by name and analyse the slot
+    in place, read-only. A slot is only written again after its worker
+    returned the result.
+
+    That one copy stays: picamera2 and the other frame sources return a new
+    array per frame, which the streaming clients keep encoding after the
+    workers are done, so capture cannot write into a slot that is reused.
+    A 640x480 frame is about 0.9 MB, a fraction of a millisecond to copy.
+    """
+    def __init__(self, slots, shape, name=None):
+        self.owner = name is None
+        size = slots * int(np.prod(shape))
+        self.memory = SharedMemory(create=True, size=size) if self.owner else SharedMemory(name=name)
+        self.name = self.memory.name
+        self.shape = tuple(shape)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, buffer=self.memory.buf)
+        if not self.owner:
+            self.frames.flags.writeable = False
+
+    def write(self, slot, image):
+        self.frames[slot] = image
+
+    def frame(self, slot):
+        return self.frames[slot]
+
+    def close(self):
+        # the array must go before the memory it points into
+        self.frames = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class Analysers(object):
+    """The vision algorithms of one worker process, without the servo and
+    motor control that camera_opencv.CVThread applies to their results.
+
+    Settings come with every frame from CVThread.settings(); the state that
+    follows the frames (colour target window, motion background) stays here.
+    """
+    def __init__(self):
+        self.pool = FramePool()
+        self.line_roi = vision.LineScanROI(())
+        self.color_tracker = vision.ColorTracker(pool=FramePool())
+        self.motion_detector = vision.MotionDetector(pool=FramePool())
+        self.full_motion = vision.FullFrameMotion(pool=FramePool())
+
+    def run(self, image, mode, settings):
+        """Return the compact result of `mode` for `image`: a vision.find_line dict, a colour target
+        (x, y, radius) or None, or a list of motion boxes."""
+        if mode == 'findlineCV':
+            rows = settings['rows']
+            self.line_roi.set_rows(*rows)
+            scanlines = vision.scan_lines(image, settings['threshold'], self.line_roi, self.pool)
+            return vision.find_line(scanlines[rows[0]], scanlines[rows[1]], settings['color'])
+        if mode == 'findColor':
+            tracker = self.color_tracker
+            tracker.scale = settings['scale']
+            tracker.window = settings['window']
+            # frames are shared between workers: search around the newest target any of them found
+            tracker.last = settings['last']
+            return tracker.find(image, np.array(settings['lower']), np.array(settings['upper']))
+        if mode == 'watchDog':
+            if not settings['lite']:
+                return self.full_motion.detect(image)
+            detector = self.motion_detector
+            detector.pixel_threshold = settings['pixel_threshold']
+            detector.min_changed = settings['min_changed']
+            detector.min_area = settings['min_area']
+            return detector.detect(image)[:1]
+        return None
+
+
+def work(connection, index):
+    """Body of worker process `index`: analyse ring slot `index` for each task read from `connection`
+    and send back (found, cpu seconds, error), until None arrives or the streaming process goes away."""
+    # one process per core: OpenCV threads inside each would only compete with the other workers
+    cv2.setNumThreads(1)
+    analysers = Analysers()
+    ring = None
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        name, slots, shape, mode, settings = task
+        if ring is None or ring.name != name:
+            if ring is not None:
+                ring.close()
+            ring = FrameRing(slots, shape, name)
+            # the streaming process owns the ring: this process' resource tracker must not remove it
+            resource_tracker.unregister(ring.memory._name, 'shared_memory')
+        start = time.thread_time()
+        try:
+            found, error = analysers.run(ring.frame(index), mode, settings), None
+        except Exception as e:
+            # reported rather than fatal: the streaming process must get an answer for every frame
+            found, error = None, '%s: %s' % (type(e).__name__, e)
+        connection.send((found, time.thread_time() - start, error))
+    if ring is not None:
+        ring.close()
+
+
+class Worker(object):
+    """One worker process, started as a fresh interpreter running this file, and the pipe to it.
+
+    A forked worker would inherit the locks of the camera, vision, Flask and
+    i2c threads, and a spawned multiprocessing worker would import the main
+    script again, which starts servos and lights: running this file imports
+    only the vision modules.
+    """
+    def __init__(self, index):
+        self.index = index
+        self.connection, child = Pipe()
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(child.fileno()), str(index)],
+                                        pass_fds=(child.fileno(),))
+        child.close()
+        self.pending = None  # (mode, sequence, frame_time) of the frame the worker is on
+        self.stopping = False  # being replaced by VisionProcesses._check_workers: gets no more frames
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def idle(self):
+        return self.pending is None and not self.stopping
+
+    def send(self, task):
+        self.connection.send(task)
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.connection.close()
+
+
+class VisionProcesses(object):
+    """A pool of vision worker processes fed through a FrameRing.
+
+    submit() copies a frame into the ring slot of an idle worker and sends
+    the worker the mode and settings to analyse it with; when every worker is
+    busy the frame is dropped, as FrameMailbox replaces frames the vision
+    thread has not picked up. Frames of ORDERED_MODES only go to the first
+    worker. get() returns the results in the order they are ready, which is
+    not always the capture order.
+
+    A worker that dies is restarted and its frame given up; after
+    MAX_RESTARTS the pool is `failed` and the caller should go back to the
+    vision thread.
+    """
+    def __init__(self, count=VISION_PROCESSES):
+        self.count = count
+        self.workers = []
+        self.ring = None
+        self.lock = threading.Lock()
+        self.next = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.done = 0
+        self.errors = 0
+        self.last_error = None
+        self.restarts = 0
+        self.cpu_time = 0.0
+
+    def start(self):
+        self.workers = [Worker(index) for index in range(self.count)]
+        return self
+
+    @property
+    def failed(self):
+        return self.restarts > MAX_RESTARTS
+
+    def submit(self, image, mode, frame_time, sequence, settings):
+        """Hand `image` to an idle worker; False if the frame is dropped."""
+        with self.lock:
+            worker = self._idle_worker(mode)
+            if worker is None or not self._ring_for(image.shape):
+                self.dropped += 1
+                return False
+            self.ring.write(worker.index, image)
+            worker.pending = (mode, sequence, frame_time)
+            self.submitted += 1
+            task = (self.ring.name, self.count, self.ring.shape, mode, settings)
+        try:
+            worker.send(task)
+        except OSError:
+            # the worker is gone: get() or stats() restart it
+            with self.lock:
+                worker.pending = None
+                self.dropped += 1
+            return False
+        return True
+
+    def _idle_worker(self, mode):
+        if mode in ORDERED_MODES:
+            worker = self.workers[0]
+            return worker if worker.idle() else None
+        for offset in range(self.count):
+            worker = self.workers[(self.next + offset) % self.count]
+            if worker.idle():
+                self.next = worker.index + 1
+                return worker
+        return None
+
+    def _ring_for(self, shape):
+        """Make sure the ring holds frames of `shape`; it can only be replaced while no worker uses it."""
+        if self.ring is not None and self.ring.shape == tuple(shape):
+            return True
+        if any(worker.pending is not None for worker in self.workers):
+            return False
+        if self.ring is not None:
+            self.ring.close()
+        self.ring = FrameRing(self.count, shape)
+        return True
+
+    def _check_workers(self, lost=None):
+        """Restart dead workers and `lost`, whose pipe closed, giving up the frames they were on.
+        Call without the lock: stopping a worker can take seconds, and submit() must not wait for it."""
+        with self.lock:
+            dead = [worker for worker in self.workers
+                    if not worker.stopping and (worker is lost or not worker.alive())]
+            for worker in dead:
+                worker.stopping = True
+                worker.pending = None
+        for worker in dead:
+            worker.stop()
+            print('vision worker %d exited with %s, restarting it' % (worker.index, worker.process.returncode))
+            replacement = Worker(worker.index)
+            with self.lock:
+                # stop() may have emptied the pool meanwhile
+                replaced = worker.index < len(self.workers) and self.workers[worker.index] is worker
+                if replaced:
+                    self.workers[worker.index] = replacement
+                    self.restarts += 1
+            if not replaced:
+                replacement.stop()
+
+    def get(self, timeout=None):
+        """Return (mode, sequence, frame_time, found) of the next analysed frame; None after `timeout`
+        seconds, or when the frame was lost to an error or a dead worker."""
+        with self.lock:
+            workers = {worker.connection: worker for worker in self.workers}
+        try:
+            ready = wait(list(workers), timeout)
+        except (OSError, ValueError):
+            # a connection closed by a restart in stats()
+            ready = []
+        if not ready:
+            self._check_workers()
+            return None
+        worker = workers[ready[0]]
+        try:
+            found, cpu_time, error = worker.connection.recv()
+        except (EOFError, OSError):
+            self._check_workers(worker)
+            return None
+        with self.lock:
+            pending, worker.pending = worker.pending, None
+            self.cpu_time += cpu_time
+            if pending is None:
+                return None
+            if error is not None:
+                self.errors += 1
+                self.last_error = error
+                return None
+            self.done += 1
+        return pending + (found,)
+
+    def stop(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+    def stats(self):
+        self._check_workers()
+        with self.lock:
+            analysed = self.done + self.errors
+            return {
+                'processes': self.count,
+                'busy': sum(worker.pending is not None for worker in self.workers),
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'done': self.done,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'restarts': self.restarts,
+                'cpu_ms_per_frame': round(1000 * self.cpu_time / analysed, 3) if analysed else 0.0,
+                'ring_bytes': self.ring.memory.size if self.ring is not None else 0,
+            }
+
+
+if __name__ == '__main__':
+    work(Connection(int(sys.argv[1])), int(sys.argv[2]))
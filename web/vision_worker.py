@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# File name   : vision_worker.py
+# Description : Latest-frame mailbox, timestamped results and rate meters for the vision stage
+import threading
+import time
+from collections import deque, namedtuple
+
+# A captured frame handed to the vision stage; the image is read-only
+Snapshot = namedtuple('Snapshot', ['image', 'timestamp', 'sequence'])
+# What the vision stage found in one snapshot: `values` depend on the mode
+VisionResult = namedtuple('VisionResult', ['mode', 'sequence', 'frame_time', 'done_time', 'values'])
+
+
+def snapshot(image, timestamp=None, sequence=None):
+    """Return a read-only Snapshot of `image`; the caller must not write to the array afterwards."""
+    image.flags.writeable = False
+    return Snapshot(image, time.monotonic() if timestamp is None else timestamp, sequence)
+
+
+class FrameMailbox(object):
+    """Single-slot mailbox between the capture loop and the vision stage.
+
+    put() never blocks: a frame the vision stage has not picked up yet is
+    replaced by the newer one and counted as dropped. get() waits for a frame.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.item is not None:
+                self.dropped += 1
+            self.item = item
+            self.put_count += 1
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Take the newest frame, waiting up to `timeout` seconds; None if there is none."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.item is not None, timeout)
+            item, self.item = self.item, None
+            return item
+
+    def clear(self):
+        with self.condition:
+            self.item = None
+
+
+class RateMeter(object):
+    """Events per second over a sliding window, e.g. captured or processed frames."""
+    def __init__(self, window=2.0, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.events = deque()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def tick(self):
+        with self.lock:
+            now = self.clock()
+            self.events.append(now)
+            self.count += 1
+            self._expire(now)
+
+    def rate(self):
+        with self.lock:
+            self._expire(self.clock())
+            if len(self.events) < 2:
+                return 0.0
+            return (len(self.events) - 1) / max(self.events[-1] - self.events[0], 1e-6)
+
+    def _expire(self, now):
+        while self.events and self.events[0] < now - self.window:
+            self.events.popleft()
@@ -154,6 +154,18 @@ def functionSelect(command_input, response):
         switch.switch(3,0)
         move.motorStop()
 
+    elif 'motionLite' == command_input:
+        flask_app.camera.motionSet(True)
+
+    elif 'motionFull' == command_input:
+        flask_app.camera.motionSet(False)
+
+    elif 'recordClips' == command_input:
+        flask_app.camera.recordSet(True)
+
+    elif 'recordClipsOff' == command_input:
+        flask_app.camera.recordSet(False)
+
     elif 'KD' == command_input:
         servoPosInit()
         fuc.keepDistance()
@@ -338,6 +350,10 @@ async def recv_msg(websocket):
                 err = int(data.split()[1])
                 flask_app.camera.errorSet(err)
 
+            elif 'visionProcesses' in data:
+                count = int(data.split()[1])
+                flask_app.camera.visionProcessesSet(count)
+
         elif(isinstance(data,dict)):
             if data['title'] == "findColorSet":
                 color = data['data']